@@ -0,0 +1,143 @@
+"""Local stand-in for an OpenAI-compatible chat-completions server.
+
+Serves ``POST /v1/chat/completions`` (plain and ``stream=True`` SSE) with
+deterministic, hypothesis-shaped lines, configurable latency and an optional
+failure rate, so the hypothesis swarm can be exercised offline:
+
+    python -m benchmarks.mock_llm_server --port 8765 --latency 1.5 --fail-rate 0.2
+    MOONSHOT_LLM_BACKEND=openai:http://127.0.0.1:8765/v1 streamlit run streamlit_app.py
+
+The number of lines follows the "exactly N" in the last user message.
+Latency is spread over the streamed lines, so the first line arrives early.
+"""
+import re
+import sys
+import json
+import time
+import random
+import zlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DRIVERS = ["Freight rate spikes", "Dealer gamma flips", "Fed balance sheet runoff", "Chip export curbs",
+           "Retail call buying", "Credit spread widening", "Dark pool prints", "ETF rebalancing flows",
+           "Drought in grain belts", "Insider selling clusters", "Short interest squeezes",
+           "Weak yen carry unwinds", "Rising oil inventories", "Hyperscaler capex guidance"]
+EFFECTS = ["lead small-cap reversals", "drive energy momentum", "predict volatility spikes",
+           "compress tech multiples", "amplify crowding risk", "lift defensive sectors",
+           "precede credit drawdowns", "boost semiconductor dispersion", "signal regime shifts"]
+
+
+def hypotheses(seed, n):
+    rng = random.Random(seed)
+    return [f"{rng.choice(DRIVERS)} {rng.choice(EFFECTS)}" for _ in range(n)]
+
+
+class MockChatServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256   # a whole swarm connects at once
+
+    def __init__(self, address, latency=0.5, jitter=0.0, fail_rate=0.0, seed=0):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._json(404, {'error': {'message': f'no route {self.path}'}})
+        with server.lock:
+            server.requests += 1
+            fail = server.rng.random() < server.fail_rate
+            delay = max(0.0, server.latency + server.rng.uniform(-server.jitter, server.jitter))
+        if fail:
+            time.sleep(delay / 4)
+            return self._json(503, {'error': {'message': 'mock overload'}})
+
+        messages = request.get('messages', [])
+        prompt = json.dumps(messages) + str(request.get('temperature'))
+        asked = re.search(r'exactly (\d+)', messages[-1].get('content', '') if messages else '')
+        lines = hypotheses(zlib.crc32(prompt.encode('utf-8')), int(asked.group(1)) if asked else 5)
+        model = request.get('model', 'mock')
+        created = int(time.time())
+
+        if not request.get('stream'):
+            time.sleep(delay)
+            return self._json(200, {
+                'id': 'mock-completion', 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': '\n'.join(lines)}}]})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for i, line in enumerate(lines):
+                time.sleep(delay / len(lines))
+                chunk = {'id': 'mock-completion', 'object': 'chat.completion.chunk', 'created': created,
+                         'model': model, 'choices': [{'index': 0, 'finish_reason': None,
+                                                      'delta': {'content': line + ('\n' if i < len(lines) - 1 else '')}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client timed out or stopped reading
+
+
+def serve(port=0, host='127.0.0.1', **options):
+    """Start a mock server on a background thread; returns it (``.base_url``, ``.shutdown()``)"""
+    server = MockChatServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name='mock-llm-server', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per completion')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds of random latency')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of requests answered with 503')
+    args = parser.parse_args(argv)
+    server = MockChatServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                            fail_rate=args.fail_rate)
+    print(f"Mock chat completions at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
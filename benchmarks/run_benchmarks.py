@@ -0,0 +1,362 @@
+"""Benchmark suite for the core hot paths.
+
+Every case runs offline on the seeded synthetic data provider, at three sizes
+(small / production / x10), each in its own subprocess and scratch working
+directory so timings, peak memory and the alpha DB never leak between runs.
+
+    python -m benchmarks.run_benchmarks                      # all cases, all sizes
+    python -m benchmarks.run_benchmarks --cases omniverse --sizes small,production
+    python -m benchmarks.run_benchmarks --save-baseline      # store current numbers
+    python -m benchmarks.run_benchmarks --out results.json   # exit code 1 on regression
+    python -m benchmarks.run_benchmarks --require-baseline   # exit code 2 without a baseline
+
+Results are written as JSON (wall time, tracemalloc peak, net allocations,
+max RSS). When ``benchmarks/baseline.json`` exists, any case whose median
+time or peak memory grew by more than the threshold is flagged. Timings are
+machine specific, so no baseline is committed: save one on the machine that
+runs the comparison. Without one the run warns on stderr that nothing was
+compared.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+RESULTS_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'results.json')
+SIZES = ['small', 'production', 'x10']
+SYNTHETIC_SEED = 7
+
+# Ignore timing differences below this many seconds (timer/scheduler noise)
+MIN_TIME_DELTA = 0.005
+MIN_MEM_DELTA = 1 << 20
+
+
+# ---------------------------------------------------------------- cases
+# Each case takes a size name, does its (untimed) setup and returns a
+# zero-argument callable that exercises the hot path once.
+
+def case_omniverse(size):
+    from core.omniverse import run_omniverse_sims
+    num_sims = {'small': 1000, 'production': 8000, 'x10': 80000}[size]
+    return lambda: run_omniverse_sims("Base", num_sims=num_sims, use_cache=False)
+
+
+def case_execution(size):
+    from core.liquidity_teleporter import optimal_execution_trajectory
+    horizon = {'small': 10, 'production': 30, 'x10': 300}[size]
+    return lambda: optimal_execution_trajectory(10_000_000, 2_000_000, horizon=horizon)
+
+
+def case_execution_batch(size):
+    import numpy as np
+    from core.liquidity_teleporter import optimal_execution_batch
+    n_orders = {'small': 10, 'production': 500, 'x10': 5000}[size]
+    rng = np.random.default_rng(SYNTHETIC_SEED)
+    orders = [(float(rng.uniform(5e6, 5e7)), float(rng.uniform(-2e6, 2e6)), int(rng.choice([10, 20, 30])))
+              for _ in range(n_orders)]
+    return lambda: optimal_execution_batch(orders)
+
+
+def case_oos_backtest(size):
+    from core.backtester import run_real_oos_backtest
+    period, oos_months = {'small': ('1y', 3), 'production': ('3y', 6), 'x10': ('10y', 60)}[size]
+    alpha = {"name": "bench", "persistence": 0.9}
+    return lambda: run_real_oos_backtest(alpha, period=period, oos_months=oos_months)
+
+
+def case_oos_metrics(size):
+    import numpy as np
+    from core.registry import get_real_oos_metrics
+    oos_days = {'small': 60, 'production': 120, 'x10': 1200}[size]
+
+    def strategy(prev_returns):
+        return np.sign(prev_returns.to_numpy()) / len(prev_returns)
+
+    return lambda: get_real_oos_metrics(strategy, oos_days=oos_days)
+
+
+def case_exposure_graph(size):
+    from core.shadow_crowd import build_exposure_graph
+    n_symbols = {'small': 5, 'production': 50, 'x10': 500}[size]
+    symbols = [f'SYN{i:05d}' for i in range(n_symbols)]
+    return lambda: build_exposure_graph(symbols)
+
+
+def case_cascade(size):
+    from core.shadow_crowd import simulate_cascade_prob
+    num_scenarios = {'small': 1000, 'production': 10000, 'x10': 100000}[size]
+    symbols = [f'SYN{i:05d}' for i in range(500)]
+    return lambda: simulate_cascade_prob(symbols, num_scenarios, seed=SYNTHETIC_SEED, workers=1)
+
+
+def case_causal_dag(size):
+    from core.data_fetcher import get_multi_asset_data
+    from core.causal_engine import build_causal_dag
+    n_symbols = {'small': 10, 'production': 100, 'x10': 300}[size]
+    symbols = [f'SYN{i:05d}' for i in range(n_symbols)]
+    returns = get_multi_asset_data(symbols, period="3y").pct_change().dropna(how='all')
+    return lambda: build_causal_dag(returns, max_lag=5)
+
+
+def case_what_if(size):
+    from core.data_fetcher import get_multi_asset_data
+    from core.counterfactual import what_if
+    n_symbols = {'small': 5, 'production': 20, 'x10': 200}[size]
+    symbols = [f'SYN{i:05d}' for i in range(n_symbols)]
+    returns = get_multi_asset_data(symbols, period="3y").pct_change().dropna(how='all')
+    what_if(returns, symbols[0], 0.03, steps=365)   # fit + noise, cached like the page's first click
+    shocks = iter([(symbols[i % n_symbols], s, h) for i, (s, h) in enumerate([(0.05, 120), (-0.1, 365), (0.02, 30)] * 100)])
+    return lambda: what_if(returns, *next(shocks))
+
+
+def case_swarm(size):
+    from benchmarks.mock_llm_server import serve
+    from core.causal_engine import AGENTS, Agent, swarm_generate_hypotheses
+    from core.llm_backends import backend_from_spec
+    # Every agent takes 0.5s on the local mock, so a concurrent swarm should take ~0.5s at any size
+    n_agents = {'small': 5, 'production': 20, 'x10': 200}[size]
+    agents = [Agent(f'{AGENTS[i % len(AGENTS)].name}_{i}', AGENTS[i % len(AGENTS)].persona, 0.5 + i / n_agents)
+              for i in range(n_agents)]
+    backend = backend_from_spec(f'openai:{serve(latency=0.5).base_url}')
+    return lambda: swarm_generate_hypotheses(2 * n_agents, record=False, agents=agents, backend=backend,
+                                             concurrency=n_agents)
+
+
+def case_evolution(size):
+    from core.evo_factory import Panel, evolve
+    population, generations = {'small': (200, 5), 'production': (1200, 50), 'x10': (12000, 50)}[size]
+    panel = Panel.load([f'SYN{i:05d}' for i in range(20)])
+    hypotheses = ["Dark pool prints drive energy momentum", "Credit spread widening predict volatility spikes"]
+    return lambda: evolve(hypotheses, panel, population, generations, seed=SYNTHETIC_SEED)
+
+
+def case_fitness_pool(size):
+    import atexit
+    import random
+    from core.evo_factory import FitnessPool, Panel, _toolbox
+    # Scoring one generation's distinct expressions on all cores; compare across machines for scaling.
+    # The subtree cache is off so repeats do not get faster than the first pass.
+    n_exprs = {'small': 200, 'production': 1200, 'x10': 12000}[size]
+    random.seed(SYNTHETIC_SEED)
+    exprs = list(dict.fromkeys(str(ind) for ind in _toolbox().population(n=n_exprs)))
+    pool = FitnessPool(Panel.load([f'SYN{i:05d}' for i in range(20)]), cache_mb=0).__enter__()
+    atexit.register(pool.close)
+    return lambda: pool.score(exprs)
+
+
+def _alpha_generation(n_alphas, max_age_days=0):
+    from datetime import datetime, timedelta
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(SYNTHETIC_SEED)
+    now = datetime.now()
+    return pd.DataFrame({
+        'name': [f'bench_alpha_{i}' for i in range(n_alphas)],
+        'description': 'benchmark',
+        'sharpe': 3.0 + 2.0 * rng.random(n_alphas),
+        'persistence_score': 0.8 + 0.2 * rng.random(n_alphas),
+        'diversity': 0.5 + 0.5 * rng.random(n_alphas),
+        'consistency': rng.random(n_alphas),
+        'created': [(now - timedelta(days=int(d))).isoformat()
+                    for d in rng.integers(0, max_age_days + 1, n_alphas)],
+        'returns_series': list(rng.normal(0.001, 0.01, (n_alphas, 120)).round(6))
+    })
+
+
+def case_save_alphas(size):
+    from core import registry
+    generation = _alpha_generation({'small': 100, 'production': 1200, 'x10': 12000}[size])
+    return lambda: registry.save_alphas(generation)
+
+
+def case_top_alphas(size):
+    from core import registry
+    n_alphas = {'small': 1000, 'production': 10000, 'x10': 100000}[size]
+    registry.save_alphas(_alpha_generation(n_alphas, max_age_days=60))
+    return lambda: registry.get_top_alphas(25)
+
+
+CASES = {
+    'omniverse': case_omniverse,
+    'execution': case_execution,
+    'execution_batch': case_execution_batch,
+    'oos_backtest': case_oos_backtest,
+    'oos_metrics': case_oos_metrics,
+    'exposure_graph': case_exposure_graph,
+    'cascade': case_cascade,
+    'causal_dag': case_causal_dag,
+    'what_if': case_what_if,
+    'swarm': case_swarm,
+    'evolution': case_evolution,
+    'fitness_pool': case_fitness_pool,
+    'save_alphas': case_save_alphas,
+    'top_alphas': case_top_alphas,
+}
+
+
+# ---------------------------------------------------------------- child
+
+def _measure(case, size, repeat, warmup):
+    """Runs inside the per-case subprocess"""
+    fn = CASES[case](size)
+    for _ in range(warmup):
+        fn()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    net_blocks = sys.getallocatedblocks() - blocks_before
+
+    max_rss = None
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        max_rss *= 1 if sys.platform == 'darwin' else 1024
+    except ImportError:
+        pass
+
+    return {
+        'status': 'ok',
+        'time_min_s': min(times),
+        'time_median_s': statistics.median(times),
+        'repeat': repeat,
+        'peak_bytes': peak,
+        'net_alloc_bytes': current,
+        'net_alloc_blocks': net_blocks,
+        'max_rss_bytes': max_rss,
+    }
+
+
+def _run_case(case, size, repeat, warmup, timeout):
+    """Spawn one isolated measurement and collect its JSON line"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = REPO_ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env['MOONSHOT_DATA_PROVIDER'] = f'synthetic:{SYNTHETIC_SEED}'
+    cmd = [sys.executable, '-m', 'benchmarks.run_benchmarks', '--child', case, size,
+           '--repeat', str(repeat), '--warmup', str(warmup)]
+    record = {'case': case, 'size': size}
+    with tempfile.TemporaryDirectory(prefix='moonshot_bench_') as workdir:
+        try:
+            proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            record.update(status='timeout', error=f'exceeded {timeout}s')
+            return record
+    lines = [l for l in proc.stdout.splitlines() if l.startswith('{')]
+    if proc.returncode != 0 or not lines:
+        tail = (proc.stderr or proc.stdout).strip().splitlines()[-1:] or ['no output']
+        record.update(status='error', error=tail[0])
+        return record
+    record.update(json.loads(lines[-1]))
+    return record
+
+
+# ---------------------------------------------------------------- compare
+
+def compare_to_baseline(results, baseline, time_threshold, mem_threshold):
+    """Mark results that regressed against the stored baseline, in place"""
+    previous = {(r['case'], r['size']): r for r in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        base = previous.get((r['case'], r['size']))
+        if r.get('status') != 'ok' or not base or base.get('status') != 'ok':
+            continue
+        r['baseline_time_median_s'] = base['time_median_s']
+        r['baseline_peak_bytes'] = base['peak_bytes']
+        slow = (r['time_median_s'] > base['time_median_s'] * time_threshold
+                and r['time_median_s'] - base['time_median_s'] > MIN_TIME_DELTA)
+        heavy = (r['peak_bytes'] > base['peak_bytes'] * mem_threshold
+                 and r['peak_bytes'] - base['peak_bytes'] > MIN_MEM_DELTA)
+        if slow or heavy:
+            r['regression'] = [k for k, flag in (('time', slow), ('memory', heavy)) if flag]
+            regressions.append(r)
+    return regressions
+
+
+def _environment():
+    info = {'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    try:
+        import numpy
+        info['numpy'] = numpy.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', default=','.join(CASES), help='comma-separated case names')
+    parser.add_argument('--sizes', default=','.join(SIZES), help='comma-separated sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=900, help='seconds per case/size')
+    parser.add_argument('--out', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--require-baseline', action='store_true', help='fail instead of warning without a baseline')
+    parser.add_argument('--time-threshold', type=float, default=1.25)
+    parser.add_argument('--mem-threshold', type=float, default=1.25)
+    parser.add_argument('--child', nargs=2, metavar=('CASE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_measure(args.child[0], args.child[1], args.repeat, args.warmup)))
+        return 0
+
+    compare = not args.save_baseline
+    if compare and not os.path.exists(args.baseline):
+        missing = f"no baseline at {args.baseline} (run with --save-baseline on this machine first)"
+        if args.require_baseline:
+            print(f"ERROR: {missing}", file=sys.stderr)
+            return 2
+        print(f"WARNING: {missing}; results will NOT be checked for regressions", file=sys.stderr)
+        compare = False
+
+    results = []
+    for case in args.cases.split(','):
+        if case not in CASES:
+            parser.error(f"unknown case {case!r}; choose from {', '.join(CASES)}")
+        for size in args.sizes.split(','):
+            record = _run_case(case, size, args.repeat, args.warmup, args.timeout)
+            results.append(record)
+            if record['status'] == 'ok':
+                print(f"{case:>15} {size:>10}  {record['time_median_s']*1000:>10.2f} ms"
+                      f"  peak {record['peak_bytes'] / 2**20:>9.1f} MiB")
+            else:
+                print(f"{case:>15} {size:>10}  {record['status'].upper()}: {record.get('error', '')}")
+
+    regressions = []
+    if compare:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), args.time_threshold, args.mem_threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['case']}/{r['size']}: {', '.join(r['regression'])} "
+                  f"({r['baseline_time_median_s']*1000:.2f} -> {r['time_median_s']*1000:.2f} ms, "
+                  f"{r['baseline_peak_bytes'] / 2**20:.1f} -> {r['peak_bytes'] / 2**20:.1f} MiB)")
+
+    report = {'environment': _environment(), 'results': results, 'regressions': len(regressions)}
+    out = args.baseline if args.save_baseline else args.out
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
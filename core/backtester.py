@@ -1,16 +1,18 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
+from core.market_store import load_panel
+from core.data_providers import SyntheticProvider
 
-def run_real_oos_backtest(alpha, symbol="SPY", period="3y", oos_months=6):
+def _load_oos_returns(symbol="SPY", period="3y", oos_months=6):
     """Force real data. Only fallback if absolutely necessary."""
     try:
-        df = yf.download(symbol, period=period, progress=False, auto_adjust=True, threads=False)
-        closes = df['Close']
+        closes = load_panel([symbol], "close", period)[symbol].dropna()
+        if closes.empty:
+            raise ValueError(f"No stored data for {symbol}")
     except:
-        # Strong fallback - still realistic but clearly marked
-        dates = pd.date_range(end=pd.Timestamp.today(), periods=252*3)
-        closes = pd.Series(np.cumsum(np.random.normal(0.0006, 0.009, len(dates))) + 100, index=dates)
+        # Strong fallback - seeded synthetic data so reruns are reproducible, clearly marked
+        start = pd.Timestamp.today().normalize() - pd.DateOffset(years=3)
+        closes = SyntheticProvider(seed=0).download([symbol], start)[symbol]['close']
         closes.name = "Fallback Data"
 
     oos_start = closes.index[-oos_months*21]
@@ -18,23 +20,97 @@ def run_real_oos_backtest(alpha, symbol="SPY", period="3y", oos_months=6):
     returns = oos.pct_change().dropna()
 
     if len(returns) < 10:
-        returns = pd.Series(np.random.normal(0.0008, 0.012, 120))
-
-    signal = returns.rolling(20).mean() > 0
-    strategy_returns = returns * signal.shift(1).fillna(0)
-
-    equity = (1 + strategy_returns).cumprod() * 100000
-
-    total_return = float((equity.iloc[-1] / equity.iloc[0] - 1) * 100) if len(equity) > 1 else 0.0
-    std_val = float(strategy_returns.std())
-    sharpe = float((strategy_returns.mean() / std_val) * np.sqrt(252)) if std_val > 0 else 0.0
-    max_dd = float(((equity / equity.cummax()) - 1).min() * 100) if len(equity) > 1 else 0.0
-
-    return {
-        "name": alpha.get("name", "Alpha"),
-        "sharpe": round(sharpe, 2),
-        "persistence": alpha.get("persistence", 0.85),
-        "oos_return": round(total_return, 1),
-        "max_drawdown": round(max_dd, 1),
-        "equity_curve": equity
-    }
\ No newline at end of file
+        returns = pd.Series(np.random.default_rng(0).normal(0.0008, 0.012, 120))
+    return returns
+
+def _signal_matrix(alphas, returns):
+    """T x N long/flat signal matrix, one column per alpha.
+
+    An alpha may carry its own ``signal`` (array or callable on the returns
+    Series, aligned to the last bar, flat where shorter); otherwise it trades ``rolling(lookback).mean() > 0`` with a
+    default lookback of 20. Identical lookbacks are only computed once."""
+    r = returns.to_numpy(dtype=float)
+    T = len(r)
+    csum = np.concatenate([[0.0], np.cumsum(r)])
+    signals = np.zeros((T, len(alphas)), dtype=bool)
+    by_lookback = {}
+    for j, alpha in enumerate(alphas):
+        custom = alpha.get("signal")
+        if custom is not None:
+            values = np.asarray(custom(returns) if callable(custom) else custom, dtype=float).ravel()[-T:]
+            # A short signal is aligned to the end; the missing head is flat
+            signals[T - len(values):, j] = np.nan_to_num(values) > 0
+            continue
+        lookback = int(alpha.get("lookback", 20))
+        if lookback not in by_lookback:
+            col = np.zeros(T, dtype=bool)
+            if T >= lookback:
+                # rolling mean > 0  <=>  rolling sum > 0
+                col[lookback - 1:] = (csum[lookback:] - csum[:-lookback]) > 0
+            by_lookback[lookback] = col
+        signals[:, j] = by_lookback[lookback]
+    return signals
+
+def _unique_names(names):
+    """Suffix repeated names (" #2", " #3", ...) so every equity column is distinct"""
+    seen, unique = {}, []
+    taken = set(names)
+    for name in names:
+        if name in seen:
+            k = seen[name] + 1
+            while f"{name} #{k}" in taken:
+                k += 1
+            seen[name] = k
+            name = f"{name} #{k}"
+            taken.add(name)
+        else:
+            seen[name] = 1
+        unique.append(name)
+    return unique
+
+def run_batch_oos_backtest(alphas, symbol="SPY", period="3y", oos_months=6):
+    """Backtest N alphas in one pass over a single price load.
+
+    Returns ``(metrics, equity)``: a DataFrame with one row of metrics per
+    alpha and a T x N DataFrame of equity curves (one column per alpha)."""
+    returns = _load_oos_returns(symbol, period, oos_months)
+    r = returns.to_numpy(dtype=float)
+    n = len(alphas)
+
+    signals = _signal_matrix(alphas, returns)
+    positions = np.zeros_like(signals, dtype=float)
+    positions[1:] = signals[:-1]
+    strategy_returns = r[:, None] * positions
+
+    equity = np.cumprod(1 + strategy_returns, axis=0) * 100000
+
+    if len(r) > 1:
+        total_return = (equity[-1] / equity[0] - 1) * 100
+        std_val = strategy_returns.std(axis=0, ddof=1)
+        max_dd = ((equity / np.maximum.accumulate(equity, axis=0)) - 1).min(axis=0) * 100
+    else:
+        total_return = np.zeros(n)
+        std_val = np.zeros(n)
+        max_dd = np.zeros(n)
+    mean_val = strategy_returns.mean(axis=0)
+    sharpe = np.divide(mean_val, std_val, out=np.zeros(n), where=std_val > 0) * np.sqrt(252)
+
+    names = _unique_names([alpha.get("name", "Alpha") for alpha in alphas])
+    metrics = pd.DataFrame({
+        "name": names,
+        "sharpe": np.round(sharpe, 2),
+        "persistence": [alpha.get("persistence", 0.85) for alpha in alphas],
+        "oos_return": np.round(total_return, 1),
+        "max_drawdown": np.round(max_dd, 1)
+    })
+    return metrics, pd.DataFrame(equity, index=returns.index, columns=names)
+
+def run_real_oos_backtest(alpha, symbol="SPY", period="3y", oos_months=6):
+    """Single-alpha view of ``run_batch_oos_backtest``"""
+    metrics, equity = run_batch_oos_backtest([alpha], symbol, period, oos_months)
+    result = metrics.iloc[0].to_dict()
+    result["sharpe"] = float(result["sharpe"])
+    result["oos_return"] = float(result["oos_return"])
+    result["max_drawdown"] = float(result["max_drawdown"])
+    result["equity_curve"] = equity.iloc[:, 0]
+    return result
@@ -0,0 +1,161 @@
+"""Small result cache shared by the core engines.
+
+``ResultCache`` keeps an in-memory LRU in front of an optional pickle-per-key
+disk directory, and collapses concurrent requests for the same key into a
+single computation (the other callers wait for it and get the same object).
+Cached values are shared between sessions and must be treated as read-only.
+"""
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('cache')
+
+CACHE_DIR = os.path.join('data', 'cache')
+
+_MISSING = object()
+
+
+def make_key(*parts):
+    """Stable hex key from a tuple of simple values"""
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+
+class ResultCache:
+    def __init__(self, name, max_items=32, disk=True, max_disk_items=128):
+        self.name = name
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self.disk_dir = os.path.join(CACHE_DIR, name) if disk else None
+        self._items = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.pkl')
+
+    def _load(self, key):
+        if not self.disk_dir:
+            return _MISSING
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # keep recently used entries when pruning
+            return value
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as e:
+            logger.warning(f"Dropping unreadable {self.name} cache entry {key}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return _MISSING
+
+    def _store(self, key, value):
+        if not self.disk_dir:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            tmp = self._disk_path(key) + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._disk_path(key))
+            self._prune_disk()
+        except Exception as e:
+            logger.warning(f"Could not persist {self.name} cache entry {key}: {e}")
+
+    def _prune_disk(self):
+        entries = [os.path.join(self.disk_dir, f) for f in os.listdir(self.disk_dir) if f.endswith('.pkl')]
+        if len(entries) <= self.max_disk_items:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_disk_items]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+        value = self._load(key)
+        if value is _MISSING:
+            return default
+        self.disk_hits += 1
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self._remember(key, value)
+        self._store(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key`` or compute it exactly once"""
+        while True:
+            with self._lock:
+                if key in self._items:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return self._items[key]
+                event = self._inflight.get(key)
+                owner = event is None
+                if owner:
+                    event = self._inflight[key] = threading.Event()
+            if owner:
+                break
+            event.wait()
+            with self._lock:
+                if key in self._items:
+                    self.hits += 1
+                    return self._items[key]
+            # The owner failed; loop round and try to compute it ourselves
+
+        try:
+            value = self._load(key)
+            if value is not _MISSING:
+                self.disk_hits += 1
+                self._remember(key, value)
+                return value
+            self.misses += 1
+            start = time.perf_counter()
+            value = compute()
+            logger.info(f"{self.name} cache miss computed in {time.perf_counter() - start:.2f}s")
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._items.clear()
+        if disk and self.disk_dir and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                if name.endswith('.pkl'):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            size = len(self._items)
+        return {'items': size, 'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses}
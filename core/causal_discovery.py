@@ -0,0 +1,228 @@
+"""Time-lagged causal discovery (PCMCI-style) with batched partial-correlation tests.
+
+The returns panel is embedded with its lags, so every variable ``X_i(t - lag)``
+is a column of one design matrix. Its correlation matrix ``C`` is computed
+once. Any partial correlation ``r(a, b | S)`` then comes from the inverse of
+the ``C`` submatrix on ``{a, b} ∪ S``:
+
+    r = -P_ab / sqrt(P_aa * P_bb),  P = inv(C[S', S'])
+
+Tests that share a conditioning-set size are stacked into one
+``(tests, k, k)`` array and inverted in a single batched call. Large batches
+are split into chunks that run on a thread pool; LAPACK releases the GIL.
+
+Two stages, following PCMCI (Runge et al. 2019):
+
+1. **PC1 parent selection.** Each target starts with every lagged variable
+   as a candidate parent. At level ``p`` each remaining candidate is tested
+   against the target, given the ``p`` strongest other candidates. All
+   targets and candidates of a level are tested at once. Candidates that
+   test independent at ``pc_alpha`` are dropped.
+2. **MCI tests.** Each surviving link ``X_i(t - lag) -> X_j(t)`` is tested
+   given the target's other parents and the driver's strongest parents,
+   shifted by ``lag``. Conditioning on both sides controls for
+   autocorrelation and common drivers.
+
+Contemporaneous links are not tested; every reported link has lag >= 1.
+Edge persistence is the share of consecutive sub-periods in which the same
+MCI test is significant with the same sign.
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.special import erfc
+
+logger = logging.getLogger('causal_discovery')
+
+MAX_LAG = 3
+PC_ALPHA = 0.05            # parent selection is deliberately liberal
+ALPHA = 0.01               # significance of reported links
+MAX_COND = 4               # largest PC1 conditioning set
+MAX_COND_PX = 2            # strongest parents of the driver used in MCI tests
+PERSISTENCE_WINDOWS = 4
+PERSISTENCE_ALPHA = 0.10
+CHUNK_TESTS = 20_000       # tests per batched inversion task
+
+
+def embed(values, depth):
+    """Lag embedding: column ``lag * n + i`` holds ``X_i(t - lag)``, lag 0..depth"""
+    t = len(values)
+    return np.hstack([values[depth - lag:t - lag] for lag in range(depth + 1)])
+
+
+def correlation(z):
+    """Correlation of the columns of ``z``, or a stack of them for 3-D input"""
+    centered = z - z.mean(axis=-2, keepdims=True)
+    std = np.sqrt((centered ** 2).sum(axis=-2, keepdims=True))
+    std[std == 0] = 1.0
+    centered /= std
+    return np.swapaxes(centered, -1, -2) @ centered
+
+
+def _partial_corr_chunk(corr, idx):
+    sub = corr[..., idx[:, :, None], idx[:, None, :]]
+    # A tiny ridge keeps exactly collinear sets invertible
+    sub = sub + 1e-9 * np.eye(idx.shape[1])
+    prec = np.linalg.inv(sub)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = -prec[..., 0, 1] / np.sqrt(prec[..., 0, 0] * prec[..., 1, 1])
+    return np.clip(np.nan_to_num(r), -1.0, 1.0)
+
+
+def partial_corr(corr, idx, workers=None):
+    """``r(idx[:, 0], idx[:, 1] | idx[:, 2:])`` for a batch of equal-size tests.
+
+    ``corr`` may be one correlation matrix or a stack of them, in which case
+    the result has a leading stack axis."""
+    idx = np.asarray(idx)
+    n_tests = len(idx)
+    if workers == 1 or n_tests <= CHUNK_TESTS:
+        return _partial_corr_chunk(corr, idx)
+    chunks = [idx[i:i + CHUNK_TESTS] for i in range(0, n_tests, CHUNK_TESTS)]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return np.concatenate(list(pool.map(lambda c: _partial_corr_chunk(corr, c), chunks)), axis=-1)
+
+
+def fisher_pvalue(r, n_obs, n_cond):
+    """Two-sided p-value of a partial correlation under the Fisher z transform"""
+    dof = np.maximum(n_obs - n_cond - 3, 1)
+    z = np.arctanh(np.clip(np.abs(r), 0.0, 1 - 1e-12)) * np.sqrt(dof)
+    return erfc(z / np.sqrt(2))
+
+
+def fdr_adjust(pvalues, n_hypotheses=None):
+    """Benjamini-Hochberg adjusted p-values. ``n_hypotheses`` counts links that
+    were never tested (dropped in PC1, p = 1) but still belong to the family."""
+    pvalues = np.asarray(pvalues, dtype=float)
+    m = max(n_hypotheses or len(pvalues), len(pvalues))
+    order = np.argsort(pvalues)
+    ranked = pvalues[order] * m / np.arange(1, len(pvalues) + 1)
+    adjusted = np.empty_like(pvalues)
+    adjusted[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return adjusted
+
+
+def _grouped_partial_corr(corr, tests, workers=None):
+    """Partial correlations for tests of mixed conditioning-set sizes, batched per size"""
+    r = np.zeros(corr.shape[:-2] + (len(tests),))
+    sizes = np.array([len(t) for t in tests])
+    for size in np.unique(sizes):
+        pos = np.flatnonzero(sizes == size)
+        r[..., pos] = partial_corr(corr, np.array([tests[i] for i in pos]), workers)
+    return r
+
+
+def _pc1(corr, n_vars, max_lag, n_obs, pc_alpha, max_cond, workers):
+    """Candidate parents per target as a padded (targets x slots) array, strongest first"""
+    candidates = np.arange(n_vars, n_vars * (max_lag + 1))
+    strength = np.abs(corr[:n_vars][:, candidates])
+    parents = np.tile(candidates, (n_vars, 1))
+    order = np.argsort(-strength, axis=1)
+    parents = np.take_along_axis(parents, order, axis=1)
+    strength = np.take_along_axis(strength, order, axis=1)
+    count = np.full(n_vars, len(candidates))
+    tests = 0
+
+    for level in range(max_cond + 1):
+        slots = np.arange(parents.shape[1])
+        live = (slots[None, :] < count[:, None]) & (count[:, None] - 1 >= level)
+        target, slot = np.nonzero(live)
+        if not len(target):
+            break
+        # The ``level`` strongest parents other than the one under test
+        m = np.arange(level)
+        cond = parents[target[:, None], m[None, :] + (m[None, :] >= slot[:, None])]
+        idx = np.column_stack([target, parents[target, slot], cond])
+        r = partial_corr(corr, idx, workers)
+        tests += len(idx)
+        keep = fisher_pvalue(r, n_obs, level) <= pc_alpha
+
+        # Test statistic of a parent is its weakest result so far (PCMCI's min rule)
+        updated = np.full(strength.shape, -1.0)
+        updated[target, slot] = np.where(keep, np.minimum(strength[target, slot], np.abs(r)), -1.0)
+        untested = ~live & (slots[None, :] < count[:, None])
+        updated[untested] = strength[untested]
+        order = np.argsort(-updated, axis=1)
+        parents = np.take_along_axis(parents, order, axis=1)
+        strength = np.take_along_axis(updated, order, axis=1)
+        count = (strength >= 0).sum(axis=1)
+        width = max(int(count.max()), 1)
+        parents, strength = parents[:, :width], strength[:, :width]
+
+    return [parents[j, :count[j]] for j in range(n_vars)], tests
+
+
+def _mci_tests(parents, n_vars, max_cond_px):
+    """(target, driver column, conditioning columns) for every selected link"""
+    tests, links = [], []
+    for j, own in enumerate(parents):
+        for col in own:
+            lag, i = divmod(int(col), n_vars)
+            shifted = [int(c // n_vars + lag) * n_vars + int(c % n_vars) for c in parents[i][:max_cond_px]]
+            others = [int(c) for c in own if c != col]
+            cond = others + [c for c in shifted if c not in others]
+            tests.append([j, int(col)] + cond)
+            links.append((i, j, lag))
+    return tests, links
+
+
+def discover_links(values, max_lag=MAX_LAG, alpha=ALPHA, pc_alpha=PC_ALPHA, max_cond=MAX_COND,
+                   max_cond_px=MAX_COND_PX, windows=PERSISTENCE_WINDOWS, fdr=True, workers=None):
+    """Significant lagged links in a (time x variables) returns array.
+
+    Returns a dict of equal-length arrays ``source``, ``target``, ``lag``,
+    ``strength`` (MCI partial correlation), ``pvalue`` and ``persistence``,
+    plus ``tests``, the number of conditional-independence tests run. With
+    ``fdr`` the p-values are Benjamini-Hochberg adjusted over all
+    ``n² · max_lag`` candidate links, so ``alpha`` bounds the false discovery
+    rate rather than the per-test error, which matters at hundreds of series."""
+    values = np.asarray(values, dtype=float)
+    n_vars = values.shape[1]
+    depth = 2 * max_lag    # shifted driver parents reach back two max lags
+    z = embed(values, depth)
+    n_obs = len(z)
+    corr = correlation(z)
+
+    parents, tests = _pc1(corr, n_vars, max_lag, n_obs, pc_alpha, max_cond, workers)
+    mci, links = _mci_tests(parents, n_vars, max_cond_px)
+    empty = {k: np.array([], dtype=int if k in ('source', 'target', 'lag') else float)
+             for k in ('source', 'target', 'lag', 'strength', 'pvalue', 'persistence')}
+    if not mci:
+        return dict(empty, tests=tests)
+    r = _grouped_partial_corr(corr, mci, workers)
+    pvalue = fisher_pvalue(r, n_obs, np.array([len(t) - 2 for t in mci]))
+    if fdr:
+        pvalue = fdr_adjust(pvalue, n_vars * n_vars * max_lag)
+    tests += len(mci)
+    significant = np.flatnonzero(pvalue <= alpha)
+    if not len(significant):
+        return dict(empty, tests=tests)
+
+    # Persistence: rerun the significant MCI tests on consecutive sub-periods,
+    # using only the columns those tests touch
+    kept = [mci[i] for i in significant]
+    columns = np.unique(np.concatenate(kept))
+    position = np.full(z.shape[1], -1)
+    position[columns] = np.arange(len(columns))
+    rows = n_obs // windows
+    if windows > 1 and rows > max(len(t) for t in kept) + 3:
+        stacked = z[:rows * windows, columns].reshape(windows, rows, len(columns))
+        r_windows = _grouped_partial_corr(correlation(stacked), [position[t].tolist() for t in kept], workers)
+        n_cond = np.array([len(t) - 2 for t in kept])
+        agree = (np.sign(r_windows) == np.sign(r[significant])) & (fisher_pvalue(r_windows, rows, n_cond) <= PERSISTENCE_ALPHA)
+        persistence = agree.mean(axis=0)
+    else:
+        persistence = np.full(len(significant), np.nan)
+
+    source, target, lag = (np.array(v, dtype=int) for v in zip(*(links[i] for i in significant)))
+    return {
+        'source': source,
+        'target': target,
+        'lag': lag,
+        'strength': r[significant],
+        'pvalue': pvalue[significant],
+        'persistence': persistence,
+        'tests': tests + len(kept) * (windows if windows > 1 else 0)
+    }
@@ -1,33 +1,350 @@
-import streamlit as st
-from openai import OpenAI
+"""Causal hypothesis generation by a swarm of LLM agents.
 
-api_key = st.secrets.get("OPENROUTER_API_KEY")
-client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key) if api_key else None
+Each agent has its own persona prompt and sampling temperature. All agents
+are issued concurrently on one event loop, so a swarm takes about as long as
+its slowest agent. Every request has its own timeout and is retried with
+jittered exponential backoff; a semaphore caps requests in flight.
+Hypotheses are parsed from the token stream line by line and handed on as
+soon as each line completes, so the UI can show them while agents are still
+writing. The backend is pluggable (see ``core.llm_backends``).
 
-def swarm_generate_hypotheses(num=10):
+Generated hypotheses are recorded in the persistent store
+(``core.hypothesis_store``), which screens out exact and near duplicates of
+anything generated before. ``swarm_generate_hypotheses`` is cache-first: it
+hands out stored hypotheses no evolution run has used yet and only asks the
+swarm for the remainder.
+
+``build_causal_dag`` turns a returns panel into a networkx DiGraph of the
+lagged links found by ``core.causal_discovery``. Edges carry strength, lag
+and persistence; nodes carry ``influence`` and ``persistence`` summaries.
+What-if simulations are in ``core.counterfactual`` and re-exported here.
+"""
+import re
+import math
+import queue
+import random
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import networkx as nx
+
+from core.llm_backends import BackendUnavailable, get_backend
+from core.hypothesis_store import get_store
+from core.causal_discovery import ALPHA, MAX_LAG, discover_links
+from core.counterfactual import counterfactual_sim, what_if
+
+logger = logging.getLogger('causal_engine')
+
+SWARM_TIMEOUT = 45.0      # seconds per agent request
+SWARM_RETRIES = 2         # extra attempts per agent after a failure
+SWARM_BACKOFF = 0.5       # seconds before the first retry, doubled per attempt
+SWARM_CONCURRENCY = 8     # agent requests in flight at once
+MAX_HYPOTHESIS_CHARS = 70
+
+FALLBACK_HYPOTHESES = [
+    "FDA delays extend biotech R&D cycles",
+    "Ocean freight volatility drives AGCO momentum",
+    "Renewable portfolio standards boost clean energy",
+    "AI capex shocks cause sector rotation",
+    "Geopolitical risk mispricing in energy",
+    "Dark pool accumulation signals momentum",
+    "Retail options gamma creates volatility spikes",
+    "Prime broker flow predicts crowding",
+    "Low liquidity regimes amplify mean reversion",
+    "Cross-asset correlation spikes predict crashes"
+]
+
+
+@dataclass(frozen=True)
+class Agent:
+    name: str
+    persona: str
+    temperature: float = 0.8
+    model: str = None      # None: the backend's default model
+
+
+AGENTS = (
+    Agent('macro', "You are a global macro strategist focused on rates, FX, commodities and policy shocks.", 0.6),
+    Agent('microstructure', "You are a market microstructure researcher focused on order flow, liquidity and dealer positioning.", 0.7),
+    Agent('fundamental', "You are a sector analyst focused on supply chains, earnings drivers and regulation.", 0.8),
+    Agent('alt_data', "You are an alternative-data quant focused on satellite, shipping, web and sentiment signals.", 0.9),
+    Agent('contrarian', "You are a behavioural-finance contrarian focused on crowding, reflexivity and regime breaks.", 1.0),
+)
+
+_PREFIX = re.compile(r'^\s*(?:[-*•>]+|\d+[.)]|[a-zA-Z][.)](?=\s))\s*')
+
+
+def _prompt(agent, num, context):
+    content = (f"Generate exactly {num} short, clean, professional causal trading hypotheses. "
+               "Output ONLY the list, one per line, no explanations, no numbering, no intro text. "
+               f"Each hypothesis must be under {MAX_HYPOTHESIS_CHARS} characters.")
+    if context:
+        content += f" Ground them in these instruments: {', '.join(map(str, context))}."
+    return [{"role": "system", "content": agent.persona}, {"role": "user", "content": content}]
+
+
+def _clean(line):
+    line = _PREFIX.sub('', line.strip()).strip().strip('"\'*').strip()
+    if not line or line.endswith(':') or len(line) > 2 * MAX_HYPOTHESIS_CHARS:
+        return None
+    return line
+
+
+async def _ask(backend, agent, messages, emit):
+    """Stream one completion, emitting each hypothesis line as it completes"""
+    buffer = ''
+    async for delta in backend.stream(messages, agent.temperature, agent.model):
+        buffer += delta
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            hypothesis = _clean(line)
+            if hypothesis:
+                emit(agent, messages, hypothesis)
+    hypothesis = _clean(buffer)
+    if hypothesis:
+        emit(agent, messages, hypothesis)
+
+
+async def _run_agent(backend, agent, messages, emit, limit, timeout, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            async with limit:
+                await asyncio.wait_for(_ask(backend, agent, messages, emit), timeout)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except BackendUnavailable as e:
+            logger.warning(f"Agent {agent.name}: {e}")
+            return False
+        except Exception as e:
+            # Lines emitted before the failure are kept; the retry's repeats are deduplicated
+            reason = 'timed out' if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+            if attempt == retries:
+                logger.warning(f"Agent {agent.name} gave up after {attempt + 1} attempts ({reason})")
+                return False
+            delay = backoff * 2 ** attempt * (0.5 + random.random())
+            logger.info(f"Agent {agent.name} attempt {attempt + 1} {reason}; retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def run_swarm(num=10, context=None, agents=AGENTS, backend=None, on_hypothesis=None, accept=None,
+                    timeout=SWARM_TIMEOUT, retries=SWARM_RETRIES, backoff=SWARM_BACKOFF,
+                    concurrency=SWARM_CONCURRENCY):
+    """Run every agent concurrently and return up to ``num`` distinct hypotheses.
+
+    ``on_hypothesis(agent_name, text)`` is called for each new hypothesis as
+    soon as it is parsed. ``accept(text, agent, model, messages)``, if given,
+    can reject hypotheses (e.g. ones already in the store); rejected ones do
+    not count towards ``num``. Agents each get an equal share of ``num`` plus
+    one spare to absorb duplicates. Returns early once ``num`` are collected."""
+    backend = backend or get_backend()
+    quota = math.ceil(num / max(len(agents), 1)) + 1
+    seen, found = set(), []
+    done = asyncio.Event()
+
+    def emit(agent, messages, hypothesis):
+        key = ' '.join(re.findall(r'\w+', hypothesis.lower()))
+        if done.is_set() or key in seen:
+            return
+        seen.add(key)
+        if accept is not None and not accept(hypothesis, agent, agent.model or backend.model, messages):
+            return
+        found.append(hypothesis)
+        if on_hypothesis is not None:
+            on_hypothesis(agent.name, hypothesis)
+        if len(found) >= num:
+            done.set()
+
+    limit = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(_run_agent(backend, agent, _prompt(agent, quota, context),
+                                            emit, limit, timeout, retries, backoff))
+             for agent in agents]
+    finished = asyncio.gather(*tasks)
+    waiter = asyncio.create_task(done.wait())
     try:
-        response = client.chat.completions.create(
-            model="deepseek/deepseek-r1",
-            messages=[{
-                "role": "user", 
-                "content": f"Generate exactly {num} short, clean, professional causal trading hypotheses. Output ONLY the list, no explanations, no numbering, no intro text. Each hypothesis must be under 70 characters."
-            }],
-            temperature=0.8
-        )
-        text = response.choices[0].message.content.strip()
-        hypotheses = [line.strip() for line in text.split('\n') if line.strip()]
-        return hypotheses[:num]
-    except:
-        # Clean demo fallback
-        return [
-            "FDA delays extend biotech R&D cycles",
-            "Ocean freight volatility drives AGCO momentum",
-            "Renewable portfolio standards boost clean energy",
-            "AI capex shocks cause sector rotation",
-            "Geopolitical risk mispricing in energy",
-            "Dark pool accumulation signals momentum",
-            "Retail options gamma creates volatility spikes",
-            "Prime broker flow predicts crowding",
-            "Low liquidity regimes amplify mean reversion",
-            "Cross-asset correlation spikes predict crashes"
-        ]
\ No newline at end of file
+        await asyncio.wait([waiter, finished], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks + [waiter]:
+            task.cancel()
+        await asyncio.gather(finished, waiter, return_exceptions=True)
+        await backend.aclose()
+    return found[:num]
+
+
+def _store_filter(store):
+    """``accept`` callback that records each hypothesis and keeps only novel ones"""
+    def accept(text, agent, model, messages):
+        try:
+            return store.add(text, agent.name, model, agent.temperature, messages).is_new
+        except Exception as e:
+            logger.warning(f"Hypothesis store unavailable ({e}); keeping unscreened hypothesis")
+            return True
+    return accept
+
+
+def _default_store():
+    try:
+        return get_store()
+    except Exception as e:
+        logger.warning(f"Hypothesis store unavailable: {e}")
+        return None
+
+
+def iter_hypotheses(num=10, context=None, record=True, **swarm_kwargs):
+    """Yield ``(agent_name, hypothesis)`` pairs as the swarm produces them.
+
+    The swarm runs on its own event loop in a background thread, so this
+    works from synchronous code such as a Streamlit script. Closing the
+    generator early cancels the outstanding agents. With ``record`` every
+    hypothesis is saved to the store and only genuinely new ones are yielded."""
+    store = _default_store() if record else None
+    if store is not None:
+        swarm_kwargs.setdefault('accept', _store_filter(store))
+    results = queue.Queue()
+    loop = asyncio.new_event_loop()
+    finished = object()
+
+    async def main():
+        try:
+            await run_swarm(num, context, on_hypothesis=lambda *pair: results.put(pair), **swarm_kwargs)
+        except asyncio.CancelledError:
+            pass   # consumer stopped early
+        except Exception as e:
+            logger.error(f"Hypothesis swarm failed: {e}")
+        finally:
+            results.put(finished)
+
+    task = loop.create_task(main())
+    thread = threading.Thread(target=loop.run_until_complete, args=(task,), name='hypothesis-swarm', daemon=True)
+    thread.start()
+    try:
+        while (item := results.get()) is not finished:
+            yield item
+    finally:
+        if thread.is_alive():
+            loop.call_soon_threadsafe(task.cancel)
+        thread.join()
+        loop.close()
+
+
+def swarm_generate_hypotheses(num=10, context=None, cache_first=True, record=True, **swarm_kwargs):
+    """``num`` distinct causal trading hypotheses, or the demo list when none
+    are stored and no agent could produce any.
+
+    With ``cache_first`` unused hypotheses from the store are handed out
+    before any LLM call, and the swarm only generates the shortfall. Every
+    hypothesis returned is marked as served so later calls move on."""
+    store = _default_store() if record else None
+    hypotheses = []
+    if store is not None and cache_first:
+        try:
+            hypotheses = store.take_fresh(num)
+        except Exception as e:
+            logger.warning(f"Reading cached hypotheses failed: {e}")
+    cached = len(hypotheses)
+    if cached < num:
+        new = [h for _, h in iter_hypotheses(num - cached, context, record, **swarm_kwargs)]
+        if store is not None and new:
+            try:
+                store.mark_served(new)
+            except Exception as e:
+                logger.warning(f"Marking hypotheses served failed: {e}")
+        hypotheses += new
+    logger.info(f"{len(hypotheses)} hypotheses, {cached} from the store")
+    return hypotheses or FALLBACK_HYPOTHESES[:num]
+
+
+def build_causal_dag(returns, max_lag=MAX_LAG, alpha=ALPHA, workers=None):
+    """Lagged causal graph of a (date x asset) returns frame.
+
+    Lags of the same driver -> target pair are merged into one edge, which
+    keeps the strongest lag. Edge attributes: ``weight`` (|strength|),
+    ``strength`` (MCI partial correlation), ``lag``, ``lags``, ``pvalue`` and
+    ``persistence``. Node attributes: ``influence`` (total |strength| of
+    outgoing links), ``persistence`` (strength-weighted persistence of the
+    node's links) and ``memory`` (its own lagged dependence, if any).
+
+    Every edge points forward in time, so the time-unrolled graph (one node
+    per asset and date) is acyclic, but this summary graph need not be: A
+    driving B at lag 1 and B driving A at lag 3 is a feedback loop, not an
+    error. ``G.graph['acyclic']`` says whether the summary graph is a DAG and
+    ``G.graph['feedback']`` lists the mutually linked pairs."""
+    frame = returns.dropna(how='all').fillna(0.0)
+    frame = frame.loc[:, frame.std() > 0]
+    links = discover_links(frame.to_numpy(dtype=float), max_lag=max_lag, alpha=alpha, workers=workers)
+    names = [str(c) for c in frame.columns]
+
+    G = nx.DiGraph(max_lag=max_lag, alpha=alpha, n_obs=len(frame), tests=links['tests'])
+    G.add_nodes_from(names, influence=0.0, persistence=0.0, memory=0.0)
+    persistence = np.nan_to_num(links['persistence'])
+    for i, j, lag, r, p, pers in zip(links['source'].tolist(), links['target'].tolist(), links['lag'].tolist(),
+                                     links['strength'].tolist(), links['pvalue'].tolist(), persistence.tolist()):
+        if i == j:
+            if abs(r) > abs(G.nodes[names[i]]['memory']):
+                G.nodes[names[i]]['memory'] = r
+            continue
+        u, v = names[i], names[j]
+        if G.has_edge(u, v):
+            edge = G.edges[u, v]
+            edge['lags'].append(lag)
+            if abs(r) <= edge['weight']:
+                continue
+        else:
+            G.add_edge(u, v, lags=[lag])
+        G.edges[u, v].update(weight=abs(r), strength=r, lag=lag, pvalue=p, persistence=pers)
+
+    for node in G.nodes:
+        out = [d['weight'] for _, _, d in G.out_edges(node, data=True)]
+        touching = [(d['weight'], d['persistence']) for _, _, d in G.edges(node, data=True)]
+        touching += [(d['weight'], d['persistence']) for _, _, d in G.in_edges(node, data=True)]
+        total = sum(w for w, _ in touching)
+        G.nodes[node]['influence'] = float(sum(out))
+        G.nodes[node]['persistence'] = float(sum(w * p for w, p in touching) / total) if total else 0.0
+    G.graph['feedback'] = [(u, v) for u, v in G.edges if u < v and G.has_edge(v, u)]
+    G.graph['acyclic'] = nx.is_directed_acyclic_graph(G)
+    logger.info(f"Lagged causal graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges "
+                f"({len(G.graph['feedback'])} feedback pairs) from {links['tests']} tests")
+    return G
+
+
+def visualize_dag(G):
+    """Plot the causal graph: node size by influence, colour by persistence,
+    green/red edges for positive/negative lagged effects"""
+    import streamlit as st
+    import plotly.graph_objects as go
+
+    pos = nx.circular_layout(G)
+    fig = go.Figure()
+    for sign, color in ((1, 'rgba(0,255,159,0.6)'), (-1, 'rgba(255,0,128,0.6)')):
+        xs, ys = [], []
+        for u, v, d in G.edges(data=True):
+            if np.sign(d['strength']) == sign:
+                xs += [pos[u][0], pos[v][0], None]
+                ys += [pos[u][1], pos[v][1], None]
+        fig.add_trace(go.Scatter(x=xs, y=ys, mode='lines', hoverinfo='skip', showlegend=False,
+                                 line=dict(color=color, width=2)))
+    # Arrow heads (annotations are per edge, so only for readable graph sizes)
+    if G.number_of_edges() <= 300:
+        for u, v, d in G.edges(data=True):
+            fig.add_annotation(x=pos[v][0], y=pos[v][1], ax=pos[u][0], ay=pos[u][1], xref='x', yref='y',
+                               axref='x', ayref='y', showarrow=True, arrowhead=3, arrowsize=1.2,
+                               arrowwidth=1 + 4 * d['weight'], opacity=0.7,
+                               arrowcolor='#00ff9f' if d['strength'] > 0 else '#ff0080',
+                               hovertext=f"{u} → {v} lag {d['lag']}: {d['strength']:+.2f}, persistence {d['persistence']:.2f}")
+    nodes = list(G.nodes)
+    influence = np.array([G.nodes[n]['influence'] for n in nodes])
+    fig.add_trace(go.Scatter(
+        x=[pos[n][0] for n in nodes], y=[pos[n][1] for n in nodes], mode='markers+text', text=nodes,
+        textposition='top center', showlegend=False,
+        marker=dict(size=18 + 30 * influence / max(influence.max(), 1e-9) if len(nodes) else 18,
+                    color=[G.nodes[n]['persistence'] for n in nodes], colorscale='Viridis', cmin=0, cmax=1,
+                    colorbar=dict(title='Persistence'), line=dict(color='#ffffff', width=1)),
+        hovertext=[f"{n}: influence {G.nodes[n]['influence']:.2f}, persistence {G.nodes[n]['persistence']:.2f}"
+                   for n in nodes], hoverinfo='text'))
+    fig.update_layout(template='plotly_dark', height=640, xaxis=dict(visible=False), yaxis=dict(visible=False),
+                      title=f"Lagged causal graph ({G.number_of_edges()} lagged links, max lag {G.graph.get('max_lag')})")
+    st.plotly_chart(fig, use_container_width=True)
+    return fig
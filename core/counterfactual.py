@@ -0,0 +1,224 @@
+"""VAR-based counterfactual ("what if we shock X?") simulator.
+
+A sparse VAR(p) is fitted once per returns panel and cached by a data
+fingerprint. Sparsity comes from OLS followed by a refit without the
+coefficients whose |t| < ``SPARSE_T``. The fit precomputes everything a
+what-if needs, up to ``MAX_HORIZON`` days:
+
+* the moving-average matrices ``Psi_h`` (response at ``h`` to a unit
+  innovation at 0);
+* the no-shock baseline forecast from the last observed lags.
+
+A shock of size ``s`` to asset ``k`` enters with its generalized impulse
+(Pesaran-Shin) contemporaneous impact ``b = s * Sigma[:, k] / Sigma[k, k]``.
+The response over ``h`` days is ``Psi[:h] @ b``. Responses for a whole
+grid of shocks x assets x horizons are a single einsum over the cached
+``Psi`` stack.
+
+Monte Carlo bands add simulated future innovations to the shocked forecast.
+A path's portfolio noise is the convolution of the innovations with the
+portfolio's ``Psi`` rows. It is computed for all paths at once with an FFT
+along time, so no path is stepped through day by day. The noise does not
+depend on the shock, and shorter horizons are prefixes of longer ones. It
+is therefore simulated once per model, weights and seed, for
+``MAX_HORIZON`` days, and cached. A slider change on the page then costs
+two cache lookups and a few vector operations.
+"""
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+from core.cache import ResultCache, make_key
+
+logger = logging.getLogger('counterfactual')
+
+VAR_LAGS = 2
+SPARSE_T = 2.0           # coefficients with smaller |t| are dropped and the equation refitted
+MAX_HORIZON = 365        # days of Psi / baseline precomputed per fit
+N_SIMS = 500             # Monte Carlo paths
+NOISE_SEED = 0           # fixed by default so bands do not flicker between slider moves
+BAND_QUANTILES = (0.05, 0.95)
+
+# Fitted models and simulated noise paths by data fingerprint, shared by every session
+_models = ResultCache('var_models', max_items=8, disk=False)
+_noise = ResultCache('var_noise', max_items=16, disk=False)
+
+
+def data_fingerprint(returns):
+    """Stable key for the content of a returns frame"""
+    digest = hashlib.sha256(np.ascontiguousarray(returns.to_numpy(dtype=float)).tobytes())
+    digest.update(repr((list(map(str, returns.columns)), str(returns.index[0]) if len(returns) else '',
+                        str(returns.index[-1]) if len(returns) else '')).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def _design(values, lags):
+    """Regressors [1, y(t-1), ..., y(t-p)] and targets y(t)"""
+    t = len(values)
+    x = np.hstack([np.ones((t - lags, 1))] + [values[lags - lag:t - lag] for lag in range(1, lags + 1)])
+    return x, values[lags:]
+
+
+def _ma_matrices(coefs, horizon):
+    """Psi_0..Psi_{horizon-1} from the VAR recursion Psi_h = sum_i A_i Psi_{h-i}"""
+    lags, n, _ = coefs.shape
+    psi = np.zeros((horizon, n, n))
+    psi[0] = np.eye(n)
+    for h in range(1, horizon):
+        for i in range(min(lags, h)):
+            psi[h] += coefs[i] @ psi[h - 1 - i]
+    return psi
+
+
+def fit_var(values, lags=VAR_LAGS, sparse_t=SPARSE_T, horizon=MAX_HORIZON):
+    """Sparse VAR(p) fit of a (time x assets) returns array plus its cached IRF state"""
+    values = np.asarray(values, dtype=float)
+    n = values.shape[1]
+    x, y = _design(values, lags)
+    n_obs, k = x.shape
+    beta, *_ = np.linalg.lstsq(x, y, rcond=None)                 # (k, n), all equations at once
+    resid = y - x @ beta
+    sigma_e = (resid ** 2).sum(axis=0) / max(n_obs - k, 1)
+    xtx_inv_diag = np.diag(np.linalg.pinv(x.T @ x))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_stats = beta / np.sqrt(np.outer(xtx_inv_diag, sigma_e))
+    keep = np.abs(np.nan_to_num(t_stats)) >= sparse_t
+    keep[0] = True                                                # intercepts always stay
+
+    # Refit each equation on its own support (the only per-asset loop, once per fit)
+    for j in np.flatnonzero(~keep.all(axis=0)):
+        cols = np.flatnonzero(keep[:, j])
+        beta[:, j] = 0.0
+        beta[cols, j] = np.linalg.lstsq(x[:, cols], y[:, j], rcond=None)[0]
+    resid = y - x @ beta
+    sigma = resid.T @ resid / max(n_obs - int(keep.sum(axis=0).mean()), 1)
+
+    intercept = beta[0]
+    coefs = beta[1:].reshape(lags, n, n).transpose(0, 2, 1)      # coefs[i] @ y(t-1-i)
+    psi = _ma_matrices(coefs, horizon)
+
+    # Deterministic no-shock forecast from the last ``lags`` observations
+    history = list(values[-lags:][::-1])
+    baseline = np.empty((horizon, n))
+    for h in range(horizon):
+        baseline[h] = intercept + sum(coefs[i] @ history[i] for i in range(lags))
+        history = [baseline[h]] + history[:-1]
+
+    return {
+        'lags': lags,
+        'intercept': intercept,
+        'coefs': coefs,
+        'sigma': sigma,
+        'psi': psi,
+        'baseline': baseline,
+        'density': float(keep[1:].mean()),
+        'n_obs': n_obs
+    }
+
+
+def get_var_model(returns, lags=VAR_LAGS):
+    """Fitted model for ``returns``, computed once per data version and shared"""
+    frame = returns.dropna(how='all').fillna(0.0)
+    key = make_key(data_fingerprint(frame), lags, SPARSE_T, MAX_HORIZON)
+    return _models.get_or_compute(key, lambda: dict(fit_var(frame.to_numpy(dtype=float), lags), key=key))
+
+
+def impact_vectors(model, assets, shocks):
+    """Contemporaneous impact of each (shock, asset) pair, shape (shocks, assets, n)"""
+    sigma = model['sigma']
+    assets = np.atleast_1d(assets)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        unit = np.nan_to_num(sigma[:, assets] / np.diag(sigma)[assets]).T      # (assets, n)
+    return np.asarray(shocks, dtype=float).reshape(-1)[:, None, None] * unit[None]
+
+
+def impulse_responses(model, assets, shocks, horizon):
+    """Return responses of every asset to every (shock, shocked asset) pair.
+
+    Shape (shocks, assets, horizon, n): one einsum over the cached Psi stack.
+    Shorter horizons are prefixes of the result."""
+    psi = _psi(model, horizon)
+    return np.einsum('hij,saj->sahi', psi, impact_vectors(model, assets, shocks))
+
+
+def _psi(model, horizon):
+    if horizon > len(model['psi']):
+        return _ma_matrices(model['coefs'], horizon)
+    return model['psi'][:horizon]
+
+
+def _baseline(model, horizon):
+    if horizon > len(model['baseline']):
+        # Beyond the precomputed window the forecast has converged to the unconditional mean
+        tail = np.repeat(model['baseline'][-1:], horizon - len(model['baseline']), axis=0)
+        return np.vstack([model['baseline'], tail])
+    return model['baseline'][:horizon]
+
+
+def simulate_noise(model, weights, horizon, n_sims, seed=None):
+    """Portfolio return noise from future innovations, shape (n_sims, horizon).
+
+    Day ``h`` noise is ``sum_s g[h - s] . eps[s]`` with ``g = weights @ Psi``.
+    It is a causal convolution, evaluated for all paths with one FFT."""
+    rng = np.random.default_rng(seed)
+    n = model['sigma'].shape[0]
+    chol = np.linalg.cholesky(model['sigma'] + 1e-12 * np.eye(n))
+    eps = rng.standard_normal((n_sims, horizon, n)) @ chol.T
+    g = np.einsum('i,hij->hj', weights, _psi(model, horizon))
+    size = 1 << int(np.ceil(np.log2(2 * horizon)))
+    spectrum = (np.fft.rfft(eps, size, axis=1) * np.fft.rfft(g, size, axis=0)[None]).sum(axis=2)
+    return np.fft.irfft(spectrum, size, axis=1)[:, :horizon]
+
+
+def _cached_noise(model, weights, horizon, n_sims, seed):
+    length = max(horizon, MAX_HORIZON)
+    key = make_key(model.get('key'), weights.round(12).tobytes(), length, n_sims, seed)
+    noise = _noise.get_or_compute(key, lambda: simulate_noise(model, weights, length, n_sims, seed))
+    return noise[:, :horizon]
+
+
+def what_if(returns, shock_asset, shock_size, steps=120, n_sims=N_SIMS, seed=NOISE_SEED, weights=None,
+            quantiles=BAND_QUANTILES, lags=VAR_LAGS):
+    """Counterfactual of a one-day ``shock_size`` return shock to ``shock_asset``.
+
+    Portfolio (equal-weight unless ``weights`` given) index levels starting
+    at 100, over ``steps`` days:
+        ``baseline``  no-shock forecast
+        ``shocked``   mean shocked path
+        ``lower`` / ``upper``  Monte Carlo band at ``quantiles``
+        ``paths``     every simulated shocked path (steps x n_sims; one
+                      noise-free column when ``n_sims`` is 0)
+        ``response``  per-asset daily return response to the shock (steps x assets)
+    """
+    model = get_var_model(returns, lags)
+    columns = list(returns.columns)
+    n = len(columns)
+    weights = np.full(n, 1.0 / n) if weights is None else np.asarray(weights, dtype=float)
+    k = columns.index(shock_asset)
+
+    response = impulse_responses(model, [k], [shock_size], steps)[0, 0]        # (steps, n)
+    base = _baseline(model, steps) @ weights
+    shocked = base + response @ weights
+    if n_sims:
+        noise = _cached_noise(model, weights, steps, n_sims, seed)
+        paths = 100 * np.cumprod(1 + shocked[None, :] + noise, axis=1)
+    else:
+        paths = 100 * np.cumprod(1 + shocked)[None, :]
+    low, high = np.quantile(paths, quantiles, axis=0)
+
+    days = pd.RangeIndex(1, steps + 1, name='day')
+    return {
+        'baseline': pd.Series(100 * np.cumprod(1 + base), index=days),
+        'shocked': pd.Series(paths.mean(axis=0), index=days),
+        'lower': pd.Series(low, index=days),
+        'upper': pd.Series(high, index=days),
+        'paths': pd.DataFrame(paths.T, index=days),
+        'response': pd.DataFrame(response, index=days, columns=columns),
+        'density': model['density']
+    }
+
+
+def counterfactual_sim(returns, shock_asset, shock_size, steps=120, n_sims=N_SIMS, seed=NOISE_SEED):
+    """Simulated shocked portfolio paths, a (steps x n_sims) frame of index levels"""
+    return what_if(returns, shock_asset, shock_size, steps, n_sims, seed)['paths']
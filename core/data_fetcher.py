@@ -1,13 +1,13 @@
-import yfinance as yf
 import pandas as pd
+from core.market_store import load_panel
 
 def get_train_test_data(symbol="SPY", period="2y", train_ratio=0.8):
-    data = yf.download(symbol, period=period, progress=False)['Close'].to_frame()
+    data = load_panel([symbol], "close", period).dropna()
     split = int(len(data) * train_ratio)
     return data.iloc[:split], data.iloc[split:]
 
 def get_multi_asset_data(symbols=None, period="2y"):
     if symbols is None:
         symbols = ["SPY", "QQQ", "IWM", "TLT", "GLD"]
-    data = yf.download(symbols, period=period, progress=False)['Close']
+    data = load_panel(symbols, "close", period)
     return data
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""Market-data providers behind core.market_store.
+
+All price access goes through ``get_provider()``. The active provider is
+chosen with ``set_provider`` or the ``MOONSHOT_DATA_PROVIDER`` env var:
+
+    yfinance              live Yahoo downloads (default, cached on disk)
+    synthetic[:seed]      deterministic correlated random panels, no network
+    replay:<directory>    recorded <SYMBOL>.csv files replayed from disk
+
+Every provider implements ``download(symbols, start)`` returning a dict of
+symbol -> DataFrame with lowercase open/high/low/close/volume columns on a
+DatetimeIndex of completed sessions.
+"""
+import os
+import zlib
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('data_providers')
+
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+
+
+class MarketDataProvider:
+    name = 'base'
+    cacheable = False   # True if results should be persisted by market_store
+
+    def download(self, symbols, start):
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = 'yfinance'
+    cacheable = True
+
+    def download(self, symbols, start):
+        """Download OHLCV bars from ``start`` for several symbols in one request"""
+        import yfinance as yf  # only needed when actually going to the network
+
+        df = yf.download(list(symbols), start=start.strftime('%Y-%m-%d'), progress=False,
+                         auto_adjust=True, threads=False, group_by='column')
+        frames = {}
+        if df is None or df.empty:
+            return frames
+        today = pd.Timestamp.today().normalize()
+        for symbol in symbols:
+            try:
+                frame = df.xs(symbol, axis=1, level=1) if isinstance(df.columns, pd.MultiIndex) else df
+            except KeyError:
+                continue
+            frame = frame.rename(columns=str.lower)
+            frame.index = pd.DatetimeIndex(frame.index).tz_localize(None).normalize()
+            # Only completed sessions are persisted; today's bar is still moving
+            frame = frame[(frame.index < today)].dropna(subset=['close'])
+            if not frame.empty:
+                frames[symbol] = frame.sort_index()
+        return frames
+
+
+class SyntheticProvider(MarketDataProvider):
+    """Seeded factor-model prices: same seed and symbol always give the same path.
+
+    Daily returns are ``mu + F @ beta + idio`` with ``n_factors`` common
+    factors shared by every symbol (so panels are correlated) and per-symbol
+    loadings and noise drawn from a generator keyed on (seed, symbol). Any
+    subset of symbols or start date slices the same underlying history."""
+    EPOCH = pd.Timestamp('2000-01-03')
+
+    def __init__(self, seed=42, n_factors=3, mu=0.0003, factor_vol=0.007, idio_vol=0.009):
+        self.seed = int(seed)
+        self.n_factors = n_factors
+        self.mu = mu
+        self.factor_vol = factor_vol
+        self.idio_vol = idio_vol
+        self.name = f'synthetic-{self.seed}'
+        self._dates = None
+        self._factors = None
+        self._lock = threading.Lock()
+
+    def _common(self):
+        with self._lock:
+            if self._dates is None:
+                end = pd.Timestamp.today().normalize() - pd.offsets.BDay(1)
+                self._dates = pd.bdate_range(self.EPOCH, end)
+                rng = np.random.default_rng(self.seed)
+                self._factors = rng.normal(0.0, self.factor_vol, (len(self._dates), self.n_factors))
+        return self._dates, self._factors
+
+    def _close(self, symbol, factors):
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        beta = np.r_[rng.normal(0.9, 0.2), rng.normal(0.0, 0.5, self.n_factors - 1)]
+        returns = self.mu + factors @ beta + rng.normal(0.0, self.idio_vol, len(factors))
+        return 100 * np.exp(np.cumsum(np.log1p(np.clip(returns, -0.5, None)))), rng
+
+    def _frame(self, symbol, dates, factors):
+        close, rng = self._close(symbol, factors)
+        n = len(dates)
+        prev_close = np.r_[100.0, close[:-1]]
+        open_ = prev_close * (1 + rng.normal(0.0, 0.002, n))
+        wick = np.abs(rng.normal(0.0, 0.004, (2, n)))
+        return pd.DataFrame({
+            'open': open_,
+            'high': np.maximum(open_, close) * (1 + wick[0]),
+            'low': np.minimum(open_, close) * (1 - wick[1]),
+            'close': close,
+            'volume': np.round(rng.lognormal(15.0, 0.4, n))
+        }, index=dates)
+
+    def download(self, symbols, start):
+        dates, factors = self._common()
+        first = dates.searchsorted(pd.Timestamp(start))
+        return {s: self._frame(s, dates, factors).iloc[first:] for s in symbols}
+
+    def panel(self, n_symbols, years, field='close'):
+        """Date x symbol panel of any size, e.g. ``panel(2000, 10)`` for load tests"""
+        symbols = [f'SYN{i:05d}' for i in range(n_symbols)]
+        start = pd.Timestamp.today().normalize() - pd.DateOffset(years=years)
+        dates, factors = self._common()
+        first = dates.searchsorted(start)
+        if field == 'close':
+            values = np.column_stack([self._close(s, factors)[0][first:] for s in symbols])
+            return pd.DataFrame(values, index=dates[first:], columns=symbols)
+        frames = self.download(symbols, start)
+        return pd.DataFrame({s: frames[s][field] for s in symbols})
+
+
+class FileReplayProvider(MarketDataProvider):
+    """Replays recorded ``<SYMBOL>.csv`` files (date index + OHLCV columns)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = f'replay-{os.path.basename(os.path.normpath(directory))}'
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _load(self, symbol):
+        with self._lock:
+            if symbol not in self._frames:
+                path = os.path.join(self.directory, f'{symbol}.csv')
+                if not os.path.exists(path):
+                    logger.warning(f"No replay file for {symbol} in {self.directory}")
+                    self._frames[symbol] = None
+                else:
+                    frame = pd.read_csv(path, index_col=0, parse_dates=True).rename(columns=str.lower)
+                    frame.index = pd.DatetimeIndex(frame.index).tz_localize(None).normalize()
+                    self._frames[symbol] = frame.reindex(columns=OHLCV).sort_index()
+        return self._frames[symbol]
+
+    def download(self, symbols, start):
+        frames = {}
+        for symbol in symbols:
+            frame = self._load(symbol)
+            if frame is not None:
+                frames[symbol] = frame[frame.index >= pd.Timestamp(start)]
+        return frames
+
+
+def provider_from_spec(spec):
+    """Build a provider from 'yfinance', 'synthetic[:seed]' or 'replay:<dir>'"""
+    kind, _, arg = spec.partition(':')
+    kind = kind.strip().lower()
+    if kind == 'yfinance':
+        return YFinanceProvider()
+    if kind == 'synthetic':
+        return SyntheticProvider(seed=int(arg) if arg else 42)
+    if kind == 'replay':
+        return FileReplayProvider(arg)
+    raise ValueError(f"Unknown data provider: {spec}")
+
+
+_provider = None
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = provider_from_spec(os.getenv('MOONSHOT_DATA_PROVIDER', 'yfinance'))
+    return _provider
+
+
+def set_provider(provider):
+    """Swap the process-wide provider (a provider instance or a spec string)"""
+    global _provider
+    _provider = provider_from_spec(provider) if isinstance(provider, str) else provider
+    return _provider
@@ -0,0 +1,167 @@
+"""SQLite access layer shared by the registries.
+
+``Database`` opens the file in WAL mode so readers never block on the
+writer. Each thread reads through its own connection. All writes go
+through one writer thread that owns the only write connection. Jobs
+submitted from any thread are drained in batches and committed together
+in a single transaction. Each job runs inside its own savepoint, so a
+failing job is rolled back and reported to its caller without discarding
+the rest of the batch.
+"""
+import os
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger('db')
+
+BUSY_TIMEOUT_MS = 5000
+MAX_BATCH = 512          # jobs grouped into one transaction
+
+
+def connect(path, readonly=False, check_same_thread=True):
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                         check_same_thread=check_same_thread)
+    db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    db.execute("PRAGMA foreign_keys = ON")
+    if readonly:
+        db.execute("PRAGMA query_only = ON")
+    else:
+        db.execute("PRAGMA journal_mode = WAL")
+        # WAL + NORMAL: durable across application crashes, one fsync per checkpoint
+        db.execute("PRAGMA synchronous = NORMAL")
+    return db
+
+
+class Database:
+    def __init__(self, path, max_batch=MAX_BATCH):
+        self.path = os.path.abspath(path)
+        self.max_batch = max_batch
+        self.commits = 0       # write transactions committed by this process
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._probe = None
+        self._probe_lock = threading.Lock()
+
+    # ------------------------------------------------------------ reads
+    def reader(self):
+        """This thread's read-only connection (opened on first use)"""
+        db = getattr(self._local, 'conn', None)
+        if db is None:
+            db = self._local.conn = connect(self.path, readonly=True)
+        return db
+
+    def read(self, sql, params=()):
+        return self.reader().execute(sql, params).fetchall()
+
+    def data_version(self):
+        """Counter that changes whenever any connection, in this process or
+        another one, commits to the file. Cheap enough to check on every read."""
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = connect(self.path, readonly=True, check_same_thread=False)
+            return self._probe.execute("PRAGMA data_version").fetchone()[0]
+
+    # ------------------------------------------------------------ writes
+    def submit(self, job):
+        """Queue ``job(conn)`` for the writer thread; returns a Future of its result"""
+        self._ensure_writer()
+        future = Future()
+        self._queue.put((job, future))
+        return future
+
+    def write(self, job):
+        """Run ``job(conn)`` in the writer's transaction and wait for its result"""
+        return self.submit(job).result()
+
+    def _ensure_writer(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                ready = Future()
+                self._thread = threading.Thread(target=self._run, args=(ready,),
+                                                name=f'db-writer-{os.path.basename(self.path)}', daemon=True)
+                self._thread.start()
+                ready.result()   # surface open/WAL errors to the first writer
+
+    def _run(self, ready):
+        try:
+            db = connect(self.path)
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(True)
+
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(job is None for job, _ in batch)
+            batch = [(job, future) for job, future in batch if job is not None]
+            if batch:
+                self._commit_batch(db, batch)
+            if stop:
+                db.close()
+                return
+
+    def _commit_batch(self, db, batch):
+        results = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for job, future in batch:
+                db.execute("SAVEPOINT job")
+                try:
+                    results.append((future, job(db), None))
+                    db.execute("RELEASE job")
+                except Exception as e:
+                    db.execute("ROLLBACK TO job")
+                    db.execute("RELEASE job")
+                    results.append((future, None, e))
+            db.execute("COMMIT")
+            self.commits += 1
+        except Exception as e:
+            logger.error(f"Write transaction on {self.path} failed: {e}")
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for future, value, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+    def close(self):
+        """Flush queued writes and stop the writer thread"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put((None, None))
+            self._thread.join()
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path):
+    """Process-wide ``Database`` for ``path`` (one writer per file)"""
+    path = os.path.abspath(path)
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = Database(path)
+        return _databases[path]
+
+
+@atexit.register
+def _close_all():
+    for database in list(_databases.values()):
+        database.close()
@@ -1,20 +1,713 @@
-import streamlit as st
+"""Genetic-programming alpha evolution.
+
+Alphas are typed expression trees (deap) over one in-memory panel of daily
+data for ``EVO_UNIVERSE``. The terminals are returns, log prices and log
+volumes. The primitives are rolling (time-series) operators,
+cross-sectional ranks and z-scores, and arithmetic. A tree evaluates to a
+(dates x assets) signal. Each day the signal is demeaned across assets and
+scaled to unit gross exposure, giving a dollar-neutral book traded at the
+next close. Fitness is the in-sample Sharpe net of turnover costs, minus a
+small per-node parsimony penalty. The last ``1 - TRAIN_SHARE`` of the
+sample is held out for the out-of-sample metrics of the elite.
+
+Signals for a batch of individuals are stacked, and positions, P&L, costs
+and Sharpe ratios are computed for the whole batch with array operations.
+Identical expressions are evaluated once per generation, and a
+``SubtreeCache`` keeps the intermediate arrays of canonicalized subtrees
+(LRU, bounded in bytes) for the whole run. A rolling mean or rank shared
+by many individuals is computed once, not once per tree. Across cores, a
+``FitnessPool`` of worker processes shares the panel as a memory-mapped file
+and exchanges only expression strings and fitness values.
+
+Part of the initial population is seeded from the LLM hypotheses. Keywords
+map each hypothesis to template expressions ("momentum" -> trend signals,
+"reversal" -> mean reversion, ...). Descendants keep the hypothesis they
+came from, which names the resulting alpha.
+"""
+import os
+import time
+import random
+import shutil
+import hashlib
+import logging
+import tempfile
+import functools
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from deap import base, creator, gp, tools, algorithms
+
+from core.market_store import load_panel
 from core.causal_engine import swarm_generate_hypotheses
 
-def evolve_new_alpha():
-    hypotheses = swarm_generate_hypotheses(10)
-    
+logger = logging.getLogger('evo_factory')
+
+EVO_UNIVERSE = ["SPY", "QQQ", "IWM", "DIA", "TLT", "IEF", "GLD", "SLV", "USO", "EEM",
+                "EFA", "XLE", "XLF", "XLK", "XLV", "XLI", "XLY", "XLP", "XLU", "XLB"]
+EVO_PERIOD = "5y"
+POPULATION = 1200
+GENERATIONS = 50
+CXPB, MUTPB = 0.6, 0.3
+TOURNAMENT = 3
+MAX_HEIGHT = 7              # bloat limit on tree height
+SEED_SHARE = 0.3            # share of the initial population seeded from hypotheses
+TRAIN_SHARE = 0.7
+COST_BPS = 5.0              # per unit of turnover
+PARSIMONY = 0.002           # Sharpe penalty per tree node
+ELITE_SIZE = 10
+ELITE_MAX_CORR = 0.7        # elite members' P&L must be less correlated than this
+HALL_OF_FAME = 200
+EVAL_CHUNK = 128            # individuals per stacked fitness batch
+SUBTREE_CACHE_MB = 256      # memo of intermediate arrays per process (each pool worker has its own)
+WINDOWS = (5, 10, 21, 63, 126)
+MAX_WINDOW = 252
+
+
+# ---------------------------------------------------------------- primitives
+# Every series is a float64 (dates x assets) array; NaN marks warm-up rows.
+
+class Window(int):
+    """Look-back length in bars (a distinct GP type, so windows only go where windows fit)"""
+
+
+def _rolling_sum(x, w):
+    c = np.cumsum(np.where(np.isfinite(x), x, 0.0), axis=0)
+    out = np.full_like(c, np.nan)
+    if w <= len(x):
+        out[w - 1] = c[w - 1]
+        out[w:] = c[w:] - c[:-w]
+    return out
+
+
+def ts_mean(x, w):
+    return _rolling_sum(x, w) / w
+
+
+def ts_std(x, w):
+    w = max(int(w), 2)
+    mean = ts_mean(x, w)
+    var = (_rolling_sum(x * x, w) - w * mean * mean) / (w - 1)
+    return np.sqrt(np.clip(var, 0.0, None))
+
+
+def lag(x, w):
+    out = np.full_like(x, np.nan)
+    out[w:] = x[:-w]
+    return out
+
+
+def ts_delta(x, w):
+    return x - lag(x, w)
+
+
+def ts_zscore(x, w):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (x - ts_mean(x, w)) / ts_std(x, w)
+
+
+def cs_rank(x):
+    """Cross-sectional rank of the finite values scaled to [-0.5, 0.5]; others stay NaN"""
+    valid = np.isfinite(x)
+    # Non-finite values sort last, so the finite ones take ranks 0 .. count - 1
+    ranks = np.argsort(np.argsort(np.where(valid, x, np.inf), axis=1), axis=1)
+    count = valid.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scaled = np.where(count > 1, ranks / (count - 1) - 0.5, 0.0)
+    return np.where(valid, scaled, np.nan)
+
+
+def cs_zscore(x):
+    valid = np.isfinite(x)
+    count = np.maximum(valid.sum(axis=1, keepdims=True), 1)
+    centered = x - np.where(valid, x, 0.0).sum(axis=1, keepdims=True) / count
+    std = np.sqrt(np.where(valid, centered * centered, 0.0).sum(axis=1, keepdims=True) / count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return centered / std
+
+
+def longer(w):
+    return Window(min(2 * w, MAX_WINDOW))
+
+
+PRIMITIVES = {
+    'add': np.add, 'sub': np.subtract, 'mul': np.multiply, 'neg': np.negative,
+    'sign': np.sign, 'absval': np.abs,
+    'ts_mean': ts_mean, 'ts_std': ts_std, 'ts_delta': ts_delta, 'ts_zscore': ts_zscore, 'lag': lag,
+    'cs_rank': cs_rank, 'cs_zscore': cs_zscore, 'longer': longer,
+}
+FEATURES = ('ret', 'logp', 'logvol')
+WINDOW_TERMINALS = {f'w{w}': Window(w) for w in WINDOWS}
+
+
+def _build_pset():
+    pset = gp.PrimitiveSetTyped('alpha', [], np.ndarray)
+    for name in ('add', 'sub', 'mul'):
+        pset.addPrimitive(PRIMITIVES[name], [np.ndarray, np.ndarray], np.ndarray, name=name)
+    for name in ('neg', 'sign', 'absval', 'cs_rank', 'cs_zscore'):
+        pset.addPrimitive(PRIMITIVES[name], [np.ndarray], np.ndarray, name=name)
+    for name in ('ts_mean', 'ts_std', 'ts_delta', 'ts_zscore', 'lag'):
+        pset.addPrimitive(PRIMITIVES[name], [np.ndarray, Window], np.ndarray, name=name)
+    # Typed generation needs a primitive of every type, windows included
+    pset.addPrimitive(longer, [Window], Window, name='longer')
+    for feature in FEATURES:
+        pset.addTerminal(feature, np.ndarray, name=feature)
+    # Named window terminals keep expression strings parseable by ``from_string``
+    for name, window in WINDOW_TERMINALS.items():
+        pset.addTerminal(window, Window, name=name)
+    return pset
+
+
+PSET = _build_pset()
+if not hasattr(creator, 'AlphaFitness'):
+    creator.create('AlphaFitness', base.Fitness, weights=(1.0,))
+    creator.create('AlphaTree', gp.PrimitiveTree, fitness=creator.AlphaFitness, hypothesis=None)
+
+
+# ---------------------------------------------------------------- data
+
+class Panel:
+    """Aligned (dates x assets) feature arrays the trees are evaluated against"""
+
+    def __init__(self, features, split, index=None, symbols=None):
+        self.features = features
+        self.returns = features['ret']
+        self.split = split
+        self.index = index
+        self.symbols = symbols
+
+    @classmethod
+    def from_frames(cls, close, volume=None):
+        close = close.sort_index().ffill().dropna(how='any')
+        prices = close.to_numpy(dtype=float)
+        returns = np.zeros_like(prices)
+        returns[1:] = prices[1:] / prices[:-1] - 1
+        logvol = np.zeros_like(prices)
+        if volume is not None and not volume.empty:
+            vol = volume.reindex(index=close.index, columns=close.columns).ffill().to_numpy(dtype=float)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                logvol = np.nan_to_num(np.log(vol), nan=0.0, posinf=0.0, neginf=0.0)
+        features = {'ret': returns, 'logp': np.log(prices), 'logvol': logvol}
+        return cls(features, int(len(prices) * TRAIN_SHARE), close.index, list(close.columns))
+
+    @classmethod
+    def load(cls, symbols=None, period=EVO_PERIOD):
+        symbols = symbols or EVO_UNIVERSE
+        close = load_panel(symbols, 'close', period)
+        try:
+            volume = load_panel(symbols, 'volume', period)
+        except Exception as e:
+            logger.warning(f"No volume panel ({e}); log-volume terminal is flat")
+            volume = None
+        close = close.dropna(axis=1, thresh=int(0.9 * len(close)))
+        return cls.from_frames(close, volume)
+
+
+# ---------------------------------------------------------------- evaluation
+
+COMMUTATIVE = {'add', 'mul'}
+IDEMPOTENT = {'sign', 'absval', 'cs_rank'}     # f(f(x)) == f(x)
+
+
+def _form_key(head, args):
+    return hashlib.blake2b(repr((head, args)).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def canonical_keys(tree):
+    """Canonical key of every node's subtree, plus child positions and folded windows.
+
+    Window subtrees fold to their value and commutative arguments are
+    ordered. ``neg(neg(x))``, ``absval(neg(x))`` and ``f(f(x))`` for
+    idempotent ``f`` reduce to their simpler forms. Subtrees that always
+    compute the same array therefore share a key."""
+    keys, children, windows = [None] * len(tree), [()] * len(tree), [None] * len(tree)
+    forms = {}                  # key -> (head, argument keys)
+    stack = []
+    for i in range(len(tree) - 1, -1, -1):
+        node = tree[i]
+        if not isinstance(node, gp.Primitive):
+            if node.value in WINDOW_TERMINALS:
+                windows[i] = WINDOW_TERMINALS[node.value]
+                keys[i] = f'w{int(windows[i])}'
+            else:
+                keys[i] = node.value
+            forms[keys[i]] = (keys[i], ())
+            stack.append(i)
+            continue
+        kids = tuple(stack.pop() for _ in range(node.arity))
+        children[i] = kids
+        args = tuple(keys[k] for k in kids)
+        if node.ret is Window:
+            windows[i] = PRIMITIVES[node.name](*(windows[k] for k in kids))
+            keys[i] = f'w{int(windows[i])}'
+            forms[keys[i]] = (keys[i], ())
+        elif node.name in IDEMPOTENT and forms[args[0]][0] == node.name:
+            keys[i] = args[0]
+        elif node.name == 'neg' and forms[args[0]][0] == 'neg':
+            keys[i] = forms[args[0]][1][0]
+        else:
+            head = node.name
+            if head == 'absval' and forms[args[0]][0] == 'neg':
+                args = forms[args[0]][1]
+            elif head in COMMUTATIVE:
+                args = tuple(sorted(args))
+            keys[i] = _form_key(head, args)
+            forms[keys[i]] = (head, args)
+        stack.append(i)
+    return keys, children, windows
+
+
+class SubtreeCache:
+    """LRU of intermediate signal arrays by canonical subtree key, bounded in bytes.
+
+    Entries are marked read-only; they are shared by every tree containing
+    the subtree."""
+
+    def __init__(self, max_bytes=SUBTREE_CACHE_MB << 20):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self._items or value.nbytes > self.max_bytes:
+            return
+        value.flags.writeable = False
+        self._items[key] = value
+        self.bytes += value.nbytes
+        while self.bytes > self.max_bytes:
+            _, old = self._items.popitem(last=False)
+            self.bytes -= old.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        return {'items': len(self._items), 'bytes': self.bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+    @staticmethod
+    def summary(stats):
+        """Totals over the ``stats()`` of several caches, with hit rate and MB"""
+        total = {k: sum(s[k] for s in stats) for k in ('items', 'bytes', 'hits', 'misses', 'evictions')}
+        lookups = total['hits'] + total['misses']
+        total['hit_rate'] = total['hits'] / lookups if lookups else 0.0
+        total['mb'] = total['bytes'] / (1 << 20)
+        return total
+
+
+def evaluate_tree(tree, panel, cache=None):
+    """Signal array of ``tree`` on ``panel``.
+
+    Without a cache the prefix list is evaluated right to left on a stack.
+    With a ``SubtreeCache`` the tree is walked top down, and any subtree
+    found under its canonical key is not descended into."""
+    # Evolved arithmetic overflows freely; non-finite values become flat positions
+    with np.errstate(all='ignore'):
+        if cache is None:
+            stack = []
+            for node in reversed(tree):
+                if isinstance(node, gp.Primitive):
+                    args = [stack.pop() for _ in range(node.arity)]
+                    stack.append(PRIMITIVES[node.name](*args))
+                elif node.value in WINDOW_TERMINALS:
+                    stack.append(WINDOW_TERMINALS[node.value])
+                else:
+                    stack.append(panel.features[node.value])
+            return stack[0]
+
+        keys, children, windows = canonical_keys(tree)
+
+        def value(i):
+            if windows[i] is not None:
+                return windows[i]
+            if not isinstance(tree[i], gp.Primitive):
+                return panel.features[tree[i].value]
+            out = cache.get(keys[i])
+            if out is None:
+                out = PRIMITIVES[tree[i].name](*(value(k) for k in children[i]))
+                cache.put(keys[i], out)
+            return out
+
+        return value(0)
+
+
+def positions(signals):
+    """Dollar-neutral, unit-gross weights from a stack of (..., dates, assets) signals"""
+    s = np.where(np.isfinite(signals), signals, 0.0)
+    s = s - s.mean(axis=-1, keepdims=True)
+    gross = np.abs(s).sum(axis=-1, keepdims=True)
+    return np.divide(s, gross, out=np.zeros_like(s), where=gross > 1e-12)
+
+
+def portfolio_returns(signals, returns, cost_bps=COST_BPS):
+    """Net daily P&L, (..., dates - 1), of trading each signal at the next close"""
+    w = positions(signals)
+    pnl = (w[..., :-1, :] * returns[1:]).sum(axis=-1)
+    turnover = np.abs(np.diff(w[..., :-1, :], axis=-2, prepend=0.0)).sum(axis=-1)
+    return pnl - turnover * cost_bps / 1e4
+
+
+def sharpe(pnl):
+    std = pnl.std(axis=-1)
+    return np.divide(pnl.mean(axis=-1), std, out=np.zeros(pnl.shape[:-1]), where=std > 1e-12) * np.sqrt(252)
+
+
+def batch_fitness(trees, panel, cache=None):
+    """In-sample Sharpe of each tree; signals are stacked per ``EVAL_CHUNK`` batch"""
+    out = np.empty(len(trees))
+    for start in range(0, len(trees), EVAL_CHUNK):
+        chunk = trees[start:start + EVAL_CHUNK]
+        signals = np.stack([evaluate_tree(t, panel, cache) for t in chunk])
+        pnl = portfolio_returns(signals[:, :panel.split + 1], panel.returns[:panel.split + 1])
+        out[start:start + len(chunk)] = sharpe(pnl)
+    return out
+
+
+def evaluate_population(individuals, panel, pool=None, cache=None):
+    """Assign fitness to ``individuals``, evaluating each distinct expression once
+    (on ``pool`` when given, otherwise here with ``cache``)"""
+    by_expr = {}
+    for ind in individuals:
+        by_expr.setdefault(str(ind), []).append(ind)
+    exprs = list(by_expr)
+    if pool is not None:
+        scores = pool.score(exprs)
+    else:
+        scores = batch_fitness([by_expr[e][0] for e in exprs], panel, cache)
+    for expr, score in zip(exprs, scores):
+        for ind in by_expr[expr]:
+            ind.fitness.values = (float(score) - PARSIMONY * len(ind),)
+    return len(exprs)
+
+
+# ---------------------------------------------------------------- process pool
+# Workers map the panel from a .npy file once, when they start, and are then
+# sent only expression strings; they send back one fitness value per string.
+# Tasks are a few hundred milliseconds of array work with a few kilobytes of
+# payload either way, so throughput scales with the number of cores. Each
+# worker keeps its own subtree cache for the life of the pool. Workers are
+# started from a fork server (spawn where there is none), never forked from
+# the caller: the Streamlit server is multithreaded, and a fork taken while
+# another thread holds a lock leaves that lock held forever in the child.
+
+_worker_panel = None
+_worker_cache = None
+
+
+def _attach_panel(path, split, cache_bytes):
+    global _worker_panel, _worker_cache
+    stacked = np.load(path, mmap_mode='r')
+    _worker_panel = Panel(dict(zip(FEATURES, stacked)), split)
+    _worker_cache = SubtreeCache(cache_bytes) if cache_bytes else None
+
+
+def _score_exprs(exprs):
+    scores = batch_fitness([gp.PrimitiveTree.from_string(e, PSET) for e in exprs], _worker_panel, _worker_cache)
+    return scores, os.getpid(), _worker_cache.stats() if _worker_cache is not None else None
+
+
+class FitnessPool:
+    """Process pool scoring expression strings against a memory-mapped copy of ``panel``.
+
+    Use as a context manager around a whole evolution run; the panel is
+    written and the workers are started once. If the pool fails, scoring
+    continues serially in this process."""
+
+    def __init__(self, panel, workers=None, cache_mb=SUBTREE_CACHE_MB):
+        self.panel = panel
+        self.workers = workers or os.cpu_count() or 1
+        # Per process, so (workers + 1) * cache_mb at most in total; splitting one
+        # budget would leave each worker too small a cache on a many-core box
+        self.cache_bytes = int(cache_mb) << 20
+        # Used for serial fallback scoring and by the caller for the final elite
+        self.cache = SubtreeCache(self.cache_bytes) if cache_mb else None
+        self._worker_stats = {}
+        self._dir = None
+        self._pool = None
+
+    def __enter__(self):
+        self._dir = tempfile.mkdtemp(prefix='evo_panel_')
+        path = os.path.join(self._dir, 'panel.npy')
+        np.save(path, np.stack([self.panel.features[f] for f in FEATURES]))
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method),
+                                         initializer=_attach_panel, initargs=(path, self.panel.split, self.cache_bytes))
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+    def score(self, exprs):
+        """In-sample Sharpe of each expression string, in order"""
+        if self._pool is not None and exprs:
+            # About four tasks per worker evens out uneven tree costs
+            size = min(EVAL_CHUNK, -(-len(exprs) // (4 * self.workers)))
+            chunks = [exprs[i:i + size] for i in range(0, len(exprs), size)]
+            try:
+                results = list(self._pool.map(_score_exprs, chunks))
+                for _, pid, stats in results:
+                    if stats is not None:
+                        self._worker_stats[pid] = stats
+                return np.concatenate([scores for scores, _, _ in results])
+            except Exception as e:
+                logger.warning(f"Fitness pool failed ({e}); evaluating serially")
+                self.close()
+        return batch_fitness([gp.PrimitiveTree.from_string(e, PSET) for e in exprs], self.panel, self.cache)
+
+    def cache_stats(self):
+        """Subtree cache totals over the workers and this process; ``workers``
+        holds the summary of each worker's own cache, to size ``cache_mb`` by"""
+        local = [self.cache.stats()] if self.cache is not None else []
+        total = SubtreeCache.summary(list(self._worker_stats.values()) + local)
+        total['workers'] = [SubtreeCache.summary([s]) for s in self._worker_stats.values()]
+        return total
+
+
+# ---------------------------------------------------------------- seeding
+
+SEED_TEMPLATES = (
+    (('momentum', 'trend', 'drive', 'lead', 'boost', 'lift', 'predict'),
+     ('ts_mean(ret, w{w})', 'cs_rank(ts_delta(logp, w{w}))')),
+    (('reversion', 'reversal', 'overreact', 'spike', 'squeeze'),
+     ('neg(ts_zscore(logp, w{w}))', 'neg(cs_rank(ts_mean(ret, w{w})))')),
+    (('volatility', 'vol', 'gamma', 'risk', 'crash', 'drawdown'),
+     ('neg(ts_std(ret, w{w}))', 'neg(cs_zscore(ts_std(ret, w{w})))')),
+    (('flow', 'volume', 'liquidity', 'dark pool', 'accumulation', 'crowding', 'broker'),
+     ('ts_zscore(logvol, w{w})', 'mul(cs_rank(ts_mean(logvol, w{w})), sign(ts_mean(ret, w{w})))')),
+    (('rotation', 'sector', 'cross-asset', 'correlation', 'regime', 'capex'),
+     ('cs_rank(ts_delta(logp, w{w}))', 'sub(cs_rank(ts_mean(ret, w{w})), cs_rank(ts_std(ret, w{w})))')),
+)
+
+
+def hypothesis_templates(hypothesis):
+    text = hypothesis.lower()
+    matched = [t for keys, templates in SEED_TEMPLATES if any(k in text for k in keys) for t in templates]
+    return matched or [t for _, templates in SEED_TEMPLATES for t in templates]
+
+
+def _tree(expr, hypothesis=None):
+    ind = creator.AlphaTree(gp.PrimitiveTree.from_string(expr, PSET))
+    ind.hypothesis = hypothesis
+    return ind
+
+
+def seed_population(hypotheses, size, toolbox):
+    """``SEED_SHARE`` of ``size`` from hypothesis templates (half of them mutated), the rest random"""
+    population = []
+    n_seeded = int(size * SEED_SHARE) if hypotheses else 0
+    for k in range(n_seeded):
+        hypothesis = hypotheses[k % len(hypotheses)]
+        ind = _tree(random.choice(hypothesis_templates(hypothesis)).format(w=random.choice(WINDOWS)), hypothesis)
+        if random.random() < 0.5:
+            ind, = toolbox.mutate(ind)
+        population.append(ind)
+    population += toolbox.population(n=size - n_seeded)
+    return population
+
+
+def _toolbox():
+    toolbox = base.Toolbox()
+    toolbox.register('expr', gp.genHalfAndHalf, pset=PSET, min_=1, max_=4)
+    toolbox.register('individual', tools.initIterate, creator.AlphaTree, toolbox.expr)
+    toolbox.register('population', tools.initRepeat, list, toolbox.individual)
+    toolbox.register('select', tools.selTournament, tournsize=TOURNAMENT)
+    toolbox.register('mate', gp.cxOnePoint)
+    toolbox.register('expr_mut', gp.genFull, min_=0, max_=2)
+    toolbox.register('mutate', gp.mutUniform, expr=toolbox.expr_mut, pset=PSET)
+    limit = gp.staticLimit(key=lambda ind: ind.height, max_value=MAX_HEIGHT)
+    toolbox.decorate('mate', limit)
+    toolbox.decorate('mutate', limit)
+    return toolbox
+
+
+# ---------------------------------------------------------------- evolution
+
+def _elite_metrics(trees, panel, cache=None):
+    """Full-sample P&L and per-tree metrics for the final candidates"""
+    signals = np.stack([evaluate_tree(t, panel, cache) for t in trees])
+    pnl = portfolio_returns(signals, panel.returns)
+    split = panel.split
+    dates = panel.index[1:]
+    months = np.asarray(dates.year * 12 + dates.month)
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    monthly = np.add.reduceat(pnl, starts, axis=1)
+    years = np.array_split(np.arange(pnl.shape[1]), max(1, pnl.shape[1] // 252))
+    equity = np.cumprod(1 + pnl[:, split:], axis=1)
+    return pnl, {
+        'in_sample_sharpe': sharpe(pnl[:, :split]),
+        'sharpe': sharpe(pnl[:, split:]),
+        'oos_return': pnl[:, split:].mean(axis=1) * 252 * 100,
+        'persistence': (monthly > 0).mean(axis=1),
+        'consistency': np.mean([sharpe(pnl[:, y]) > 0 for y in years], axis=0),
+        'max_drawdown': -(equity / np.maximum.accumulate(equity, axis=1) - 1).min(axis=1),
+    }
+
+
+def _book_signal(weights, returns):
+    """Long/flat view of an evolved book for a one-symbol backtest: long on the
+    days the book holds ``returns.name``, flat where it is short or absent"""
+    if returns.name not in weights:
+        return np.zeros(len(returns))
+    return weights[returns.name].reindex(returns.index).fillna(0.0).to_numpy()
+
+
+def select_elite(candidates, panel, size=ELITE_SIZE, max_corr=ELITE_MAX_CORR, cache=None):
+    """Best candidates whose P&L streams are mutually less correlated than ``max_corr``.
+
+    Each alpha carries its tree's daily weights as a ``signal`` callable, so
+    the execution lab backtests the evolved book rather than a default rule."""
+    pnl, metrics = _elite_metrics(candidates, panel, cache)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.nan_to_num(np.corrcoef(pnl)) if len(pnl) > 1 else np.ones((1, 1))
+    chosen = []
+    for i in range(len(candidates)):
+        if metrics['in_sample_sharpe'][i] <= 0:
+            continue
+        if all(abs(corr[i, j]) < max_corr for j in chosen):
+            chosen.append(i)
+        if len(chosen) == size:
+            break
     elite = []
-    for h in hypotheses:
-        clean_name = h[:80].strip()  # clean short name
+    for i in chosen:
+        others = [abs(corr[i, j]) for j in chosen if j != i]
+        expr = str(candidates[i])
+        hypothesis = candidates[i].hypothesis or "GP discovery"
+        weights = pd.DataFrame(positions(evaluate_tree(candidates[i], panel, cache)), index=panel.index,
+                               columns=panel.symbols)
         elite.append({
-            "name": clean_name,
-            "sharpe": round(3.1 + (hash(h) % 15)/10, 1),
-            "persistence": round(0.85 + (hash(h) % 15)/100, 2),
-            "oos_return": round(19 + (hash(h) % 28), 1),
-            "hypothesis": h
+            'name': f"{hypothesis[:60]} #{hashlib.sha1(expr.encode()).hexdigest()[:6]}",
+            'sharpe': round(float(metrics['sharpe'][i]), 2),
+            'persistence': round(float(metrics['persistence'][i]), 2),
+            'oos_return': round(float(metrics['oos_return'][i]), 1),
+            'in_sample_sharpe': round(float(metrics['in_sample_sharpe'][i]), 2),
+            'diversity': round(1 - float(max(others, default=0.0)), 2),
+            'consistency': round(float(metrics['consistency'][i]), 2),
+            'max_drawdown': round(float(metrics['max_drawdown'][i]), 4),
+            'hypothesis': hypothesis,
+            'expression': expr,
+            'returns_series': pnl[i, panel.split:].round(8).tolist(),
+            'backtest_period': f"{panel.index[0].date()}_to_{panel.index[-1].date()}",
+            'signal': functools.partial(_book_signal, weights),
         })
-    
-    st.session_state.elite_alphas = elite
-    st.success(f"✅ {len(elite)} Multi-Factor Alphas Evolved & Deployed to Paper Trading")
-    return elite
\ No newline at end of file
+    return elite
+
+
+def evolve(hypotheses, panel=None, population=POPULATION, generations=GENERATIONS, seed=None,
+           workers=None, cache_mb=SUBTREE_CACHE_MB):
+    """Evolve ``population`` trees for ``generations`` and return the decorrelated elite.
+
+    Fitness runs on a process pool of ``workers`` (default: all cores);
+    ``workers=1`` evaluates in this process. Intermediate arrays are
+    memoized by canonical subtree for the whole run, in at most
+    ``cache_mb`` per process (0 disables the cache)."""
+    panel = panel or Panel.load()
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        with FitnessPool(panel, workers, cache_mb) as pool:
+            return _evolve(hypotheses, panel, population, generations, seed, pool, pool.cache)
+    cache = SubtreeCache(int(cache_mb) << 20) if cache_mb else None
+    return _evolve(hypotheses, panel, population, generations, seed, None, cache)
+
+
+def _cache_report(pool, cache):
+    stats = pool.cache_stats() if pool is not None else SubtreeCache.summary([cache.stats()] if cache else [])
+    report = (f"subtree cache {stats['hit_rate']:.0%} hits, {stats['items']} arrays, {stats['mb']:.0f}MB, "
+              f"{stats['evictions']} evicted")
+    workers = stats.get('workers')
+    if workers:
+        # A worker sees only its share of each generation; evictions here mean cache_mb is too small
+        rates = np.percentile([w['hit_rate'] for w in workers], [0, 50, 100])
+        report += (f"; per worker ({len(workers)}) hits {rates[0]:.0%}/{rates[1]:.0%}/{rates[2]:.0%} "
+                   f"min/median/max, up to {max(w['mb'] for w in workers):.0f}MB, "
+                   f"{max(w['evictions'] for w in workers)} evicted")
+    return report
+
+
+@contextmanager
+def _seeded_random(seed):
+    """Seed the process-wide ``random`` (which deap draws from) for one run and
+    restore the caller's state afterwards, so the app's other users of
+    ``random`` are not made deterministic"""
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+
+
+def _evolve(hypotheses, panel, population, generations, seed, pool, cache):
+    with _seeded_random(seed):
+        return _run_evolution(hypotheses, panel, population, generations, pool, cache)
+
+
+def _run_evolution(hypotheses, panel, population, generations, pool, cache):
+    toolbox = _toolbox()
+    start = time.perf_counter()
+
+    pop = seed_population(list(hypotheses or []), population, toolbox)
+    evaluated = evaluate_population(pop, panel, pool, cache)
+    hof = tools.HallOfFame(HALL_OF_FAME)
+    hof.update(pop)
+    for gen in range(1, generations + 1):
+        offspring = algorithms.varAnd(toolbox.select(pop, len(pop)), toolbox, CXPB, MUTPB)
+        evaluated += evaluate_population([ind for ind in offspring if not ind.fitness.valid], panel, pool, cache)
+        # Keep the best individuals found so far in the breeding pool
+        offspring[-len(hof[:ELITE_SIZE]):] = [toolbox.clone(ind) for ind in hof[:ELITE_SIZE]]
+        pop[:] = offspring
+        hof.update(pop)
+        if gen % 10 == 0 or gen == generations:
+            logger.info(f"Generation {gen}/{generations}: best {hof[0].fitness.values[0]:.2f} "
+                        f"({str(hof[0])[:80]}), {evaluated} evaluations, {time.perf_counter() - start:.1f}s, "
+                        f"{_cache_report(pool, cache)}")
+
+    elite = select_elite(list(hof), panel, cache=cache)
+    logger.info(f"Evolved {len(elite)} elite alphas from {population}x{generations} in "
+                f"{time.perf_counter() - start:.1f}s ({evaluated} distinct evaluations, {_cache_report(pool, cache)})")
+    return elite
+
+
+def evolve_new_alpha(ui_context=True, population=POPULATION, generations=GENERATIONS, seed=None, workers=None,
+                     cache_mb=SUBTREE_CACHE_MB):
+    """One evolution cycle: hypotheses -> GP evolution -> registry (paper trading).
+
+    ``ui_context`` publishes the elite to the Streamlit session and, unless
+    ``workers`` is given, evaluates in the app process rather than starting
+    a pool per click; the worker passes False and uses every core."""
+    from core.registry import save_alphas
+
+    if ui_context and workers is None:
+        workers = 1
+    hypotheses = swarm_generate_hypotheses(10)
+    elite = evolve(hypotheses, population=population, generations=generations, seed=seed, workers=workers,
+                   cache_mb=cache_mb)
+    if elite:
+        saved = save_alphas(pd.DataFrame([dict(a, description=f"{a['hypothesis']} | {a['expression']}",
+                                               persistence_score=a['persistence']) for a in elite]),
+                            auto_deploy=True)
+        logger.info(f"{int(saved['accepted'].sum())}/{len(elite)} elite alphas passed the registry criteria")
+
+    if ui_context:
+        import streamlit as st
+        st.session_state.elite_alphas = elite
+        st.success(f"✅ {len(elite)} Multi-Factor Alphas Evolved & Deployed to Paper Trading")
+    return elite
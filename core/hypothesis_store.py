@@ -0,0 +1,245 @@
+"""Persistent store of generated causal hypotheses.
+
+Every hypothesis the swarm produces is recorded once, under a normalized-text
+key, with the agent, model, temperature and prompt that produced it. Near
+duplicates ("Dark pool prints signal momentum" vs "Dark-pool prints signal
+momentum shifts") are caught with MinHash signatures over character
+shingles. An LSH band index proposes candidates and an exact Jaccard check
+confirms them. A near duplicate only bumps the ``seen`` count of the
+hypothesis it repeats.
+
+The LSH index lives in memory and is topped up from the database whenever
+another connection (e.g. the evolution worker) has committed. Writes go
+through the shared ``core.db`` writer without waiting, so screening a
+streamed hypothesis does not stall the swarm's event loop.
+``take_fresh`` hands out hypotheses no evolution run has used yet, which
+makes generation cache-first.
+"""
+import os
+import re
+import json
+import zlib
+import hashlib
+import logging
+import threading
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from core.db import get_database
+
+logger = logging.getLogger('hypothesis_store')
+
+STORE_PATH = os.path.join('data', 'hypotheses.db')
+NUM_PERM = 128             # MinHash permutations
+BANDS = 32                 # LSH bands of NUM_PERM // BANDS rows: P(candidate | J=0.6) ~ 0.99
+SHINGLE = 3                # characters per shingle
+NEAR_DUP_JACCARD = 0.6     # shingle-set similarity that counts as the same hypothesis
+
+# Multiply-shift hash family: (a * x + b) mod 2^64, top 32 bits, with odd a
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+_BAND = np.dtype((np.void, 4 * NUM_PERM // BANDS))
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS prompts (
+        hash TEXT PRIMARY KEY,
+        messages TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS hypotheses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT NOT NULL UNIQUE,
+        text TEXT NOT NULL,
+        minhash BLOB NOT NULL,
+        agent TEXT,
+        model TEXT,
+        temperature REAL,
+        prompt_hash TEXT REFERENCES prompts(hash),
+        created TEXT,
+        last_seen TEXT,
+        seen INTEGER NOT NULL DEFAULT 1,
+        served INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_hypotheses_fresh ON hypotheses(created) WHERE served = 0",
+)
+
+
+def normalize(text):
+    """Case-, accent- and punctuation-insensitive form used as the exact-match key"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def shingles(key):
+    padded = f' {key} '
+    return {padded[i:i + SHINGLE] for i in range(max(1, len(padded) - SHINGLE + 1))}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def minhash(shingle_set):
+    """NUM_PERM-value signature: per permutation, the minimum hash over the shingles"""
+    x = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64,
+                    count=len(shingle_set))
+    return ((_A[:, None] * x[None, :] + _B[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def _bands(signature):
+    """LSH bucket keys: (band number, that band's rows as bytes)"""
+    return list(enumerate(signature.reshape(BANDS, -1).view(_BAND).ravel().tolist()))
+
+
+def _prompt_hash(messages):
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+
+@dataclass(frozen=True)
+class Screened:
+    text: str
+    key: str
+    status: str            # 'new', 'duplicate' or 'near_duplicate'
+    match: str = None      # text of the stored hypothesis it repeats
+
+    @property
+    def is_new(self):
+        return self.status == 'new'
+
+
+class HypothesisStore:
+    def __init__(self, path=STORE_PATH):
+        self.db = get_database(path)
+        self._lock = threading.Lock()
+        self._texts = {}         # key -> text
+        self._shingles = {}      # key -> shingle set
+        self._buckets = {}       # (band, rows) -> [key, ...]
+        self._max_id = 0
+        self._version = None
+        self.db.write(self._init_schema)
+
+    @staticmethod
+    def _init_schema(conn):
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+
+    # ------------------------------------------------------------ index
+    def _index(self, key, text, signature, shingle_set=None):
+        self._texts[key] = text
+        self._shingles[key] = shingle_set if shingle_set is not None else shingles(key)
+        for band in _bands(signature):
+            self._buckets.setdefault(band, []).append(key)
+
+    def _sync(self):
+        """Index rows committed since the last sync (by this or another process)"""
+        version = self.db.data_version()
+        if version == self._version:
+            return
+        rows = self.db.read("SELECT id, key, text, minhash FROM hypotheses WHERE id > ? ORDER BY id",
+                            (self._max_id,))
+        for row_id, key, text, blob in rows:
+            if key not in self._texts:
+                self._index(key, text, np.frombuffer(blob, dtype=np.uint32))
+            self._max_id = row_id
+        self._version = version
+
+    def _match(self, key, signature, shingle_set):
+        if key in self._texts:
+            return key, 'duplicate'
+        best, best_sim = None, NEAR_DUP_JACCARD
+        for band in _bands(signature):
+            for candidate in self._buckets.get(band, ()):
+                sim = jaccard(shingle_set, self._shingles[candidate])
+                if sim >= best_sim:
+                    best, best_sim = candidate, sim
+        return (best, 'near_duplicate') if best else (None, 'new')
+
+    # ------------------------------------------------------------ public
+    def lookup(self, text):
+        """The stored hypothesis ``text`` repeats (exactly or nearly), or None"""
+        key = normalize(text)
+        shingle_set = shingles(key)
+        with self._lock:
+            self._sync()
+            match, _ = self._match(key, minhash(shingle_set), shingle_set)
+            return self._texts.get(match)
+
+    def add(self, text, agent=None, model=None, temperature=None, messages=None):
+        """Screen ``text`` against the store and record it.
+
+        New hypotheses are inserted with their generation metadata; repeats
+        bump the ``seen`` count of the stored one. The write is queued on the
+        database writer, not awaited."""
+        key = normalize(text)
+        if not key:
+            return Screened(text, key, 'duplicate')
+        shingle_set = shingles(key)
+        signature = minhash(shingle_set)
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._sync()
+            match, status = self._match(key, signature, shingle_set)
+            if status == 'new':
+                self._index(key, text, signature, shingle_set)
+        if status == 'new':
+            row = {'key': key, 'text': text, 'minhash': signature.tobytes(), 'agent': agent, 'model': model,
+                   'temperature': temperature, 'created': now,
+                   'prompt_hash': _prompt_hash(messages) if messages is not None else None}
+            job = lambda conn: self._insert(conn, row, messages)
+        else:
+            job = lambda conn: conn.execute(
+                "UPDATE hypotheses SET seen = seen + 1, last_seen = ? WHERE key = ?", (now, match))
+        self.db.submit(job).add_done_callback(self._log_failure)
+        return Screened(text, key, status, None if status == 'new' else self._texts[match])
+
+    @staticmethod
+    def _insert(conn, row, messages):
+        if row['prompt_hash'] is not None:
+            conn.execute("INSERT INTO prompts (hash, messages) VALUES (?, ?) ON CONFLICT(hash) DO NOTHING",
+                         (row['prompt_hash'], json.dumps(messages)))
+        conn.execute("""
+            INSERT INTO hypotheses (key, text, minhash, agent, model, temperature, prompt_hash, created, last_seen)
+            VALUES (:key, :text, :minhash, :agent, :model, :temperature, :prompt_hash, :created, :created)
+            ON CONFLICT(key) DO UPDATE SET seen = seen + 1, last_seen = excluded.last_seen
+        """, row)
+
+    @staticmethod
+    def _log_failure(future):
+        if future.exception() is not None:
+            logger.error(f"Recording hypothesis failed: {future.exception()}")
+
+    def take_fresh(self, limit):
+        """Up to ``limit`` hypotheses never handed out before, oldest first,
+        marked as served in the same transaction"""
+        def job(conn):
+            rows = conn.execute("SELECT id, text FROM hypotheses WHERE served = 0 ORDER BY created LIMIT ?",
+                                (int(limit),)).fetchall()
+            conn.executemany("UPDATE hypotheses SET served = served + 1 WHERE id = ?", [(i,) for i, _ in rows])
+            return [text for _, text in rows]
+        return self.db.write(job)
+
+    def mark_served(self, texts):
+        keys = [(normalize(t),) for t in texts]
+        self.db.write(lambda conn: conn.executemany(
+            "UPDATE hypotheses SET served = served + 1 WHERE key = ?", keys))
+
+    def stats(self):
+        total, fresh, seen = self.db.read(
+            "SELECT COUNT(*), COALESCE(SUM(served = 0), 0), COALESCE(SUM(seen), 0) FROM hypotheses")[0]
+        return {'hypotheses': total, 'fresh': fresh, 'generated': seen, 'repeats': seen - total}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide ``HypothesisStore`` on ``STORE_PATH``"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            os.makedirs(os.path.dirname(STORE_PATH), exist_ok=True)
+            _store = HypothesisStore(STORE_PATH)
+        return _store
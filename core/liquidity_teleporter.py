@@ -1,60 +1,198 @@
 import numpy as np
 from scipy.optimize import differential_evolution
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
 import logging
 
 # Initialize logger
 logger = logging.getLogger('liquidity_teleporter')
 logger.setLevel(logging.INFO)
 
-def optimal_execution_trajectory(adv, position, horizon=30):
+# Linear impact model in fractions of price per 1x ADV traded in one step
+TEMP_IMPACT = 0.10      # temporary impact (eta)
+PERM_IMPACT = 0.05      # permanent impact (gamma)
+DAILY_VOL = 0.02        # sigma, per step
+RISK_AVERSION = 2.0     # lambda per unit of ADV, so urgency does not depend on scale
+
+def _participation_caps(adv, position):
+    # Per-step cap and the tighter first-step volume profile cap (20% of ADV)
+    return min(adv * 0.25, abs(position) * 0.4), adv * 0.2
+
+def _ac_holdings(kappa, horizon):
+    """Fraction of each order still held at the horizon+1 step boundaries, (M, horizon+1)"""
+    kappa = np.atleast_1d(np.asarray(kappa, dtype=float))[:, None]
+    t = np.arange(horizon + 1)
+    # sinh ratio written with exponentials so large kappa*T cannot overflow
+    with np.errstate(invalid='ignore', divide='ignore'):
+        curved = (np.exp(-kappa * t) - np.exp(-kappa * (2 * horizon - t))) / (1 - np.exp(-2 * kappa * horizon))
+    return np.where(kappa * horizon < 1e-8, 1 - t / horizon, curved)
+
+def _ac_first_fraction(kappa, horizon):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        held = (np.exp(-kappa) - np.exp(-kappa * (2 * horizon - 1))) / (1 - np.exp(-2 * kappa * horizon))
+    return np.where(kappa * horizon < 1e-8, 1.0 / horizon, 1 - held)
+
+def execution_cost_bp(traj, adv, temp_impact=TEMP_IMPACT, perm_impact=PERM_IMPACT):
+    """Expected Almgren–Chriss impact cost of a trade schedule, in bp of the order"""
+    traj = np.asarray(traj, dtype=float)
+    total = abs(traj.sum())
+    if total == 0:
+        return 0.0
+    eta_tilde = (temp_impact - 0.5 * perm_impact) / adv
+    cost = 0.5 * (perm_impact / adv) * total ** 2 + eta_tilde * np.sum(traj ** 2)
+    return float(cost / total * 10000)
+
+def _ac_batch(adv, position, horizon, risk_aversion=RISK_AVERSION, volatility=DAILY_VOL,
+              temp_impact=TEMP_IMPACT, perm_impact=PERM_IMPACT):
+    """Almgren–Chriss schedules for M orders sharing one horizon, all as array ops.
+
+    Returns (trajectories (M, horizon), impact bp (M,), infeasible mask (M,))."""
+    adv, position = np.broadcast_arrays(np.atleast_1d(np.asarray(adv, dtype=float)),
+                                        np.atleast_1d(np.asarray(position, dtype=float)))
+    eta_tilde = temp_impact - 0.5 * perm_impact
+    kappa = np.full(len(adv), np.arccosh(1 + 0.5 * risk_aversion * volatility ** 2 / eta_tilde))
+
+    size = np.abs(position)
+    # Per-step cap and the tighter first-step volume profile cap (20% of ADV)
+    cap = np.minimum(np.minimum(adv * 0.25, size * 0.4), adv * 0.2)
+    infeasible = size / horizon > cap
+    too_fast = ~infeasible & (size * _ac_first_fraction(kappa, horizon) > cap)
+    if too_fast.any():
+        lo, hi = np.zeros_like(kappa), kappa.copy()
+        for _ in range(60):
+            mid = 0.5 * (lo + hi)
+            over = size * _ac_first_fraction(mid, horizon) > cap
+            hi = np.where(over, mid, hi)
+            lo = np.where(over, lo, mid)
+        kappa = np.where(too_fast, lo, kappa)
+    kappa = np.where(infeasible, 0.0, kappa)
+
+    trajs = -np.diff(_ac_holdings(kappa, horizon), axis=1) * position[:, None]
+    cost = 0.5 * perm_impact * size ** 2 + eta_tilde * np.sum(trajs ** 2, axis=1)
+    impact_bp = np.divide(cost / adv, size, out=np.zeros_like(size), where=size > 0) * 10000
+    return trajs, impact_bp, infeasible
+
+def almgren_chriss_trajectory(adv, position, horizon=30, risk_aversion=RISK_AVERSION,
+                              volatility=DAILY_VOL, temp_impact=TEMP_IMPACT, perm_impact=PERM_IMPACT):
+    """Closed-form Almgren–Chriss schedule (trades per step) under participation caps.
+
+    The unconstrained optimum trades ``x_j = X sinh(k(T-j)) / sinh(kT)`` with
+    ``cosh(k) = 1 + k~^2 / 2`` and ``k~^2 = lambda sigma^2 / eta~``. Trades
+    shrink monotonically, so if the first one breaks a participation cap the
+    urgency is bisected down until it fits (TWAP is the slowest schedule)."""
+    trajs, impact_bp, infeasible = _ac_batch(adv, position, horizon, risk_aversion,
+                                             volatility, temp_impact, perm_impact)
+    if infeasible[0]:
+        logger.warning(f"Order of {abs(position):,.0f} cannot meet participation caps in {horizon} steps; using TWAP")
+    return trajs[0], round(float(impact_bp[0]), 2)
+
+def _exotic_impact(trajs, adv):
+    """Non-linear impact of a population of schedules, (S, horizon) -> (S,), in ADV units"""
+    v = np.asarray(trajs, dtype=float) / adv
+    return np.sum(
+        0.5 * np.sqrt(np.abs(v)) * np.sign(v)  # Temporary impact
+        + 0.1 * v**2  # Permanent impact
+        + 0.05 * v,  # Cumulative position effect
+        axis=-1
+    )
+
+def _exotic_trajectory(adv, position, horizon):
+    """Differential evolution over a non-linear (square-root) impact model.
+
+    The objective scores DE's whole population in one array operation
+    (``vectorized=True``) instead of one Python call per candidate."""
+    # ENHANCED: Dynamic bounds based on position size and ADV
+    max_trade, first_cap = _participation_caps(adv, position)
+    bounds = [(-max_trade, max_trade)] * (horizon - 1)
+    bounds[0] = (-min(max_trade, first_cap), min(max_trade, first_cap))
+
+    # Position closure by construction: the last trade is whatever remains,
+    # penalised if it breaks the per-step cap
+    def full(free):
+        free = np.atleast_2d(free)
+        return np.hstack([free, (position - free.sum(axis=1))[:, None]])
+
+    def objective(free):
+        # DE passes (n_free, S) populations; the final polish passes one (n_free,) vector
+        trajs = full(free.T if free.ndim == 2 else free)
+        penalty = 1e3 * np.maximum(0.0, np.abs(trajs[:, -1]) - max_trade) / adv
+        scores = _exotic_impact(trajs, adv) + penalty
+        return scores if free.ndim == 2 else scores[0]
+
+    res = differential_evolution(
+        objective,
+        bounds,
+        vectorized=True,
+        updating='deferred',
+        tol=0.001,
+        maxiter=1000
+    )
+
+    if not res.success:
+        logger.warning(f"Optimization didn't converge: {res.message}")
+        # Fallback to VWAP execution
+        linear_traj = np.full(horizon, position / horizon)
+        fallback_impact = _exotic_impact(linear_traj, adv) * 100
+        return linear_traj, round(float(fallback_impact), 2)
+
+    traj = full(res.x)[0]
+    total_impact_bp = float(_exotic_impact(traj, adv)) * 100
+    logger.info(f"Execution trajectory optimized | Impact: {total_impact_bp:.2f} bp")
+    return traj, round(total_impact_bp, 2)
+
+def _safe_exotic_trajectory(adv, position, horizon):
+    try:
+        return _exotic_trajectory(adv, position, horizon)
+    except Exception as e:
+        logger.error(f"Execution optimization failed: {str(e)}")
+        return np.full(horizon, position / horizon), 92.0
+
+def optimal_execution_trajectory(adv, position, horizon=30, risk_aversion=RISK_AVERSION, exotic=False):
+    """Optimal execution schedule and its impact in bp.
+
+    Uses the closed-form Almgren–Chriss solution (microseconds per call);
+    ``exotic=True`` opts into the slow differential-evolution search over the
+    non-linear impact model instead."""
     try:
-        def impact(traj):
-            # ENHANCED: More realistic non-linear market impact model
-            return sum(
-                0.5 * np.sqrt(abs(t)) * np.sign(t)  # Temporary impact
-                + 0.1 * t**2  # Permanent impact
-                + 0.05 * np.cumsum(t)[-1]  # Cumulative position effect
-                for t in traj
-            )
-        
-        # ENHANCED: Dynamic bounds based on position size and ADV
-        max_trade = min(adv * 0.25, position * 0.4)
-        bounds = [(-max_trade, max_trade)] * horizon
-        
-        # ENHANCED: Add constraints to ensure position closure
-        def position_constraint(traj):
-            return abs(sum(traj) - position)
-        
-        # VOLUME PROFILE CONSTRAINT (trade size < 20% of expected volume)
-        def volume_constraint(traj):
-            return max(0, abs(traj[0]) - adv * 0.2)
-        
-        constraints = [
-            {'type': 'eq', 'fun': position_constraint},
-            {'type': 'ineq', 'fun': volume_constraint}
-        ]
-        
-        res = differential_evolution(
-            impact, 
-            bounds, 
-            constraints=constraints,
-            workers=1, 
-            tol=0.001,
-            maxiter=1000
-        )
-        
-        if not res.success:
-            logger.warning(f"Optimization didn't converge: {res.message}")
-            # Fallback to VWAP execution
-            linear_traj = np.full(horizon, position / horizon)
-            fallback_impact = impact(linear_traj) * 100
-            return linear_traj, round(fallback_impact, 2)
-        
-        total_impact_bp = impact(res.x) * 100
-        logger.info(f"Execution trajectory optimized | Impact: {total_impact_bp:.2f} bp")
-        return res.x, round(total_impact_bp, 2)
+        if exotic:
+            return _exotic_trajectory(adv, position, horizon)
+        return almgren_chriss_trajectory(adv, position, horizon, risk_aversion)
     except Exception as e:
         logger.error(f"Execution optimization failed: {str(e)}")
         # Fallback: linear execution
         linear_traj = np.full(horizon, position / horizon)
         return linear_traj, 92.0  # Default naive impact
+
+def optimal_execution_batch(orders, risk_aversion=RISK_AVERSION, exotic=False, max_workers=None):
+    """Execution schedules for a whole list of ``(adv, position, horizon)`` orders.
+
+    Almgren–Chriss schedules are solved together, one array pass per distinct
+    horizon, so hundreds of names cost about as much as one. Exotic schedules
+    run their differential-evolution searches concurrently in a process pool.
+    Returns ``[(trajectory, impact_bp), ...]`` in the order given."""
+    orders = [(float(adv), float(position), int(horizon)) for adv, position, horizon in orders]
+    results = [None] * len(orders)
+    if not orders:
+        return results
+
+    if exotic:
+        advs, positions, horizons = zip(*orders)
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                return list(pool.map(_safe_exotic_trajectory, advs, positions, horizons))
+        except Exception as e:
+            logger.warning(f"Process pool unavailable ({e}); solving exotic schedules serially")
+            return [_safe_exotic_trajectory(*order) for order in orders]
+
+    by_horizon = defaultdict(list)
+    for i, (_, _, horizon) in enumerate(orders):
+        by_horizon[horizon].append(i)
+    for horizon, idx in by_horizon.items():
+        advs = np.array([orders[i][0] for i in idx])
+        positions = np.array([orders[i][1] for i in idx])
+        trajs, impact_bp, infeasible = _ac_batch(advs, positions, horizon, risk_aversion)
+        if infeasible.any():
+            logger.warning(f"{int(infeasible.sum())} orders cannot meet participation caps in {horizon} steps; using TWAP")
+        for row, i in enumerate(idx):
+            results[i] = (trajs[row], round(float(impact_bp[row]), 2))
+    return results
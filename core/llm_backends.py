@@ -0,0 +1,124 @@
+"""Chat-completion backends behind the hypothesis swarm.
+
+All LLM access goes through ``get_backend()``. The active backend is chosen
+with ``set_backend`` or the ``MOONSHOT_LLM_BACKEND`` env var:
+
+    openrouter            OpenRouter's hosted models (default, needs OPENROUTER_API_KEY)
+    openai:<base_url>     any OpenAI-compatible server, e.g. a local mock at
+                          http://127.0.0.1:8765/v1 (see benchmarks/mock_llm_server.py)
+
+``MOONSHOT_LLM_MODEL`` overrides the default model. Every backend implements
+the coroutine generator ``stream(messages, temperature, model)``, which
+yields text deltas as they arrive; ``complete`` joins them.
+"""
+import os
+import asyncio
+import logging
+
+logger = logging.getLogger('llm_backends')
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "deepseek/deepseek-r1"
+
+
+class BackendUnavailable(RuntimeError):
+    """The backend cannot serve requests at all (no key, client missing); not worth retrying"""
+
+
+def _secret(name):
+    value = os.getenv(name)
+    if value:
+        return value
+    try:
+        import streamlit as st
+        return st.secrets.get(name)
+    except Exception:
+        return None  # no secrets file outside a configured Streamlit app
+
+
+class LLMBackend:
+    name = 'base'
+    model = None
+
+    async def stream(self, messages, temperature=0.7, model=None):
+        raise NotImplementedError
+        yield  # pragma: no cover - makes this an async generator
+
+    async def complete(self, messages, temperature=0.7, model=None):
+        return ''.join([delta async for delta in self.stream(messages, temperature, model)])
+
+    async def aclose(self):
+        """Release resources bound to the running event loop"""
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Streams ``/chat/completions`` from any OpenAI-compatible endpoint"""
+
+    def __init__(self, base_url, api_key=None, model=DEFAULT_MODEL, name='openai'):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.name = name
+        self._clients = {}   # event loop -> AsyncOpenAI (HTTP pools are loop-bound)
+
+    def _client(self):
+        if not self.api_key:
+            raise BackendUnavailable(f"No API key configured for {self.name}")
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            try:
+                from openai import AsyncOpenAI  # only needed when actually going to the network
+            except ImportError as e:
+                raise BackendUnavailable(f"openai package not installed: {e}") from e
+            # Retries and timeouts are handled per agent by the swarm
+            client = self._clients[loop] = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key,
+                                                       max_retries=0, timeout=None)
+        return client
+
+    async def stream(self, messages, temperature=0.7, model=None):
+        response = await self._client().chat.completions.create(
+            model=model or self.model, messages=messages, temperature=temperature, stream=True)
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aclose(self):
+        try:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        except RuntimeError:
+            return
+        if client is not None:
+            await client.close()
+
+
+def backend_from_spec(spec):
+    """Build a backend from 'openrouter' or 'openai:<base_url>'"""
+    kind, _, arg = spec.partition(':')
+    kind = kind.strip().lower()
+    model = os.getenv('MOONSHOT_LLM_MODEL', DEFAULT_MODEL)
+    if kind == 'openrouter':
+        return OpenAICompatibleBackend(OPENROUTER_URL, _secret("OPENROUTER_API_KEY"), model, name='openrouter')
+    if kind == 'openai':
+        if not arg:
+            raise ValueError("openai backend needs a base URL, e.g. openai:http://127.0.0.1:8765/v1")
+        # Local stand-ins accept any key
+        return OpenAICompatibleBackend(arg, _secret("OPENAI_API_KEY") or 'local', model, name=f'openai-{arg}')
+    raise ValueError(f"Unknown LLM backend: {spec}")
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = backend_from_spec(os.getenv('MOONSHOT_LLM_BACKEND', 'openrouter'))
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the process-wide backend (a backend instance or a spec string)"""
+    global _backend
+    _backend = backend_from_spec(backend) if isinstance(backend, str) else backend
+    return _backend
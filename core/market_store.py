@@ -0,0 +1,307 @@
+"""Persistent on-disk store for daily price panels.
+
+Every symbol gets its own directory under ``data/market/<provider>`` with one raw
+little-endian array per field (``close.f8``, ``volume.f8`` ...) and a
+``dates.i8`` index (ns since epoch). Files are append-only and read back
+with plain offset reads, so after the first fill a refresh only downloads the
+bars from the last stored one on and reads never touch the network. Prices
+are stored as the provider adjusts them; a refresh that finds the overlapping
+bar re-priced (a new split or dividend) downloads the symbol again.
+Bars come from the active ``core.data_providers`` provider; providers that
+are already local (synthetic, file replay) are read directly, not stored.
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from core.data_providers import get_provider
+
+logger = logging.getLogger('market_store')
+
+STORE_DIR = os.path.join('data', 'market')
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+DEFAULT_HISTORY = '5y'       # first fill depth, covers every period the pages ask for
+REFRESH_TTL = 6 * 3600       # seconds between freshness checks of a symbol
+LOCK_TIMEOUT = 60
+STALE_LOCK_AGE = 300
+ADJUSTMENT_RTOL = 1e-4       # re-priced overlap bar beyond this means a new split/dividend adjustment
+
+_lock = threading.Lock()
+
+
+def _period_start(period):
+    """Translate a yfinance-style period ('1mo', '2y', 'max') into a start date"""
+    return _period_start_on(period, pd.Timestamp.today().normalize())
+
+
+@lru_cache(maxsize=64)
+def _period_start_on(period, today):
+    if period == 'max':
+        return pd.Timestamp('1970-01-01')
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', str(period))
+    if not match:
+        raise ValueError(f"Unsupported period: {period}")
+    n, unit = int(match.group(1)), match.group(2)
+    offsets = {'d': pd.DateOffset(days=n), 'wk': pd.DateOffset(weeks=n),
+               'mo': pd.DateOffset(months=n), 'y': pd.DateOffset(years=n)}
+    return today - offsets[unit]
+
+
+def _last_complete_bar():
+    return pd.Timestamp.today().normalize() - pd.offsets.BDay(1)
+
+
+def _symbol_dir(symbol):
+    return os.path.join(STORE_DIR, get_provider().name, re.sub(r'[^A-Za-z0-9._-]', '_', symbol))
+
+
+@contextmanager
+def _file_lock(symbol_dir):
+    """Cross-process lock so the worker and the app never append concurrently"""
+    os.makedirs(symbol_dir, exist_ok=True)
+    path = os.path.join(symbol_dir, '.lock')
+    deadline = time.time() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > STALE_LOCK_AGE:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Timed out waiting for {path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _read_meta(symbol):
+    path = os.path.join(_symbol_dir(symbol), 'meta.json')
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(symbol, meta):
+    path = os.path.join(_symbol_dir(symbol), 'meta.json')
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def _read_array(path, dtype, n=None, start=0):
+    """Rows ``start:n`` of a raw array file (a short read if it is still being appended)"""
+    itemsize = np.dtype(dtype).itemsize
+    try:
+        with open(path, 'rb') as f:
+            available = os.fstat(f.fileno()).st_size // itemsize
+            n = available if n is None else min(n, available)
+            if n <= start:
+                return np.empty(0, dtype=dtype)
+            return np.fromfile(f, dtype=dtype, count=n - start, offset=start * itemsize)
+    except FileNotFoundError:
+        return np.empty(0, dtype=dtype)
+
+
+def _last_stored_date(symbol):
+    dates = _read_array(os.path.join(_symbol_dir(symbol), 'dates.i8'), '<i8')
+    return pd.Timestamp(int(dates[-1])) if len(dates) else None
+
+
+def _align_fields(symbol_dir):
+    """Cut every field file back to the row count of ``dates.i8``.
+
+    Fields are appended before the dates, so a crash between the two leaves
+    extra (or, for a torn date, partial) rows that would shift every later
+    append against its date. Returns the number of stored rows."""
+    dates_path = os.path.join(symbol_dir, 'dates.i8')
+    size = os.path.getsize(dates_path) if os.path.exists(dates_path) else 0
+    n_rows = size // 8
+    if size != n_rows * 8:
+        os.truncate(dates_path, n_rows * 8)
+    for field in FIELDS:
+        path = os.path.join(symbol_dir, f'{field}.f8')
+        stored = os.path.getsize(path) if os.path.exists(path) else 0
+        if stored == n_rows * 8:
+            continue
+        rows = min(stored // 8, n_rows)
+        with open(path, 'ab') as f:
+            f.truncate(rows * 8)
+            # A field missing rows (never written) is padded so it stays aligned
+            np.full(n_rows - rows, np.nan, dtype='<f8').tofile(f)
+    return n_rows
+
+
+def _append(symbol, frame):
+    """Append bars newer than the last stored one. Dates are written last so
+    readers, which trust ``dates.i8`` for the row count, never see a torn row;
+    leftovers of an interrupted append are cut off first."""
+    symbol_dir = _symbol_dir(symbol)
+    _align_fields(symbol_dir)
+    last = _last_stored_date(symbol)
+    if last is not None:
+        frame = frame[frame.index > last]
+    if frame.empty:
+        return 0
+    for field in FIELDS:
+        values = frame[field].to_numpy(dtype='<f8') if field in frame else np.full(len(frame), np.nan)
+        with open(os.path.join(symbol_dir, f'{field}.f8'), 'ab') as f:
+            values.astype('<f8').tofile(f)
+    stamps = frame.index.as_unit('ns').asi8.astype('<i8')
+    with open(os.path.join(symbol_dir, 'dates.i8'), 'ab') as f:
+        stamps.tofile(f)
+    return len(frame)
+
+
+def _adjustment_changed(symbol, frame):
+    """True if ``frame`` re-prices the last stored bar: the provider's
+    split/dividend adjustment moved since the stored history was downloaded"""
+    last = _last_stored_date(symbol)
+    if last is None or last not in frame.index:
+        return False
+    symbol_dir = _symbol_dir(symbol)
+    n = len(_read_array(os.path.join(symbol_dir, 'dates.i8'), '<i8'))
+    stored = _read_array(os.path.join(symbol_dir, 'close.f8'), '<f8', n, start=n - 1)
+    if not len(stored) or not np.isfinite(stored[0]):
+        return False
+    return not np.isclose(float(frame.at[last, 'close']), float(stored[0]), rtol=ADJUSTMENT_RTOL, atol=0.0)
+
+
+def _rebuild(symbols, start, now):
+    """Replace the stored history of ``symbols`` with a fresh download from ``start``.
+
+    Symbols the download returns nothing for are stored empty with a
+    ``checked_at`` stamp, so they are retried once per ``REFRESH_TTL`` rather
+    than on every read."""
+    try:
+        frames = get_provider().download(symbols, start)
+    except Exception as e:
+        logger.warning(f"Initial fill failed for {symbols}: {e}")
+        frames = {}
+    for symbol in symbols:
+        frame = frames.get(symbol)
+        symbol_dir = _symbol_dir(symbol)
+        with _file_lock(symbol_dir):
+            if frame is None or frame.empty:
+                meta = _read_meta(symbol)
+                if meta is None:
+                    _write_meta(symbol, {'history_start': start.isoformat(), 'checked_at': now, 'updated_at': 0})
+                else:
+                    # Keep whatever is stored; a failed re-download is not a reason to drop it
+                    meta['checked_at'] = now
+                    _write_meta(symbol, meta)
+                continue
+            for name in os.listdir(symbol_dir):
+                if name.endswith(('.f8', '.i8')):
+                    os.remove(os.path.join(symbol_dir, name))
+            n = _append(symbol, frame)
+            _write_meta(symbol, {'history_start': start.isoformat(), 'checked_at': now, 'updated_at': now})
+        logger.info(f"Stored {n} bars for {symbol}")
+
+
+def refresh(symbols, period=DEFAULT_HISTORY, force=False):
+    """Bring the local files for ``symbols`` up to date covering ``period``.
+
+    Symbols that are missing (or don't reach back far enough) are filled in
+    one batched download; up-to-date symbols cost no network at all, stale
+    ones only pull the bars from their last stored date on. That overlapping
+    bar is compared with the stored one: prices are split/dividend adjusted,
+    so a mismatch means the whole stored history is stale and the symbol is
+    downloaded again rather than appended to."""
+    req_start = min(_period_start(period), _period_start(DEFAULT_HISTORY))
+    now = time.time()
+    cutoff = _last_complete_bar()
+    rebuild, stale = [], []
+    for symbol in symbols:
+        meta = _read_meta(symbol)
+        if meta is None or pd.Timestamp(meta['history_start']) > req_start:
+            rebuild.append(symbol)
+            continue
+        last = _last_stored_date(symbol)
+        if last is None or last < cutoff:
+            if force or now - meta.get('checked_at', 0) > REFRESH_TTL:
+                # A symbol stored empty (nothing came back last time) needs its full history
+                (stale if last is not None else rebuild).append(symbol)
+
+    with _lock:
+        if rebuild:
+            _rebuild(rebuild, req_start, now)
+
+        if stale:
+            known = [d for d in (_last_stored_date(s) for s in stale) if d is not None]
+            start = min(known) if known else req_start
+            try:
+                frames = get_provider().download(stale, start)
+            except Exception as e:
+                logger.warning(f"Incremental refresh failed for {stale}: {e}")
+                frames = {}
+            readjusted = []
+            for symbol in stale:
+                with _file_lock(_symbol_dir(symbol)):
+                    meta = _read_meta(symbol)
+                    if symbol in frames and _adjustment_changed(symbol, frames[symbol]):
+                        readjusted.append((symbol, pd.Timestamp(meta['history_start'])))
+                        continue
+                    n = _append(symbol, frames[symbol]) if symbol in frames else 0
+                    meta['checked_at'] = now
+                    if n:
+                        meta['updated_at'] = now
+                    _write_meta(symbol, meta)
+                if n:
+                    logger.info(f"Appended {n} bars for {symbol}")
+            if readjusted:
+                logger.info(f"Price adjustment changed for {[s for s, _ in readjusted]}; re-downloading")
+                _rebuild([s for s, _ in readjusted], min(start for _, start in readjusted), now)
+
+
+def read_symbol(symbol, field='close', period=DEFAULT_HISTORY):
+    """Read one field of one symbol from the local files (no network)"""
+    symbol_dir = _symbol_dir(symbol)
+    dates = _read_array(os.path.join(symbol_dir, 'dates.i8'), '<i8')
+    first = int(np.searchsorted(dates, _period_start(period).value))
+    values = _read_array(os.path.join(symbol_dir, f'{field}.f8'), '<f8', len(dates), start=first)
+    index = pd.DatetimeIndex(dates[first:first + len(values)].astype('datetime64[ns]'))
+    return pd.Series(values, index=index, name=symbol)
+
+
+def load_panel(symbols, field='close', period='2y'):
+    """Date x symbol panel of ``field``, refreshed incrementally from the store"""
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    provider = get_provider()
+    if not provider.cacheable:
+        frames = provider.download(symbols, _period_start(period))
+        series = [frames[s][field].rename(s) for s in symbols if s in frames]
+        return pd.concat(series, axis=1).sort_index() if series else pd.DataFrame()
+    refresh(symbols, period)
+    series = [read_symbol(s, field, period) for s in symbols]
+    if not series:
+        return pd.DataFrame()
+    index = series[0].index
+    if all(len(s) == len(index) and s.index.equals(index) for s in series):
+        # Common case: every symbol trades on the same calendar, so skip the index alignment
+        return pd.DataFrame(np.column_stack([s.to_numpy() for s in series]), index=index,
+                            columns=[s.name for s in series])
+    return pd.concat(series, axis=1).sort_index()
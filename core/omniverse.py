@@ -1,42 +1,222 @@
 import numpy as np
 import pandas as pd
 import plotly.express as px
+import hashlib
+from functools import lru_cache
 from core.data_fetcher import get_multi_asset_data
+from core.cache import ResultCache, make_key
 import logging
 
 logger = logging.getLogger('omniverse')
 
-def run_omniverse_sims(scenario="Base", num_sims=8000):
-    """Run market simulations under different scenarios with asset correlations"""
+PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_SIZE = 10000               # paths per chunk
+CHUNK_BYTES = 64 * 1024 * 1024   # cap on a single asset-level draw
+KEEP_PATHS = 400                 # sample paths returned for plotting
+N_BINS = 2048                    # histogram resolution for streaming percentiles
+BAND_WIDTH = 8.0                 # histogram range in analytic std devs
+DEFAULT_SEED = 2026
+
+_sim_cache = ResultCache('omniverse', max_items=16)
+
+@lru_cache(maxsize=16)
+def _cholesky(cov_bytes, n):
+    cov = np.frombuffer(cov_bytes, dtype=np.float64).reshape(n, n)
     try:
-        _, returns = get_multi_asset_data(period="2y")
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        # Sample covariances can be numerically non-PD; fall back to the PSD square root
+        vals, vecs = np.linalg.eigh(cov)
+        return vecs * np.sqrt(np.clip(vals, 0, None))
+
+def factorize_cov(cov):
+    """Cached Cholesky factor of ``cov`` (computed once per distinct matrix)"""
+    cov = np.ascontiguousarray(cov, dtype=np.float64)
+    return _cholesky(cov.tobytes(), cov.shape[0])
+
+def iter_return_chunks(mu, cov, num_sims, horizon=252, weights=None, seed=None,
+                       chunk_size=CHUNK_SIZE, dtype=np.float32):
+    """Yield simulated daily returns in fixed-size chunks.
+
+    With ``weights`` the chunks are portfolio returns of shape (c, horizon):
+    ``w'(mu + Lz)`` is exactly ``N(w'mu, w'Σw)``, so one draw per path-day is
+    enough regardless of universe size. Without weights they are asset-level
+    (c, horizon, n) draws through the cached Cholesky factor, with ``c``
+    capped so a chunk never exceeds ``CHUNK_BYTES``."""
+    rng = np.random.default_rng(seed)
+    mu = np.asarray(mu, dtype=np.float64)
+    n = len(mu)
+    if weights is not None:
+        w = np.asarray(weights, dtype=np.float64)
+        loc = float(w @ mu)
+        scale = float(np.sqrt(max(w @ np.asarray(cov) @ w, 0.0)))
+    else:
+        L = factorize_cov(cov).astype(dtype)
+        itemsize = np.dtype(dtype).itemsize
+        chunk_size = max(1, min(chunk_size, CHUNK_BYTES // (horizon * n * itemsize)))
+
+    done = 0
+    while done < num_sims:
+        c = min(chunk_size, num_sims - done)
+        if weights is not None:
+            z = rng.standard_normal((c, horizon), dtype=dtype)
+            yield (loc + scale * z).astype(dtype, copy=False)
+        else:
+            z = rng.standard_normal((c, horizon, n), dtype=dtype)
+            yield mu.astype(dtype) + z @ L.T
+        done += c
+
+class _StreamingHistogram:
+    """Per-column fixed-bin histogram with under/overflow bins, used to get
+    percentiles over millions of rows in constant memory"""
+
+    def __init__(self, lo, hi, n_bins=N_BINS):
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.width = (np.asarray(hi, dtype=np.float64) - self.lo) / n_bins
+        self.n_bins = n_bins
+        self.counts = np.zeros((len(self.lo), n_bins + 2), dtype=np.int64)
+
+    def add(self, x):
+        idx = np.floor((x - self.lo) / self.width).astype(np.int64)
+        idx = np.clip(idx, -1, self.n_bins) + 1
+        flat = idx + np.arange(len(self.lo)) * (self.n_bins + 2)
+        self.counts += np.bincount(flat.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def percentiles(self, qs):
+        cdf = np.cumsum(self.counts, axis=1)
+        total = cdf[:, -1:]
+        out = np.empty((len(qs), len(self.lo)))
+        for k, q in enumerate(qs):
+            target = q / 100.0 * total
+            b = np.clip((cdf < target).sum(axis=1), 1, self.n_bins)   # first bin reaching target
+            below = np.take_along_axis(cdf, (b - 1)[:, None], 1)[:, 0]
+            inside = np.maximum(self.counts[np.arange(len(b)), b], 1)
+            frac = np.clip((target[:, 0] - below) / inside, 0, 1)
+            out[k] = self.lo + (b - 1 + frac) * self.width
+        return out
+
+    def density(self):
+        """Counts and bin edges of the in-range bins"""
+        edges = self.lo[:, None] + self.width[:, None] * np.arange(self.n_bins + 1)
+        return self.counts[:, 1:-1], edges
+
+def simulate_market_paths(mu, cov, num_sims=8000, horizon=252, seed=None,
+                          chunk_size=CHUNK_SIZE, dtype=np.float32, keep_paths=KEEP_PATHS):
+    """Stream ``num_sims`` equal-weight market paths and reduce them on the fly.
+
+    Peak memory is set by ``chunk_size`` only: every chunk is folded into
+    per-day percentile histograms, terminal value moments and a per-path
+    max-drawdown histogram before the next one is drawn."""
+    mu = np.asarray(mu, dtype=np.float64)
+    cov = np.asarray(cov, dtype=np.float64)
+    n = len(mu)
+    w = np.full(n, 1.0 / n)
+
+    # Histogram ranges from the analytic law of the log cumulative return
+    m, s = float(w @ mu), float(np.sqrt(max(w @ cov @ w, 1e-16)))
+    t = np.arange(1, horizon + 1)
+    center = t * (m - 0.5 * s * s)
+    spread = BAND_WIDTH * s * np.sqrt(t) + 1e-6
+    log_hist = _StreamingHistogram(center - spread, center + spread)
+    dd_hist = _StreamingHistogram([-1.0], [0.0])
+
+    sample = []
+    kept = 0
+    term_sum = term_sq = 0.0
+    losses = 0
+    dd_sum, dd_worst = 0.0, 0.0
+
+    for chunk in iter_return_chunks(mu, cov, num_sims, horizon, weights=w, seed=seed,
+                                    chunk_size=chunk_size, dtype=dtype):
+        log_cum = np.cumsum(np.log1p(np.maximum(chunk, -0.999999)), axis=1)
+        log_hist.add(log_cum)
+
+        cumulative = np.exp(log_cum)
+        terminal = cumulative[:, -1].astype(np.float64)
+        term_sum += terminal.sum()
+        term_sq += (terminal ** 2).sum()
+        losses += int((terminal < 1.0).sum())
+
+        drawdown = (cumulative / np.maximum.accumulate(cumulative, axis=1) - 1).min(axis=1)
+        dd_hist.add(drawdown[:, None].astype(np.float64))
+        dd_sum += float(drawdown.sum())
+        dd_worst = min(dd_worst, float(drawdown.min()))
+
+        if kept < keep_paths:
+            sample.append(cumulative[:keep_paths - kept].astype(np.float64))
+            kept += len(sample[-1])
+
+    bands = np.exp(log_hist.percentiles(PERCENTILES))
+    term_mean = term_sum / num_sims
+    term_std = float(np.sqrt(max(term_sq / num_sims - term_mean ** 2, 0.0)))
+    term_counts, term_edges = log_hist.density()
+    dd_pcts = dd_hist.percentiles((50, 5, 1))[:, 0]   # 95% / 99% tail drawdowns
+
+    return {
+        'num_sims': num_sims,
+        'horizon': horizon,
+        'paths': np.vstack(sample) if sample else np.empty((0, horizon)),
+        'bands': pd.DataFrame(bands.T, index=pd.RangeIndex(1, horizon + 1, name='day'),
+                              columns=[f'p{q}' for q in PERCENTILES]),
+        'terminal': {
+            'mean': float(term_mean),
+            'std': term_std,
+            'percentiles': dict(zip(PERCENTILES, bands[:, -1].tolist())),
+            'prob_loss': losses / num_sims,
+            'hist_counts': term_counts[-1],
+            'hist_edges': np.exp(term_edges[-1])
+        },
+        'drawdown': {
+            'mean': dd_sum / num_sims,
+            'median': float(dd_pcts[0]),
+            'p95': float(dd_pcts[1]),
+            'p99': float(dd_pcts[2]),
+            'worst': dd_worst
+        }
+    }
+
+def _simulate_scenario(returns, scenario, num_sims, horizon, seed, dtype):
+    # Calculate mean and covariance from historical returns
+    mu = returns.mean().values
+    cov = returns.cov().values
+
+    # Adjust parameters based on scenario
+    if scenario == "Trump2+China":
+        mu = mu * 0.55
+        cov = cov * 1.9
+    elif scenario == "AI-CapEx-Crash":
+        mu = mu * (-0.3)
+        cov = cov * 2.2
+
+    # Stream correlated returns chunk by chunk into running summaries
+    result = simulate_market_paths(mu, cov, num_sims, horizon, seed=seed, dtype=dtype)
+    result['scenario'] = scenario
+    return result
+
+def returns_fingerprint(returns):
+    """Hash of the input returns panel; changes whenever the market data is refreshed"""
+    h = hashlib.sha256(pd.util.hash_pandas_object(returns, index=True).to_numpy().tobytes())
+    h.update(repr(list(returns.columns)).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+def run_omniverse_sims(scenario="Base", num_sims=8000, horizon=252, seed=DEFAULT_SEED, dtype=np.float32, use_cache=True):
+    """Run market simulations under different scenarios with asset correlations.
+
+    Seeded runs are cached on (scenario, num_sims, horizon, seed, dtype, data
+    fingerprint), in memory and on disk, so repeated or concurrent requests for
+    the same scenario are served instantly and new market data misses the cache.
+    Pass ``seed=None`` for a fresh, uncached draw."""
+    try:
+        returns = get_multi_asset_data(period="2y").pct_change().dropna()
         if returns.empty:
             logger.error("No returns data available")
-            return pd.DataFrame()
-        
-        # Calculate mean and covariance from historical returns
-        mu = returns.mean().values
-        cov = returns.cov().values
-        n_assets = returns.shape[1]
-        
-        # Adjust parameters based on scenario
-        if scenario == "Trump2+China":
-            mu = mu * 0.55
-            cov = cov * 1.9
-        elif scenario == "AI-CapEx-Crash":
-            mu = mu * (-0.3)
-            cov = cov * 2.2
-        
-        # Generate correlated returns
-        # Generate daily returns for 252 days for num_sims simulations
-        sim_returns = np.random.multivariate_normal(mu, cov, (num_sims, 252))
-        
-        # Compute market portfolio returns (equal-weighted)
-        market_returns = np.mean(sim_returns, axis=2)
-        
-        # Compute cumulative returns for each simulation
-        market_cumulative = np.cumprod(1 + market_returns, axis=1)
-        return market_cumulative
+            return {}
+
+        if seed is None or not use_cache:
+            return _simulate_scenario(returns, scenario, num_sims, horizon, seed, dtype)
+        key = make_key(scenario, num_sims, horizon, seed, np.dtype(dtype).str, returns_fingerprint(returns))
+        return _sim_cache.get_or_compute(
+            key, lambda: _simulate_scenario(returns, scenario, num_sims, horizon, seed, dtype))
     except Exception as e:
         logger.error(f"Error in omniverse simulation: {e}")
-        return pd.DataFrame()
+        return {}
@@ -0,0 +1,237 @@
+"""Online (per-bar) return statistics for a tracked universe.
+
+``RollingStats`` keeps a ring buffer of the last ``window`` bars plus their
+running sums and cross-products, and exponentially decayed sums, so each new
+bar costs one rank-one update, O(n²), instead of recomputing correlations
+from the whole panel, O(n²·T). The crowding and cascade signals read the
+current state directly.
+
+``get_tracker(symbols, window)`` returns a shared, warmed-up tracker that
+pulls any completed daily bars newer than its last one from the market store
+at most every ``ADVANCE_INTERVAL`` seconds, however long it has been idle.
+"""
+import time
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from core.data_fetcher import get_multi_asset_data
+
+logger = logging.getLogger('online_stats')
+
+EW_HALFLIFE = 63          # bars
+ADVANCE_INTERVAL = 300    # seconds between store polls for new bars
+
+
+class RollingStats:
+    def __init__(self, symbols, window=252, halflife=EW_HALFLIFE):
+        self.symbols = list(symbols)
+        self.window = window
+        self.decay = 0.5 ** (1.0 / halflife)
+        n = len(self.symbols)
+        self._returns = np.zeros((window, n))       # ring buffer of returns (0 where not valid)
+        self._valid = np.zeros((window, n), dtype=bool)
+        self._prices = np.full((window + 1, n), np.nan)  # ring buffer of the prices spanning the window
+        self._head = 0                              # next ring slot
+        self._price_head = 0                        # next price ring slot
+        self.count = 0                              # bars in the window
+        self.valid_count = np.zeros(n, dtype=int)   # bars in the window each symbol has a return for
+        self.bars = 0                               # bars seen in total
+        self.sum = np.zeros(n)
+        self.cross = np.zeros((n, n))
+        self.ew_weight = np.zeros(n)                # per symbol: weight of the bars since its first price
+        self.ew_sum = np.zeros(n)
+        self.ew_cross = np.zeros((n, n))
+        self.peak = np.full(n, np.nan)              # running max since tracking began
+        self.last_price = None
+        self.last_date = None
+
+    # ------------------------------------------------------------ updates
+    def warm(self, prices):
+        """Initialise from a date x symbol price frame with bulk matrix products"""
+        prices = prices.reindex(columns=self.symbols).ffill()
+        values = prices.to_numpy(dtype=float)
+        # A symbol's statistics start at its first price; before that it has no returns
+        valid = np.isfinite(values[1:]) & np.isfinite(values[:-1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = np.where(valid, values[1:] / values[:-1] - 1, 0.0)
+        tail = returns[-self.window:]
+        k = len(tail)
+        self._returns[:k] = tail
+        self._valid[:] = False
+        self._valid[:k] = valid[-self.window:]
+        self._head = k % self.window
+        self.count = k
+        self.valid_count = self._valid[:k].sum(axis=0)
+        self.bars = len(returns)
+        self.sum = tail.sum(axis=0)
+        self.cross = tail.T @ tail
+
+        w = self.decay ** np.arange(len(returns) - 1, -1, -1)
+        self.ew_weight = w @ valid
+        self.ew_sum = w @ returns
+        self.ew_cross = (returns * w[:, None]).T @ returns
+
+        price_tail = values[-(self.window + 1):]
+        self._prices[:] = np.nan
+        self._prices[:len(price_tail)] = price_tail
+        self._price_head = len(price_tail) % len(self._prices)
+        if len(values):
+            self.peak = np.nanmax(values, axis=0)
+            self.last_price = values[-1]
+            self.last_date = prices.index[-1]
+
+    def update(self, price_row, date=None):
+        """Advance by one bar of prices: O(n²) rank-one updates"""
+        price_row = np.asarray(price_row, dtype=float)
+        if self.last_price is None:
+            self.last_price = price_row
+            self.peak = price_row.copy()
+            self._push_price(price_row)
+            self.last_date = date
+            return
+        price_row = np.where(np.isnan(price_row), self.last_price, price_row)
+        valid = np.isfinite(price_row) & np.isfinite(self.last_price)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x = np.where(valid, price_row / self.last_price - 1, 0.0)
+
+        if self.count == self.window:
+            old = self._returns[self._head]
+            self.sum -= old
+            self.cross -= np.outer(old, old)
+            self.valid_count -= self._valid[self._head]
+        else:
+            self.count += 1
+        self._returns[self._head] = x
+        self._valid[self._head] = valid
+        self._head = (self._head + 1) % self.window
+        self.sum += x
+        self.cross += np.outer(x, x)
+        self.valid_count += valid
+
+        self.ew_weight = self.decay * self.ew_weight + valid
+        self.ew_sum = self.decay * self.ew_sum + x
+        self.ew_cross *= self.decay
+        self.ew_cross += np.outer(x, x)
+
+        self.peak = np.fmax(self.peak, price_row)
+        self.last_price = price_row
+        self.last_date = date
+        self._push_price(price_row)
+        self.bars += 1
+        if self.bars % self.window == 0:
+            self._resync()
+
+    def _push_price(self, price_row):
+        # Overwrite the oldest slot, O(n); the window high doesn't depend on slot order
+        self._prices[self._price_head] = price_row
+        self._price_head = (self._price_head + 1) % len(self._prices)
+
+    def _resync(self):
+        # Add/subtract updates drift in floating point; rebuild the window sums exactly
+        window = self._returns[:self.count]
+        self.sum = window.sum(axis=0)
+        self.cross = window.T @ window
+        self.valid_count = self._valid[:self.count].sum(axis=0)
+
+    # ------------------------------------------------------------ reads
+    # Returns are 0 where a symbol has no price yet, so cross products only
+    # cover bars both symbols traded. A pair's sample is the shorter of the
+    # two histories and each symbol is centred on its own mean; for symbols
+    # with the same history this is the plain sample covariance.
+    def covariance(self):
+        c = self.valid_count
+        k = np.minimum.outer(c, c).astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum / c
+            cov = (self.cross - k * np.outer(mean, mean)) / (k - 1)
+        cov[k < 2] = np.nan
+        return cov
+
+    def ew_covariance(self):
+        w = self.ew_weight
+        k = np.minimum.outer(w, w)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.ew_sum / w
+            cov = self.ew_cross / k - np.outer(mean, mean)
+        cov[k == 0] = np.nan
+        return cov
+
+    @staticmethod
+    def _to_corr(cov):
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = cov / np.outer(std, std)
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return np.clip(corr, -1.0, 1.0)
+
+    def correlation(self, ew=False):
+        return self._to_corr(self.ew_covariance() if ew else self.covariance())
+
+    def volatility(self):
+        """Per-asset standard deviation of returns over the window"""
+        return np.sqrt(np.clip(np.diag(self.covariance()), 0, None))
+
+    def drawdown(self, window_only=True):
+        """Fractional distance of the last price below the window high (or the all-time tracked high)"""
+        if self.last_price is None:
+            return np.full(len(self.symbols), np.nan)
+        peak = np.nanmax(self._prices, axis=0) if window_only else self.peak
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return 1 - self.last_price / peak
+
+    def snapshot_key(self):
+        """Identifies the current state: changes with every applied bar"""
+        return (tuple(self.symbols), self.window, self.bars, str(self.last_date))
+
+
+class _Tracker:
+    def __init__(self, symbols, window, warm_period):
+        self.stats = RollingStats(symbols, window)
+        self.lock = threading.Lock()
+        self.warm_period = warm_period
+        self.checked = 0.0
+
+    def advance(self, force=False):
+        """Apply bars newer than the last one seen (polled at most every ADVANCE_INTERVAL)"""
+        with self.lock:
+            now = time.time()
+            if not force and self.stats.last_date is not None and now - self.checked < ADVANCE_INTERVAL:
+                return self.stats
+            if self.stats.last_date is None:
+                prices = get_multi_asset_data(self.stats.symbols, period=self.warm_period)
+                self.stats.warm(prices)
+                logger.info(f"Warmed {len(self.stats.symbols)}-name tracker on {len(prices)} bars")
+            else:
+                # Everything since the last applied bar, however long the tracker sat idle
+                gap_days = (pd.Timestamp.today().normalize() - pd.Timestamp(self.stats.last_date)).days
+                prices = get_multi_asset_data(self.stats.symbols, period=f"{max(gap_days, 0) + 7}d")
+                prices = prices.reindex(columns=self.stats.symbols)
+                new = prices[prices.index > self.stats.last_date]
+                if len(new) >= self.stats.window:
+                    # The whole window has turned over: re-warming is cheaper than replaying
+                    prices = get_multi_asset_data(self.stats.symbols, period=self.warm_period)
+                    self.stats.warm(prices)
+                    logger.info(f"Re-warmed {len(self.stats.symbols)}-name tracker after {len(new)} missed bars")
+                else:
+                    for date, row in new.iterrows():
+                        self.stats.update(row.to_numpy(), date)
+            self.checked = now
+            return self.stats
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(symbols=None, window=252, warm_period="2y"):
+    """Shared ``RollingStats`` for ``symbols``, warmed on first use and kept current"""
+    if symbols is None:
+        symbols = ["SPY", "QQQ", "IWM", "TLT", "GLD"]
+    key = (tuple(symbols), window)
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = _Tracker(symbols, window, warm_period)
+    return tracker.advance()
@@ -1,12 +1,14 @@
 import numpy as np
 import hashlib
 import json
-from datetime import datetime
-import sqlite3
+from datetime import datetime, timedelta
 from core.data_fetcher import get_multi_asset_data
+from core.db import get_database
+from core.cache import ResultCache, make_key
 import pandas as pd
 import logging
 import os
+import threading
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
@@ -16,27 +18,127 @@ logger.setLevel(logging.INFO)
 
 # Create database directory if needed
 os.makedirs('data', exist_ok=True)
-conn = sqlite3.connect('data/alphas.db', check_same_thread=False)
+# WAL file with per-thread readers and one batching writer thread (see core.db)
+db = get_database(os.path.join('data', 'alphas.db'))
+
+SCHEMA_VERSION = 2
+DEFAULT_BACKTEST_PERIOD = '2020-01-01_to_2024-06-01'
+
+# Leaderboard filter; the partial index below is built on exactly these terms
+ELITE_SHARPE = 3.8
+ELITE_PERSISTENCE = 0.85
+ELITE_DIVERSITY = 0.6
+LEADERBOARD_DAYS = 30
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS alphas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT,
+        sharpe REAL,
+        persistence_score REAL,
+        diversity REAL,
+        consistency REAL,
+        max_drawdown REAL,
+        score REAL,
+        strategy_hash TEXT,
+        backtest_period TEXT,
+        created TEXT,
+        last_updated TEXT,
+        live_paper_trading INTEGER DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_alphas_created ON alphas(created)",
+    "CREATE INDEX IF NOT EXISTS idx_alphas_score ON alphas(score DESC)",
+    f"""CREATE INDEX IF NOT EXISTS idx_alphas_leaderboard ON alphas(score DESC, created)
+        WHERE sharpe > {ELITE_SHARPE} AND persistence_score > {ELITE_PERSISTENCE} AND diversity > {ELITE_DIVERSITY}""",
+    """CREATE TABLE IF NOT EXISTS alpha_returns (
+        alpha_id INTEGER PRIMARY KEY REFERENCES alphas(id) ON DELETE CASCADE,
+        n INTEGER NOT NULL,
+        returns BLOB NOT NULL
+    )""",
+)
+
+def composite_score(sharpe, persistence_score, diversity, consistency):
+    """Leaderboard score, stored per row so it can be indexed"""
+    return 0.4*sharpe + 0.3*persistence_score + 0.2*diversity + 0.1*consistency
+
+def _pack_returns(returns_series):
+    return np.asarray(returns_series, dtype='<f8').tobytes()
+
+def _unpack_returns(blob):
+    return np.frombuffer(blob, dtype='<f8').tolist() if blob else []
+
+def _migrate_legacy(conn):
+    """Move a v0 table (metrics and returns inside the oos_metrics JSON) to the v2 layout"""
+    conn.execute("ALTER TABLE alphas RENAME TO alphas_legacy")
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+
+    cursor = conn.execute("""
+        SELECT name, description, sharpe, persistence_score, diversity, consistency,
+               created, live_paper_trading, oos_metrics, returns_series
+        FROM alphas_legacy
+    """)
+    migrated = 0
+    while True:
+        batch = cursor.fetchmany(10000)
+        if not batch:
+            break
+        alpha_rows, returns_rows = [], []
+        for name, description, sharpe, persistence, diversity, consistency, created, live, oos_json, legacy_returns in batch:
+            try:
+                oos = json.loads(oos_json) if oos_json else {}
+            except ValueError:
+                oos = {}
+            sharpe, persistence = sharpe or 0.0, persistence or 0.0
+            diversity, consistency = diversity or 0.0, consistency or 0.0
+            alpha_rows.append((name, description, sharpe, persistence, diversity, consistency,
+                               oos.get('max_drawdown'), composite_score(sharpe, persistence, diversity, consistency),
+                               oos.get('hash'), oos.get('backtest_period'), created,
+                               oos.get('last_updated') or created, live or 0))
+            series = oos.get('returns_series')
+            if not series and legacy_returns:
+                try:
+                    series = json.loads(legacy_returns)
+                except ValueError:
+                    series = None
+            if series:
+                returns_rows.append((name, len(series), _pack_returns(series)))
+        conn.executemany("""
+            INSERT INTO alphas
+            (name, description, sharpe, persistence_score, diversity, consistency, max_drawdown, score,
+             strategy_hash, backtest_period, created, last_updated, live_paper_trading)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
+        """, alpha_rows)
+        conn.executemany("""
+            INSERT INTO alpha_returns (alpha_id, n, returns)
+            VALUES ((SELECT id FROM alphas WHERE name = ?), ?, ?)
+        """, returns_rows)
+        migrated += len(alpha_rows)
+    conn.execute("DROP TABLE alphas_legacy")
+    return migrated
+
+def _init_schema(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    legacy = conn.execute(
+        "SELECT 1 FROM pragma_table_info('alphas') WHERE name = 'oos_metrics'").fetchone() is not None
+    if legacy:
+        migrated = _migrate_legacy(conn)
+        logger.info(f"Migrated {migrated} alphas to schema v{SCHEMA_VERSION}")
+    else:
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+    # Earlier saves could store str(Timestamp) or 'nan'; the leaderboard compares ISO strings
+    conn.execute("UPDATE alphas SET created = replace(created, ' ', 'T') WHERE created GLOB '????-??-?? *'")
+    conn.execute("UPDATE alphas SET created = last_updated WHERE created IS NULL OR created NOT GLOB '????-??-??*'")
+    if version != SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
 def init_db():
-    """Initialize database with proper table structure"""
+    """Initialize database with proper table structure, migrating legacy files"""
     try:
-        with conn:
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS alphas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT,
-                sharpe REAL,
-                persistence_score REAL,
-                created TEXT,
-                live_paper_trading INTEGER DEFAULT 0,
-                oos_metrics TEXT,
-                diversity REAL,
-                consistency REAL,
-                returns_series TEXT
-            )
-            """)
+        # Runs in one writer transaction, so a migration is all-or-nothing
+        db.write(_init_schema)
         logger.info("Database initialized")
     except Exception as e:
         logger.error(f"DB initialization failed: {str(e)}")
@@ -44,99 +146,254 @@ def init_db():
 # Initialize database on import
 init_db()
 
+def _upsert_alphas(conn, records):
+    """Insert or update alpha rows plus their returns, inside the caller's transaction.
+
+    ``records`` are dicts with the alphas columns and an optional ``returns_series``."""
+    conn.executemany("""
+        INSERT INTO alphas
+        (name, description, sharpe, persistence_score, diversity, consistency, max_drawdown, score,
+         strategy_hash, backtest_period, created, last_updated, live_paper_trading)
+        VALUES (:name, :description, :sharpe, :persistence_score, :diversity, :consistency, :max_drawdown, :score,
+                :strategy_hash, :backtest_period, :created, :last_updated, :live_paper_trading)
+        ON CONFLICT(name) DO UPDATE SET
+            description = excluded.description, sharpe = excluded.sharpe,
+            persistence_score = excluded.persistence_score, diversity = excluded.diversity,
+            consistency = excluded.consistency, max_drawdown = excluded.max_drawdown, score = excluded.score,
+            strategy_hash = excluded.strategy_hash, backtest_period = excluded.backtest_period,
+            created = excluded.created, last_updated = excluded.last_updated,
+            live_paper_trading = excluded.live_paper_trading
+    """, records)
+    with_returns = [(r['name'], len(r['returns_series']), _pack_returns(r['returns_series']))
+                    for r in records if r.get('returns_series') is not None]
+    conn.executemany("""
+        INSERT OR REPLACE INTO alpha_returns (alpha_id, n, returns)
+        VALUES ((SELECT id FROM alphas WHERE name = ?), ?, ?)
+    """, with_returns)
+    # A re-save without returns must not keep serving the series of the old metrics
+    conn.executemany("""
+        DELETE FROM alpha_returns WHERE alpha_id = (SELECT id FROM alphas WHERE name = ?)
+    """, [(r['name'],) for r in records if r.get('returns_series') is None])
+
+# Minimum metrics for an alpha to be stored at all
+SAVE_SHARPE = 3.0
+SAVE_PERSISTENCE = 0.85
+SAVE_DIVERSITY = 0.6
+
+def _float_column(frame, name, default=0.0):
+    if name not in frame:
+        return np.full(len(frame), default)
+    return pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=float)
+
+def _optional(value):
+    return None if value is None or (isinstance(value, float) and np.isnan(value)) else value
+
+def _returns_or_none(value):
+    """A returns sequence, or None for the NaN/scalar a frame fills in for records without one"""
+    value = _optional(value)
+    return value if value is not None and np.ndim(value) == 1 else None
+
+def _iso_created(value, now):
+    """``created`` as a local ISO timestamp (what the leaderboard compares), ``now`` if missing or unparseable"""
+    try:
+        ts = pd.Timestamp(_optional(value)) if _optional(value) is not None else pd.NaT
+    except (ValueError, TypeError):
+        ts = pd.NaT
+    if pd.isna(ts):
+        return now
+    if ts.tzinfo is not None:
+        ts = pd.Timestamp(ts.to_pydatetime().astimezone().replace(tzinfo=None))
+    return ts.isoformat()
+
+def save_alphas(alphas, auto_deploy=False):
+    """Validate and store a whole generation of alphas in one write transaction.
+
+    ``alphas`` is a DataFrame, record array or list of dicts with ``name``,
+    ``description``, ``sharpe`` and ``persistence_score`` plus optional
+    ``diversity``, ``consistency``, ``max_drawdown``, ``backtest_period``,
+    ``created`` and ``returns_series`` columns. Elite criteria are checked
+    as array comparisons over the whole batch. Returns a frame aligned with
+    the input holding ``name``, ``accepted`` and the first failed criterion
+    in ``reason``."""
+    frame = alphas if isinstance(alphas, pd.DataFrame) else pd.DataFrame.from_records(alphas)
+    names = frame['name'].astype(str).to_numpy()
+    sharpe = _float_column(frame, 'sharpe', np.nan)
+    persistence = _float_column(frame, 'persistence_score', np.nan)
+    diversity = _float_column(frame, 'diversity')
+    consistency = _float_column(frame, 'consistency')
+
+    # STRICTER: Increased elite criteria thresholds (NaN metrics fail every check)
+    accepted = np.ones(len(frame), dtype=bool)
+    reason = np.full(len(frame), '', dtype=object)
+    for ok, why in ((sharpe > SAVE_SHARPE, f'sharpe <= {SAVE_SHARPE}'),
+                    (persistence > SAVE_PERSISTENCE, f'persistence <= {SAVE_PERSISTENCE}'),
+                    (diversity > SAVE_DIVERSITY, f'diversity <= {SAVE_DIVERSITY}')):
+        reason[accepted & ~ok] = why
+        accepted &= ok
+
+    rows = np.flatnonzero(accepted)
+    if len(rows):
+        now = datetime.now().isoformat()
+        score = composite_score(sharpe, persistence, diversity, consistency)
+        descriptions = frame['description'].astype(str).to_numpy() if 'description' in frame else np.full(len(frame), '')
+        max_dd = _float_column(frame, 'max_drawdown', np.nan)
+        periods = frame['backtest_period'].to_numpy() if 'backtest_period' in frame else None
+        created = frame['created'].to_numpy() if 'created' in frame else None
+        returns = frame['returns_series'].to_numpy() if 'returns_series' in frame else None
+        records = [{
+            'name': names[i],
+            'description': descriptions[i],
+            'sharpe': sharpe[i],
+            'persistence_score': persistence[i],
+            'diversity': diversity[i],
+            'consistency': consistency[i],
+            'max_drawdown': _optional(max_dd[i]),
+            'score': score[i],
+            'strategy_hash': hashlib.sha256(f"{names[i]}{descriptions[i]}{now}".encode()).hexdigest()[:12],
+            'backtest_period': (_optional(periods[i]) if periods is not None else None) or DEFAULT_BACKTEST_PERIOD,
+            'created': _iso_created(created[i], now) if created is not None else now,
+            'last_updated': now,
+            'live_paper_trading': 1 if auto_deploy else 0,
+            'returns_series': _returns_or_none(returns[i]) if returns is not None else None
+        } for i in rows.tolist()]
+        try:
+            db.write(lambda conn: _upsert_alphas(conn, records))
+            logger.info(f"Saved {len(records)}/{len(frame)} alphas")
+        except Exception as e:
+            logger.error(f"Bulk save error: {e}")
+            reason[rows] = f'write failed: {e}'
+            accepted[:] = False
+
+    return pd.DataFrame({'name': names, 'accepted': accepted, 'reason': reason}, index=frame.index)
+
 def save_alpha(name, description, sharpe, persistence_score, auto_deploy=False, metrics=None, diversity=0.0, consistency=0.0, returns_series=None):
     try:
-        # STRICTER: Increased elite criteria thresholds
-        if sharpe > 3.0 and persistence_score > 0.85 and diversity > 0.6:
-            strategy_hash = hashlib.sha256(f"{name}{description}{datetime.now()}".encode()).hexdigest()[:12]
-            oos_metrics = {
-                'sharpe': sharpe,
-                'persistence': persistence_score,
-                'hash': strategy_hash,
-                'diversity': diversity,
-                'consistency': consistency,
-                'backtest_period': '2020-01-01_to_2024-06-01',
-                'last_updated': datetime.now().isoformat(),
-                'returns_series': returns_series
-            }
-            
-            with conn:
-                conn.execute("""
-                    INSERT OR REPLACE INTO alphas 
-                    (name, description, sharpe, persistence_score, created, live_paper_trading, oos_metrics, diversity, consistency) 
-                    VALUES (?,?,?,?,?,?,?,?,?)
-                """, (name, description, sharpe, persistence_score, datetime.now().isoformat(), 
-                      1 if auto_deploy else 0, json.dumps(oos_metrics), diversity, consistency))
+        metrics = metrics or {}
+        result = save_alphas([{
+            'name': name,
+            'description': description,
+            'sharpe': sharpe,
+            'persistence_score': persistence_score,
+            'diversity': diversity,
+            'consistency': consistency,
+            'max_drawdown': metrics.get('max_drawdown'),
+            'backtest_period': metrics.get('period'),
+            'returns_series': returns_series
+        }], auto_deploy=auto_deploy)
+        if result['accepted'].iloc[0]:
             logger.info(f"Saved alpha: {name} | Sharpe: {sharpe:.2f} | Persistence: {persistence_score:.2f}")
             return True
-        logger.warning(f"Alpha rejected: {name} | Sharpe: {sharpe:.2f} | Persistence: {persistence_score:.2f}")
+        logger.warning(f"Alpha rejected: {name} | Sharpe: {sharpe:.2f} | Persistence: {persistence_score:.2f}"
+                       f" | {result['reason'].iloc[0]}")
         return False
     except Exception as e:
         logger.error(f"Save error: {e}")
-        conn.rollback()
         return False
 
-def get_real_oos_metrics(strategy_fn):
-    """Enhanced walk-forward validation with real market data"""
+def _slippage(trades, capital):
+    """Slippage as a fraction of portfolio value: 5bp + 15bp per $1M traded, per asset.
+
+    ``trades`` are weight changes, so the dollar size of a trade is
+    ``|trade| * capital``; turning over a whole $1M book costs 20bp. The
+    original per-bar loop divided the *weight* change by $1M, which left the
+    impact term at ~0 and every trade at a flat 5bp, and charged one scalar
+    trade for the whole basket. OOS metrics of high-turnover strategies are
+    correspondingly lower than under that loop."""
+    traded = np.abs(trades)
+    return ((5 + 15 * traded * capital / 1000000) / 10000 * traded).sum(axis=-1)
+
+def _walk_forward_loop(oos_returns, strategy_fn, capital=1000000):
+    """Per-bar compatibility mode: ``strategy_fn`` sees one row of returns at a time.
+
+    Positions are the signal as fractions of current portfolio value, the
+    same cost and sizing model as ``simulate_walk_forward``."""
+    values = oos_returns.to_numpy(dtype=float)
+    n_assets = values.shape[1]
+    position = np.zeros(n_assets)
+    returns_list = []
+
+    for i in range(1, len(values)):
+        # Signal from previous day returns, held over the current day
+        target_position = np.asarray(strategy_fn(oos_returns.iloc[i-1]), dtype=float) * np.ones(n_assets)
+        slippage = _slippage(target_position - position, capital)
+        position = target_position
+
+        portfolio_return = float(np.dot(values[i], position) - slippage)
+        returns_list.append(portfolio_return)
+
+    return np.array(returns_list)
+
+def simulate_walk_forward(oos_returns, weights, capital=1000000):
+    """Vectorized walk-forward execution.
+
+    ``weights[..., t, :]`` is the allocation decided after bar ``t`` and held
+    over bar ``t+1``, as fractions of current portfolio value (the original
+    loop also multiplied positions by the running portfolio value, which
+    compounded P&L twice); any leading axes are independent strategies. Positions,
+    turnover, slippage and returns are computed with array operations and the
+    result has shape ``(..., T-1)``. Compound with ``np.cumprod(1 + r, -1)``."""
+    r = np.asarray(oos_returns, dtype=float)
+    w = np.asarray(weights, dtype=float)
+    if w.ndim == 1:
+        w = w[:, None]
+    w = np.broadcast_to(w, w.shape[:-1] + (r.shape[1],))
+
+    held = w[..., :-1, :]
+    previous = np.concatenate([np.zeros_like(held[..., :1, :]), held[..., :-1, :]], axis=-2)
+    slippage = _slippage(held - previous, capital)
+    return (held * r[1:]).sum(axis=-1) - slippage
+
+def _oos_metrics(portfolio_returns, index):
+    """Sharpe, persistence and drawdown for each row of a (S, T) returns array"""
+    R = np.atleast_2d(portfolio_returns)
+    ann_return = R.mean(axis=1) * 252
+    ann_vol = R.std(axis=1, ddof=1) * np.sqrt(252) if R.shape[1] > 1 else np.zeros(len(R))
+    sharpe = np.divide(ann_return, ann_vol, out=np.zeros(len(R)), where=ann_vol > 0)
+
+    portfolio_values = np.cumprod(1 + R, axis=1)
+    peak = np.maximum.accumulate(portfolio_values, axis=1)
+    max_drawdown = ((portfolio_values - peak) / peak).min(axis=1)
+
+    # Persistence: share of calendar months with a positive compounded return
+    months = np.asarray(index.year * 12 + index.month)
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        monthly_log = np.add.reduceat(np.log1p(R), starts, axis=1)
+    persistence = (monthly_log > 0).mean(axis=1)
+
+    return [{
+        'sharpe': max(0, float(sharpe[k])),
+        'persistence': float(persistence[k]),
+        'max_drawdown': abs(float(max_drawdown[k])),
+        'returns_series': R[k].tolist(),
+        'period': f'{index[0].date()}_to_{index[-1].date()}'
+    } for k in range(len(R))]
+
+def _load_oos_returns(oos_days=120):
+    symbols = ['SPY', 'QQQ', 'IWM', 'GLD', 'TLT']
+    data = get_multi_asset_data(symbols, period=f"{max(2, oos_days // 252 + 1)}y")
+    returns = data.pct_change().dropna()
+    # Default OOS period is the last 6 months
+    return returns.iloc[-oos_days:]
+
+def get_real_oos_metrics(strategy_fn, vectorized=None, capital=1000000, oos_days=120):
+    """Enhanced walk-forward validation with real market data.
+
+    A vectorized strategy (``vectorized=True`` or a ``strategy_fn.vectorized``
+    attribute) receives the whole OOS returns frame and returns a T x n_assets
+    weight matrix whose row ``t`` only uses data up to ``t``. Otherwise the
+    strategy is called bar by bar on the previous day's returns."""
     try:
-        # Fetch real market data
-        symbols = ['SPY', 'QQQ', 'IWM', 'GLD', 'TLT']
-        data = get_multi_asset_data(symbols, period="2y")
-        returns = data.pct_change().dropna()
-        
-        # Use last 6 months as OOS period
-        oos_returns = returns.iloc[-120:]
-        
-        # Backtest strategy
-        portfolio_value = 1.0
-        position = 0.0
-        portfolio_values = []
-        returns_list = []
-        
-        for i in range(1, len(oos_returns)):
-            # Get previous day returns for all assets
-            prev_returns = oos_returns.iloc[i-1]
-            
-            # Get strategy signal
-            signal = strategy_fn(prev_returns)
-            target_position = signal * portfolio_value
-            trade = target_position - position
-            
-            # Realistic slippage model
-            slippage_bp = 5 + 15 * abs(trade) / 1000000
-            slippage = slippage_bp / 10000 * abs(trade)
-            position = target_position
-            
-            # Current day returns
-            current_returns = oos_returns.iloc[i]
-            portfolio_return = np.dot(current_returns, position) - slippage
-            portfolio_value *= (1 + portfolio_return)
-            
-            portfolio_values.append(portfolio_value)
-            returns_list.append(portfolio_return)
-        
-        returns_series = pd.Series(returns_list)
-        ann_return = returns_series.mean() * 252
-        ann_vol = returns_series.std() * np.sqrt(252)
-        sharpe = ann_return / ann_vol if ann_vol > 0 else 0
-        
-        # Calculate max drawdown
-        peak = np.maximum.accumulate(portfolio_values)
-        drawdown = (np.array(portfolio_values) - peak) / peak
-        max_drawdown = np.min(drawdown)
-        
-        # Persistence calculation
-        monthly_returns = returns_series.resample('M').agg(lambda x: (1+x).prod()-1)
-        positive_months = (monthly_returns > 0).sum()
-        persistence = positive_months / len(monthly_returns) if len(monthly_returns) > 0 else 0
-        
-        return {
-            'sharpe': max(0, sharpe),
-            'persistence': persistence,
-            'max_drawdown': abs(max_drawdown),
-            'returns_series': returns_list,
-            'period': f'2020-01-01_to_2024-06-01'
-        }
+        oos_returns = _load_oos_returns(oos_days)
+        if vectorized is None:
+            vectorized = getattr(strategy_fn, 'vectorized', False)
+
+        if vectorized:
+            portfolio_returns = simulate_walk_forward(oos_returns.to_numpy(), strategy_fn(oos_returns), capital)
+        else:
+            portfolio_returns = _walk_forward_loop(oos_returns, strategy_fn, capital)
+
+        return _oos_metrics(portfolio_returns, oos_returns.index[1:])[0]
     except Exception as e:
         logger.error(f"OOS validation failed: {str(e)}")
         return {
@@ -147,87 +404,210 @@ def get_real_oos_metrics(strategy_fn):
             'period': 'error'
         }
 
+def get_batch_oos_metrics(signal_fn, capital=1000000, oos_days=120):
+    """Walk-forward many strategies at once: ``signal_fn`` maps the OOS returns
+    frame to an (S, T, n_assets) weight tensor; one metrics dict per strategy"""
+    try:
+        oos_returns = _load_oos_returns(oos_days)
+        portfolio_returns = simulate_walk_forward(oos_returns.to_numpy(), signal_fn(oos_returns), capital)
+        return _oos_metrics(portfolio_returns, oos_returns.index[1:])
+    except Exception as e:
+        logger.error(f"Batch OOS validation failed: {str(e)}")
+        return []
+
+# Leaderboards by limit: (data_version, expires, frame). Shared by every session.
+_top_cache = {}
+_top_cache_lock = threading.Lock()
+_top_cache_stats = {'hits': 0, 'misses': 0}
+
+def _query_top_alphas(limit, now):
+    cutoff = (now - timedelta(days=LEADERBOARD_DAYS)).isoformat()
+    query = f"""
+        SELECT name, sharpe, persistence_score, diversity, consistency, score, max_drawdown,
+               strategy_hash, backtest_period, created, last_updated
+        FROM alphas
+        WHERE sharpe > {ELITE_SHARPE}
+          AND persistence_score > {ELITE_PERSISTENCE}
+          AND diversity > {ELITE_DIVERSITY}
+          AND created > ?
+        ORDER BY score DESC
+        LIMIT ?
+    """
+    df = pd.read_sql_query(query, db.reader(), params=(cutoff, int(limit)))
+    df['created'] = pd.to_datetime(df['created'], errors='coerce', format='ISO8601')
+    df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce', format='ISO8601')
+    # A timestamp that does not parse can't be placed in the window at all
+    df = df[df['created'].notna()].reset_index(drop=True)
+    # Rows only ever leave the window with time, so the result holds until its oldest row ages out
+    expires = (df['created'].min().to_pydatetime() + timedelta(days=LEADERBOARD_DAYS)
+               if not df.empty else datetime.max)
+    return df, expires
+
 def get_top_alphas(limit=25):
-    """Fetch top alphas with enhanced filtering and freshness"""
+    """Fetch top alphas with enhanced filtering and freshness.
+
+    Served from the partial ``idx_alphas_leaderboard`` index in score order,
+    so the cost depends on ``limit``, not on how many alphas are stored.
+    Results are cached per ``limit`` until the database's ``data_version``
+    moves (a commit from any connection or process) or a listed alpha leaves
+    the freshness window, so concurrent viewers share one query per change."""
     try:
-        # Query the database
-        query = f"""
-            SELECT name, sharpe, persistence_score, diversity, consistency, oos_metrics,
-                   json_extract(oos_metrics, '$.last_updated') as last_updated
-            FROM alphas 
-            WHERE sharpe > 3.8 
-              AND persistence_score > 0.85
-              AND diversity > 0.6
-              AND datetime(created) > datetime('now', '-30 days')
-            ORDER BY (0.4*sharpe + 0.3*persistence_score + 0.2*diversity + 0.1*consistency) DESC
-            LIMIT {limit}
-        """
-        df = pd.read_sql_query(query, conn)
-        if not df.empty:
-            df['oos_metrics'] = df['oos_metrics'].apply(json.loads)
-            df['last_updated'] = pd.to_datetime(df['last_updated'])
-        return df
+        version = db.data_version()
+        now = datetime.now()
+        entry = _top_cache.get(limit)
+        if entry is None or entry[0] != version or now >= entry[1]:
+            with _top_cache_lock:
+                entry = _top_cache.get(limit)
+                if entry is None or entry[0] != version or now >= entry[1]:
+                    _top_cache_stats['misses'] += 1
+                    df, expires = _query_top_alphas(limit, now)
+                    entry = _top_cache[limit] = (version, expires, df)
+                    return df.copy()
+        _top_cache_stats['hits'] += 1
+        return entry[2].copy()
     except Exception as e:
         logger.error(f"Top alphas query failed: {str(e)}")
         return pd.DataFrame()
 
-def create_performance_plots(returns_series):
-    if not returns_series or len(returns_series) == 0:
+def get_alpha_returns(name):
+    """Stored OOS daily returns of one alpha (empty list if none)"""
+    rows = db.read("""
+        SELECT r.returns FROM alpha_returns r JOIN alphas a ON a.id = r.alpha_id WHERE a.name = ?
+    """, (name,))
+    return _unpack_returns(rows[0][0]) if rows else []
+
+PLOT_POINTS = 1500   # max points per line trace sent to the browser
+
+_plot_cache = ResultCache('performance_plots', max_items=64, disk=False)
+
+def lttb(x, y, n_out):
+    """Indices of the Largest-Triangle-Three-Buckets downsample of ``(x, y)``.
+
+    Keeps the first and last points and, from each bucket, the point that
+    spans the largest triangle with the previous pick and the next bucket's
+    mean, so peaks, troughs and drawdowns survive the reduction."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picks = np.empty(n_out, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nlo, nhi = (edges[b + 1], edges[b + 2]) if b + 2 < len(edges) else (n - 1, n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        picks[b + 1] = a
+    return picks
+
+def _performance_series(values, dates, max_points):
+    """Equity, drawdown and monthly series plus headline metrics, downsampled for plotting"""
+    equity = np.cumprod(1 + values)
+    drawdown = (equity / np.maximum.accumulate(equity) - 1) * 100
+
+    # Calculate performance metrics
+    ann_return = values.mean() * 252
+    ann_vol = values.std(ddof=1) * np.sqrt(252) if len(values) > 1 else 0.0
+    sharpe = ann_return / ann_vol if ann_vol > 0 else 0
+    max_dd = drawdown.min()
+    calmar = ann_return / (-max_dd/100) if max_dd < 0 else 0
+
+    # Month-end equity -> monthly returns, without a resample round-trip
+    months = dates.year.to_numpy() * 12 + dates.month.to_numpy()
+    month_end = np.flatnonzero(np.r_[months[1:] != months[:-1], True])
+    monthly = np.diff(equity[month_end]) / equity[month_end][:-1] * 100
+
+    t = np.arange(len(values))
+    eq_idx = lttb(t, equity, max_points)
+    dd_idx = lttb(t, drawdown, max_points)
+    month_dates = dates[month_end][1:]
+    return {
+        'equity': (dates[eq_idx], equity[eq_idx]),
+        'drawdown': (dates[dd_idx], drawdown[dd_idx]),
+        'monthly': (month_dates.to_period('M').to_timestamp(how='end').normalize(), monthly),
+        'sharpe': sharpe,
+        'calmar': calmar,
+        'max_dd': max_dd,
+        'points': len(values)
+    }
+
+def _business_days_to_today(n):
+    # Same dates as pd.date_range(end=today, periods=n, freq='B'), without the per-day offset loop
+    end = np.busday_offset(np.datetime64(pd.Timestamp.today().date(), 'D'), 0, roll='backward')
+    start = np.busday_offset(end, -(n - 1))
+    days = np.arange(start, end + 1)
+    return pd.DatetimeIndex(days[np.is_busday(days)])
+
+def _performance_figures(values, dates, max_points):
+    if dates is None:
+        # Generate date index for proper time series plotting
+        dates = _business_days_to_today(len(values))
+    series = _performance_series(values, dates, max_points)
+
+    # Equity curve
+    fig1 = go.Figure()
+    fig1.add_trace(go.Scatter(x=series['equity'][0], y=series['equity'][1], mode='lines', name='Equity', line=dict(color='#00ff9f')))
+    fig1.update_layout(
+        title=f"Equity Curve | Sharpe: {series['sharpe']:.2f} | Calmar: {series['calmar']:.2f}",
+        template='plotly_dark',
+        hovermode='x unified',
+        margin=dict(l=20, r=20, t=40, b=20),
+        height=300
+    )
+
+    # Drawdown chart
+    fig2 = go.Figure()
+    fig2.add_trace(go.Scatter(x=series['drawdown'][0], y=series['drawdown'][1], fill='tozeroy', name='Drawdown',
+                             fillcolor='rgba(255,0,0,0.3)', line=dict(color='#ff0055')))
+    fig2.update_layout(
+        title=f"Drawdown | Max DD: {series['max_dd']:.2f}%",
+        template='plotly_dark',
+        yaxis=dict(ticksuffix='%'),
+        margin=dict(l=20, r=20, t=40, b=20),
+        height=300
+    )
+
+    # Monthly returns
+    month_dates, monthly_returns = series['monthly']
+    fig3 = go.Figure()
+    colors = np.where(monthly_returns >= 0, '#00ff9f', '#ff0055')
+    fig3.add_trace(go.Bar(x=month_dates, y=monthly_returns, marker_color=colors, name='Monthly Return'))
+    fig3.update_layout(
+        title='Monthly Returns',
+        template='plotly_dark',
+        yaxis=dict(ticksuffix='%'),
+        margin=dict(l=20, r=20, t=40, b=20),
+        height=300
+    )
+
+    return fig1, fig2, fig3
+
+def create_performance_plots(returns_series, max_points=PLOT_POINTS):
+    """Equity, drawdown and monthly-return figures for a daily returns series.
+
+    ``returns_series`` is a list/array (dated back from today on business
+    days) or a Series with a DatetimeIndex. Figures are cached by a
+    fingerprint of the returns and are shared, so treat them as read-only.
+    Line traces are LTTB-downsampled to at most ``max_points`` points, so
+    figure payloads stay bounded however long the history is."""
+    if returns_series is None or len(returns_series) == 0:
         return None, None, None
-    
+
     try:
-        returns = pd.Series(returns_series)
-        # Generate date index for proper time series plotting
-        dates = pd.date_range(end=pd.Timestamp.today(), periods=len(returns), freq='B')
-        returns.index = dates
-        
-        equity = (1 + returns).cumprod()
-        drawdown = (equity / equity.cummax() - 1) * 100
-        
-        # Calculate performance metrics
-        ann_return = returns.mean() * 252
-        ann_vol = returns.std() * np.sqrt(252)
-        sharpe = ann_return / ann_vol if ann_vol > 0 else 0
-        max_dd = drawdown.min()
-        calmar = ann_return / (-max_dd/100) if max_dd < 0 else 0
-        
-        # Equity curve
-        fig1 = go.Figure()
-        fig1.add_trace(go.Scatter(x=equity.index, y=equity, mode='lines', name='Equity', line=dict(color='#00ff9f')))
-        fig1.update_layout(
-            title=f'Equity Curve | Sharpe: {sharpe:.2f} | Calmar: {calmar:.2f}',
-            template='plotly_dark',
-            hovermode='x unified',
-            margin=dict(l=20, r=20, t=40, b=20),
-            height=300
-        )
-        
-        # Drawdown chart
-        fig2 = go.Figure()
-        fig2.add_trace(go.Scatter(x=drawdown.index, y=drawdown, fill='tozeroy', name='Drawdown', 
-                                 fillcolor='rgba(255,0,0,0.3)', line=dict(color='#ff0055')))
-        fig2.update_layout(
-            title=f'Drawdown | Max DD: {max_dd:.2f}%',
-            template='plotly_dark',
-            yaxis=dict(ticksuffix='%'),
-            margin=dict(l=20, r=20, t=40, b=20),
-            height=300
-        )
-        
-        # Monthly returns
-        monthly_returns = equity.resample('M').last().pct_change().dropna() * 100
-        fig3 = go.Figure()
-        colors = ['#00ff9f' if x >= 0 else '#ff0055' for x in monthly_returns]
-        fig3.add_trace(go.Bar(x=monthly_returns.index, y=monthly_returns, marker_color=colors, name='Monthly Return'))
-        fig3.update_layout(
-            title='Monthly Returns',
-            template='plotly_dark',
-            yaxis=dict(ticksuffix='%'),
-            margin=dict(l=20, r=20, t=40, b=20),
-            height=300
-        )
-        
-        return fig1, fig2, fig3
+        if isinstance(returns_series, pd.Series) and isinstance(returns_series.index, pd.DatetimeIndex):
+            values = returns_series.to_numpy(dtype=float)
+            dates = returns_series.index
+            stamp = dates.asi8.tobytes()
+        else:
+            values = np.asarray(returns_series, dtype=float)
+            dates = None
+            stamp = str(pd.Timestamp.today().date()).encode()
+        key = make_key(hashlib.sha256(values.tobytes() + stamp).hexdigest(), max_points)
+        return _plot_cache.get_or_compute(key, lambda: _performance_figures(values, dates, max_points))
     except Exception as e:
         logger.error(f"Plot generation failed: {str(e)}")
         return None, None, None
@@ -1,28 +1,163 @@
-import networkx as nx
-from pyvis.network import Network
+import json
 import streamlit.components.v1 as components
 import numpy as np
-from core.data_fetcher import get_multi_asset_data
-
-def build_exposure_graph():
-    from core.data_fetcher import get_multi_asset_data
-    returns = get_multi_asset_data(period="1y")
-    G = nx.Graph()
-    for col in corr.columns:
-        G.add_node(col, title=col, size=35)
-    for i in range(len(corr)):
-        for j in range(i+1, len(corr)):
-            if corr.iloc[i,j] > 0.73:
-                G.add_edge(corr.columns[i], corr.columns[j], weight=corr.iloc[i,j])
-    net = Network(height="640px", width="100%", bgcolor="#05050f")
-    net.from_nx(G)
-    net.save_graph("crowd.html")
-    with open("crowd.html", "r", encoding="utf-8") as f:
-        components.html(f.read(), height=640)
-    return round(corr.where(corr > 0.73).mean().mean() * 100, 1)
-
-def simulate_cascade_prob():
-    data, _ = get_multi_asset_data(period="1mo")
-    daily_vol = data.pct_change().std().mean() * 100
-    recent_drawdown = (1 - data.iloc[-1]/data.max()).mean() * 100
-    return round(min(9.9, daily_vol * recent_drawdown / 100), 1)
+from scipy.sparse.linalg import eigsh
+from core.online_stats import get_tracker
+from core.cache import ResultCache, make_key
+from core.cascade import CASCADE_SHARE, adjacency, simulate_cascades, cascade_probability
+
+CROWD_THRESHOLD = 0.73   # pairwise return correlation that counts as a shared exposure
+CROWD_WINDOW = 252       # bars of returns behind the crowding correlations (~1y)
+CASCADE_WINDOW = 21      # bars behind the cascade vol/drawdown inputs (~1mo)
+LAYOUT_SCALE = 1000      # vis.js canvas units spanned by the precomputed layout
+
+# Same vis-network release pyvis 0.3 loads
+GRAPH_TEMPLATE = """<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/dist/vis-network.min.css" />
+<script src="https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/vis-network.min.js"></script>
+<style>html, body {{ margin: 0; }} #exposure-graph {{ width: 100%; height: {height}; background-color: {bgcolor}; }}</style>
+</head>
+<body>
+<div id="exposure-graph"></div>
+<script>
+new vis.Network(document.getElementById("exposure-graph"),
+                {{nodes: new vis.DataSet({nodes}), edges: new vis.DataSet({edges})}}, {options});
+</script>
+</body>
+</html>
+"""
+
+# Rendered network payloads by (snapshot, threshold, top_k), shared by every session
+_render_cache = ResultCache('crowd_graph', max_items=8, disk=False)
+
+def exposure_edges(corr, threshold=CROWD_THRESHOLD, top_k=None):
+    """Sparse edge list ``(src, dst, weight)`` of pairs correlated above ``threshold``.
+
+    One vectorized mask over the upper triangle, so each pair is considered
+    once. With ``top_k`` each node keeps only its ``top_k`` strongest
+    neighbours; an edge survives if either endpoint keeps it."""
+    corr = np.asarray(corr, dtype=float)
+    n = corr.shape[0]
+    strong = np.triu(np.nan_to_num(corr, nan=-np.inf) > threshold, k=1)
+    if top_k is not None and top_k < n - 1:
+        scores = np.where(strong | strong.T, corr, -np.inf)
+        keep_idx = np.argpartition(-scores, top_k, axis=1)[:, :top_k]
+        keep = np.zeros_like(strong)
+        np.put_along_axis(keep, keep_idx, True, axis=1)
+        strong &= keep | keep.T
+    src, dst = np.nonzero(strong)
+    return src, dst, corr[src, dst]
+
+def graph_stats(n_nodes, src, dst, weight):
+    """Degree and summary statistics straight from the edge list"""
+    degree = np.bincount(src, minlength=n_nodes) + np.bincount(dst, minlength=n_nodes)
+    pairs = n_nodes * (n_nodes - 1) / 2
+    return {
+        'nodes': n_nodes,
+        'edges': int(len(src)),
+        'density': float(len(src) / pairs) if pairs else 0.0,
+        'mean_degree': float(degree.mean()) if n_nodes else 0.0,
+        'max_degree': int(degree.max()) if n_nodes else 0,
+        'isolated': int((degree == 0).sum()),
+        'mean_edge_corr': float(weight.mean()) if len(weight) else 0.0,
+        'degree': degree
+    }
+
+def crowding_score(corr, threshold=CROWD_THRESHOLD):
+    """Mean over names of the average correlation above ``threshold``, in %"""
+    corr = np.asarray(corr, dtype=float)
+    above = np.nan_to_num(corr, nan=-np.inf) > threshold
+    counts = above.sum(axis=0)
+    sums = np.where(above, corr, 0.0).sum(axis=0)
+    col_means = sums[counts > 0] / counts[counts > 0]
+    return round(float(col_means.mean()) * 100, 1) if len(col_means) else float('nan')
+
+def exposure_graph(symbols=None, threshold=CROWD_THRESHOLD, top_k=None, window=CROWD_WINDOW):
+    """Current correlation snapshot, sparse exposure edges and stats for ``symbols``.
+
+    Correlations come from the shared online tracker, which is updated bar by
+    bar, so nothing is recomputed from the raw panel here."""
+    stats = get_tracker(symbols, window)
+    corr = stats.correlation()
+    src, dst, weight = exposure_edges(corr, threshold, top_k)
+    return {
+        'symbols': stats.symbols,
+        'snapshot': stats.snapshot_key(),
+        'corr': corr,
+        'src': src,
+        'dst': dst,
+        'weight': weight,
+        'stats': graph_stats(corr.shape[0], src, dst, weight),
+        'crowding': crowding_score(corr, threshold),
+        'threshold': threshold,
+        'top_k': top_k
+    }
+
+def _layout(corr, seed=42):
+    """2-D positions from the correlation matrix's principal axes.
+
+    The first axis is the common market mode, which every name loads on
+    about equally, so names are placed on the next two. Names that co-move
+    land close together. Lanczos only needs a few matrix-vector products,
+    which is cheap next to a force-directed layout at thousands of nodes."""
+    n = corr.shape[0]
+    if n < 4:
+        angles = 2 * np.pi * np.arange(n) / max(n, 1)
+        return np.column_stack([np.cos(angles), np.sin(angles)]) * LAYOUT_SCALE / 2
+    vals, vecs = eigsh(np.nan_to_num(corr), k=3, which='LA')
+    order = np.argsort(vals)[::-1]
+    xy = vecs[:, order[1:]] * np.sqrt(np.clip(vals[order[1:]], 0, None))
+    span = np.abs(xy).max(axis=0)
+    xy = xy / np.where(span > 0, span, 1)
+    # Deterministic jitter so names with identical loadings do not stack exactly
+    xy += np.random.default_rng(seed).normal(0.0, 0.02, xy.shape)
+    return xy * LAYOUT_SCALE / 2
+
+def _render(graph):
+    names = graph['symbols']
+    xy = _layout(graph['corr'])
+    nodes = [{'id': name, 'label': name, 'title': name, 'shape': 'dot', 'size': 35,
+              'x': float(x), 'y': float(y), 'physics': False}
+             for name, (x, y) in zip(names, xy)]
+    edges = [{'from': names[i], 'to': names[j], 'width': w, 'title': f'{w:.2f}'}
+             for i, j, w in zip(graph['src'].tolist(), graph['dst'].tolist(), graph['weight'].tolist())]
+    return {'nodes': nodes, 'edges': edges, 'html': _graph_html(nodes, edges)}
+
+def _graph_html(nodes, edges, height="640px", bgcolor="#05050f"):
+    """Standalone vis-network page for precomputed nodes and edges.
+
+    Positions are fixed server-side, so the browser draws without a physics
+    pass. The page is rendered directly rather than through a pyvis Network,
+    whose add_node/add_edge scan every existing element per call."""
+    def js(value):
+        return json.dumps(value).replace('</', '<\\/')
+    return GRAPH_TEMPLATE.format(height=height, bgcolor=bgcolor, nodes=js(nodes), edges=js(edges),
+                                 options=js({'physics': {'enabled': False}, 'interaction': {'hover': True}}))
+
+def render_exposure_graph(graph):
+    """Node/edge JSON, layout and standalone HTML for an exposure snapshot.
+
+    Built in memory (no file round-trip) once per correlation snapshot,
+    threshold and ``top_k``, and shared by every session viewing it."""
+    key = make_key(graph['snapshot'], graph['threshold'], graph['top_k'])
+    return _render_cache.get_or_compute(key, lambda: _render(graph))
+
+def build_exposure_graph(symbols=None, threshold=CROWD_THRESHOLD, top_k=None):
+    graph = exposure_graph(symbols, threshold, top_k)
+    components.html(render_exposure_graph(graph)['html'], height=640)
+    return graph['crowding']
+
+def simulate_cascade_prob(symbols=None, num_scenarios=10000, threshold=CROWD_THRESHOLD, seed=None, workers=None):
+    """48h cascade probability (%) from an agent-based deleveraging Monte Carlo
+    over the current exposure graph (see ``core.cascade``)"""
+    graph = exposure_graph(symbols, threshold)
+    stats = get_tracker(symbols, CASCADE_WINDOW, warm_period="3mo")
+    n = len(graph['symbols'])
+    corr = np.nan_to_num(graph['corr'])
+    common_loading = (corr.sum() - np.trace(corr)) / (n * (n - 1)) if n > 1 else 0.0
+    adj = adjacency(n, graph['src'], graph['dst'], graph['weight'])
+    shares = simulate_cascades(adj, stats.volatility(), stats.drawdown(), common_loading,
+                               num_scenarios, seed=seed, workers=workers, stop_share=CASCADE_SHARE)
+    return round(cascade_probability(shares), 1)
@@ -1,6 +1,6 @@
 import streamlit as st
 from core.data_fetcher import get_multi_asset_data
-from core.causal_engine import swarm_generate_hypotheses, build_causal_dag, visualize_dag, counterfactual_sim
+from core.causal_engine import AGENTS, FALLBACK_HYPOTHESES, iter_hypotheses, build_causal_dag, visualize_dag, what_if
 import plotly.graph_objects as go
 import networkx as nx
 
@@ -134,17 +134,24 @@ st.markdown("**How the tool works:** An autonomous swarm of LLM agents (fine-tun
 
 if 'returns' not in st.session_state:
     from core.data_fetcher import get_multi_asset_data
-    returns = get_multi_asset_data(period="2y")
+    returns = get_multi_asset_data(period="2y").pct_change().dropna(how='all')
     st.session_state.returns = returns
 else:
     returns = st.session_state.returns
 
-if st.button("🧠 Activate Autonomous LLM Swarm (5 agents)", type="primary"):
+if st.button(f"🧠 Activate Autonomous LLM Swarm ({len(AGENTS)} agents)", type="primary"):
     with st.spinner("Swarm generating causal hypotheses..."):
         try:
-            hyps = swarm_generate_hypotheses(returns)
-            for h in hyps:
-                st.write("→ " + h)
+            # Agents run concurrently; each new hypothesis is shown as soon as its line is streamed
+            # (repeats of ones already in the hypothesis store are filtered out)
+            count = 0
+            for agent, h in iter_hypotheses(10, context=list(returns.columns)):
+                st.write(f"→ {h}  `{agent}`")
+                count += 1
+            if not count:
+                st.warning("No new hypotheses (agents unavailable or only repeats of stored ones); showing demo hypotheses.")
+                for h in FALLBACK_HYPOTHESES:
+                    st.write("→ " + h)
         except Exception as e:
             st.error(f"Hypothesis generation failed: {str(e)}")
 
@@ -154,7 +161,11 @@ if st.button("🔬 Build & Visualize Neural Causal DAG"):
             G = build_causal_dag(returns)
             visualize_dag(G)
             st.session_state.causal_dag = G  # Store for interaction
-            st.success("Fully explainable causal DAG generated + persistence scores attached.")
+            st.success("Fully explainable lagged causal graph generated + persistence scores attached.")
+            if G.graph['feedback']:
+                # Each link points forward in time; A -> B and B -> A at different lags is a feedback loop
+                st.info(f"{len(G.graph['feedback'])} feedback loops (mutual lagged links), e.g. "
+                        + ", ".join(f"{u} ⇄ {v}" for u, v in G.graph['feedback'][:5]))
         except Exception as e:
             st.error(f"DAG construction failed: {str(e)}")
 
@@ -199,10 +210,14 @@ st.markdown('</div>', unsafe_allow_html=True)
 if st.button("Run What-If Simulation", key="simulate_btn"):
     if not returns.empty:
         try:
-            sim = counterfactual_sim(returns, shock_asset, shock_size/100, steps=horizon)
+            # VAR fit and noise paths are cached per data version; slider moves only re-project the shock
+            sim = what_if(returns, shock_asset, shock_size/100, steps=horizon)
             fig = go.Figure()
-            fig.add_trace(go.Scatter(y=sim.mean(axis=1), name="Shocked Path (counterfactual)", line=dict(color='#00ff9f', width=3)))
-            fig.add_trace(go.Scatter(y=returns.iloc[-len(sim):].mean(axis=1).cumsum() + 100, name="Baseline", line=dict(color='#ff00ff', width=3)))
+            fig.add_trace(go.Scatter(x=sim['upper'].index, y=sim['upper'], line=dict(width=0), showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=sim['lower'].index, y=sim['lower'], fill='tonexty', fillcolor='rgba(0,255,159,0.15)',
+                                     line=dict(width=0), name="90% Monte Carlo band"))
+            fig.add_trace(go.Scatter(x=sim['shocked'].index, y=sim['shocked'], name="Shocked Path (counterfactual)", line=dict(color='#00ff9f', width=3)))
+            fig.add_trace(go.Scatter(x=sim['baseline'].index, y=sim['baseline'], name="Baseline", line=dict(color='#ff00ff', width=3)))
             fig.update_layout(
                 title="Counterfactual Simulation",
                 template='plotly_dark',
@@ -212,7 +227,14 @@ if st.button("Run What-If Simulation", key="simulate_btn"):
                 legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
             )
             st.plotly_chart(fig, use_container_width=True)
-            st.metric("Persistence Score of This Edge", "0.94", "Regime-robust version auto-generated")
+            dag = st.session_state.get('causal_dag')
+            edges = list(dag.out_edges(shock_asset, data=True)) if dag is not None and shock_asset in dag else []
+            if edges:
+                _, target, edge = max(edges, key=lambda e: e[2]['weight'])
+                st.metric(f"Persistence Score of {shock_asset} → {target}", f"{edge['persistence']:.2f}",
+                          f"lag {edge['lag']}d, strength {edge['strength']:+.2f}")
+            else:
+                st.metric("Persistence Score of This Edge", "n/a", "Build the causal DAG to score this asset's edges")
         except Exception as e:
             st.error(f"Simulation failed: {str(e)}")
     else:
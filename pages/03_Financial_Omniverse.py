@@ -1,5 +1,6 @@
 import streamlit as st
 import plotly.express as px
+import plotly.graph_objects as go
 from core.omniverse import run_omniverse_sims
 import pandas as pd
 
@@ -71,20 +72,33 @@ st.markdown("**Problem it obliterates:** Historical backtests miss competitor re
 st.markdown("**How the tool works:** A true generative \"foundation world model\" for finance (like Sora/Video world models but physics-constrained with no-arbitrage, market microstructure, and behavioral rules). Trained on every tick of multi-asset history + alt data... Uses diffusion + autoregressive + causal intervention layers so it can generate infinite realistic futures, including ones never seen before... You drop your strategy into it and run millions of counterfactuals with full agent interactions.")
 
 scenario = st.selectbox("Choose extreme future scenario", ["Base", "Trump2+China", "AI-CapEx-Crash", "2025-Quant-Wobble"])
-if st.button("Generate 8,000 Omniverse Futures", type="primary"):
+num_sims = st.select_slider("Number of futures", options=[8_000, 100_000, 1_000_000], value=8_000, format_func=lambda n: f"{n:,}")
+if st.button(f"Generate {num_sims:,} Omniverse Futures", type="primary"):
     with st.spinner("Running millions of counterfactual world-model simulations..."):
-        paths = run_omniverse_sims(scenario)
-        if paths.size > 0:
-            fig = px.line(paths[:400].T, title=f"Omniverse – {scenario} Regime Futures")
+        sims = run_omniverse_sims(scenario, num_sims=num_sims)
+        if sims:
+            fig = px.line(sims['paths'][:400].T, title=f"Omniverse – {scenario} Regime Futures")
+            fig.update_traces(opacity=0.25, showlegend=False)
+            bands = sims['bands']
+            for col, color in [('p5', '#ff0055'), ('p50', '#ffffff'), ('p95', '#00ff9f')]:
+                fig.add_trace(go.Scatter(x=bands.index - 1, y=bands[col], name=col.upper(), line=dict(color=color, width=3)))
             fig.update_layout(
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)',
                 font_color='#00ff9f',
                 xaxis_title="Days",
                 yaxis_title="Cumulative Return",
-                legend_title="Simulation Path"
+                legend_title="Percentile Band"
             )
             st.plotly_chart(fig, use_container_width=True)
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Median Terminal Value", f"{sims['terminal']['percentiles'][50]:.3f}")
+            with col2:
+                st.metric("Probability of Loss", f"{sims['terminal']['prob_loss'] * 100:.1f}%")
+            with col3:
+                st.metric("95% Tail Drawdown", f"{sims['drawdown']['p95'] * 100:.1f}%")
             st.success("**Insane value:** Discover strategies that work in regimes that don't exist yet. Portfolio optimization and risk models that are actually robust. One fund using this could have sidestepped the entire 2025 quant wobble... $5B+ in avoided losses + new strategy discovery per year. This is the holy grail — whoever has the best Omniverse basically has a time machine for markets.")
         else:
             st.error("Failed to generate Omniverse futures. Please try again later.")
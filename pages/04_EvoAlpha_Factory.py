@@ -52,13 +52,12 @@ st.markdown("**LLM Causal Hypotheses → Natural Selection → Multi-Factor Alph
 
 if st.button("EVOLVE NEW ALPHAS", type="primary", use_container_width=True):
     with st.spinner("Generating real causal hypotheses... Evolving multi-factor strategies..."):
-        elite = evolve_new_alpha()
-        st.session_state.elite_alphas = elite
-        st.success(f"✅ {len(elite)} Multi-Factor Alphas Evolved & Deployed to Paper Trading")
+        evolve_new_alpha()
 
 # Show the table
 if 'elite_alphas' in st.session_state and len(st.session_state.elite_alphas) > 0:
-    df = pd.DataFrame(st.session_state.elite_alphas)
+    # ``signal`` holds the evolved book for the execution lab, not a column to show
+    df = pd.DataFrame(st.session_state.elite_alphas).drop(columns='signal', errors='ignore')
     st.dataframe(df, use_container_width=True, hide_index=True)
 else:
     st.info("Click 'EVOLVE NEW ALPHAS' to generate and view results.")
\ No newline at end of file
@@ -1,5 +1,5 @@
 import streamlit as st
-from core.liquidity_teleporter import optimal_execution_trajectory
+from core.liquidity_teleporter import optimal_execution_trajectory, execution_cost_bp
 import plotly.graph_objects as go
 import numpy as np
 
@@ -126,11 +126,14 @@ with st.container():
     st.markdown('<div class="holographic-panel">', unsafe_allow_html=True)
     adv = st.slider("Average Daily Volume (shares)", 500_000, 100_000_000, 10_000_000, step=100_000)
     position = st.slider("Position size to execute (shares)", 100_000, 20_000_000, 2_000_000, step=100_000)
+    risk_aversion = st.slider("Risk aversion (urgency)", 0.0, 50.0, 2.0, step=0.5)
+    exotic = st.checkbox("Exotic non-linear impact model (slow evolutionary search)", value=False)
     st.markdown('</div>', unsafe_allow_html=True)
 
 if st.button("Teleport Position – Zero Footprint Execution", type="primary"):
     with st.spinner("Running quantum-hybrid trajectory optimisation..."):
-        traj, impact_bp = optimal_execution_trajectory(adv, position)
+        traj, impact_bp = optimal_execution_trajectory(adv, position, risk_aversion=risk_aversion, exotic=exotic)
+        naive_bp = execution_cost_bp([position], adv)  # whole block in one step
         
         # REAL-TIME EXECUTION VISUALIZATION
         fig = go.Figure()
@@ -183,7 +186,7 @@ if st.button("Teleport Position – Zero Footprint Execution", type="primary"):
         with col2:
             st.markdown(f"""
             <div class="impact-metric">
-                <div class="impact-value">{round(92 - impact_bp, 1)} bp</div>
+                <div class="impact-value">{round(naive_bp - impact_bp, 1)} bp</div>
                 <div class="impact-label">VS NAIVE EXECUTION</div>
             </div>
             """, unsafe_allow_html=True)
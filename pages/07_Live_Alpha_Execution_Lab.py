@@ -1,7 +1,6 @@
 import streamlit as st
 import plotly.express as px
-import pandas as pd
-from core.backtester import run_real_oos_backtest
+from core.backtester import run_batch_oos_backtest
 
 st.set_page_config(page_title="Live Alpha Execution Lab", layout="wide")
 
@@ -24,38 +23,14 @@ alphas = st.session_state.elite_alphas
 
 st.success(f"Running real OOS backtests on {len(alphas)} alphas...")
 
-results = []
-for alpha in alphas:
-    result = run_real_oos_backtest(alpha)
-    results.append(result)
+metrics, equity = run_batch_oos_backtest(alphas)
 
-df = pd.DataFrame(results)
-st.dataframe(df[['name', 'sharpe', 'persistence', 'oos_return', 'max_drawdown']], use_container_width=True)
+st.dataframe(metrics[['name', 'sharpe', 'persistence', 'oos_return', 'max_drawdown']], use_container_width=True)
 
 st.subheader("Combined Portfolio Equity Curve (Real OOS)")
 
-# ---------------- FIXED EQUITY CURVE HANDLING ----------------
-equity_curves = []
-
-for r in results:
-    eq = r['equity_curve']
-    # If it's a DataFrame with 1 column, convert to Series
-    if isinstance(eq, pd.DataFrame) and eq.shape[1] == 1:
-        eq = eq.iloc[:, 0]
-    # If it's a DataFrame with multiple columns, optionally pick first column
-    elif isinstance(eq, pd.DataFrame) and eq.shape[1] > 1:
-        eq = eq.iloc[:, 0]  # you can change this if another column is preferred
-    # If it's a NumPy array, convert to Series
-    elif not isinstance(eq, pd.Series):
-        eq = pd.Series(eq)
-    equity_curves.append(eq)
-
-# Align all curves by index (outer join) and average
-portfolio = pd.concat(equity_curves, axis=1).mean(axis=1)
-
-# Ensure 1D for Plotly
-portfolio = portfolio.squeeze()
-# ---------------- END FIX ----------------
+# All curves share one OOS index, so the portfolio is a plain row mean
+portfolio = equity.mean(axis=1)
 
 fig = px.line(
     x=portfolio.index,
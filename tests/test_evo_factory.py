@@ -0,0 +1,115 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from deap import gp
+
+from core.evo_factory import (PSET, FitnessPool, Panel, SubtreeCache, _toolbox, batch_fitness, canonical_keys, cs_rank,
+                              evaluate_tree, evolve, positions)
+
+
+@pytest.fixture(scope='module')
+def panel():
+    rng = np.random.default_rng(3)
+    index = pd.bdate_range('2021-01-01', periods=300)
+    close = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (300, 8)), axis=0)), index=index,
+                         columns=[f'S{i}' for i in range(8)])
+    volume = pd.DataFrame(rng.lognormal(15, 0.3, close.shape), index=index, columns=close.columns)
+    return Panel.from_frames(close, volume)
+
+
+def _tree(expr):
+    return gp.PrimitiveTree.from_string(expr, PSET)
+
+
+def _random_exprs(n, seed=0):
+    random.seed(seed)
+    toolbox = _toolbox()
+    return [str(ind) for ind in toolbox.population(n)]
+
+
+def test_cs_rank_keeps_non_finite_values_out_of_the_book():
+    x = np.array([[3.0, np.nan, 1.0, 2.0],
+                  [np.nan, np.nan, np.nan, np.nan],
+                  [np.inf, 5.0, np.nan, 4.0]])
+    ranks = cs_rank(x)
+    np.testing.assert_allclose(ranks[0], [0.5, np.nan, -0.5, 0.0])
+    assert np.isnan(ranks[1]).all()
+    np.testing.assert_allclose(ranks[2], [np.nan, 0.5, np.nan, -0.5])
+
+
+def test_all_nan_row_yields_zero_weights():
+    x = np.array([[3.0, 1.0, 2.0, 4.0],
+                  [np.nan, np.nan, np.nan, np.nan]])
+    w = positions(cs_rank(x))
+    assert np.all(w[1] == 0.0)
+    np.testing.assert_allclose(np.abs(w[0]).sum(), 1.0)
+
+
+def test_cached_evaluation_matches_uncached(panel):
+    cache = SubtreeCache(64 << 20)
+    for expr in _random_exprs(60) * 2:
+        np.testing.assert_array_equal(evaluate_tree(_tree(expr), panel, cache), evaluate_tree(_tree(expr), panel))
+    assert cache.hits > 0
+
+
+@pytest.mark.parametrize('expr, rewritten', [
+    ('add(ts_mean(ret, w5), logp)', 'add(logp, ts_mean(ret, w5))'),
+    ('mul(cs_rank(logvol), ts_std(ret, w21))', 'mul(ts_std(ret, w21), cs_rank(logvol))'),
+    ('neg(neg(ts_delta(logp, w10)))', 'ts_delta(logp, w10)'),
+    ('cs_rank(cs_rank(ts_mean(ret, w63)))', 'cs_rank(ts_mean(ret, w63))'),
+    ('absval(neg(ret))', 'absval(ret)'),
+])
+def test_canonical_rewrites_preserve_values(panel, expr, rewritten):
+    a, b = _tree(expr), _tree(rewritten)
+    assert canonical_keys(a)[0][0] == canonical_keys(b)[0][0]
+    np.testing.assert_allclose(evaluate_tree(a, panel), evaluate_tree(b, panel), equal_nan=True)
+
+
+def test_seeded_evolution_leaves_global_random_alone(panel):
+    random.seed(11)
+    expected = random.random()
+    random.seed(11)
+    evolve([], panel, population=20, generations=1, seed=5, workers=1)
+    assert random.random() == expected
+
+
+def test_pool_fitness_matches_serial(panel):
+    exprs = _random_exprs(80, seed=1)
+    serial = batch_fitness([_tree(e) for e in exprs], panel)
+    with FitnessPool(panel, workers=2, cache_mb=16) as pool:
+        pooled = pool.score(exprs)
+        assert pool._pool is not None, "pool fell back to serial scoring"
+    np.testing.assert_allclose(pooled, serial, equal_nan=True)
+
+
+def test_pooled_evolution_matches_single_process(panel):
+    serial = evolve([], panel, population=40, generations=2, seed=7, workers=1)
+    pooled = evolve([], panel, population=40, generations=2, seed=7, workers=2)
+    assert [a['expression'] for a in pooled] == [a['expression'] for a in serial]
+    assert [a['in_sample_sharpe'] for a in pooled] == [a['in_sample_sharpe'] for a in serial]
+
+
+def test_cache_evicts_least_recent_past_budget():
+    item = np.zeros(1000)               # 8000 bytes
+    cache = SubtreeCache(3 * item.nbytes)
+    for key in 'abc':
+        cache.put(key, item.copy())
+    cache.get('a')
+    cache.put('d', item.copy())
+    assert cache.bytes <= cache.max_bytes and cache.evictions == 1
+    assert cache.get('b') is None and cache.get('a') is not None
+    cache.put('huge', np.zeros(10000))   # larger than the whole budget: not stored
+    assert cache.get('huge') is None and cache.bytes <= cache.max_bytes
+
+
+def test_pool_cache_budget_is_per_process(panel):
+    exprs = _random_exprs(120, seed=2)
+    with FitnessPool(panel, workers=2, cache_mb=1) as pool:
+        assert pool.cache_bytes == 1 << 20
+        pool.score(exprs)
+        stats = pool.cache_stats()
+    assert 1 <= len(stats['workers']) <= 2     # a worker that got no task reports nothing
+    assert all(w['bytes'] <= 1 << 20 for w in stats['workers'])
+    assert stats['evictions'] > 0
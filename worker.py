@@ -1,33 +1,42 @@
+import os
 import time
 import logging
 from core.evo_factory import evolve_new_alpha
 import traceback
 
-# Configure logging
-logging.basicConfig(
-    filename='logs/worker.log', 
-    level=logging.INFO, 
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filemode='a'
-)
 logger = logging.getLogger('evolution_worker')
 
-print("🌑 MOONSHOT v3 EVOLUTIONARY WORKER STARTED")
-print("🔥 1200+ strategy population • 50 generations • Elite selection only")
 
-# Ensure logs directory exists
-import os
-os.makedirs('logs', exist_ok=True)
-
-while True:
-    try:
-        logger.info("Starting evolutionary cycle")
-        start_time = time.time()
-        result = evolve_new_alpha(ui_context=False)
-        elapsed = time.time() - start_time
-        status = "SUCCESS" if result else "NO_ELITE"
-        logger.info(f"Evolution completed in {elapsed:.1f}s: {status}")
-        time.sleep(60)  # Longer sleep between cycles
-    except Exception as e:
-        logger.error(f"Evolution crashed: {str(e)}\n{traceback.format_exc()}")
-        time.sleep(10)
+def main():
+    # Ensure logs directory exists
+    os.makedirs('logs', exist_ok=True)
+
+    # Configure logging
+    logging.basicConfig(
+        filename='logs/worker.log',
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        filemode='a'
+    )
+
+    print("🌑 MOONSHOT v3 EVOLUTIONARY WORKER STARTED")
+    print("🔥 1200+ strategy population • 50 generations • Elite selection only")
+
+    while True:
+        try:
+            logger.info("Starting evolutionary cycle")
+            start_time = time.time()
+            result = evolve_new_alpha(ui_context=False)
+            elapsed = time.time() - start_time
+            status = "SUCCESS" if result else "NO_ELITE"
+            logger.info(f"Evolution completed in {elapsed:.1f}s: {status}")
+            time.sleep(60)  # Longer sleep between cycles
+        except Exception as e:
+            logger.error(f"Evolution crashed: {str(e)}\n{traceback.format_exc()}")
+            time.sleep(10)
+
+
+# Pool workers start fresh interpreters that import this module; only the
+# process launched as the worker runs the loop
+if __name__ == '__main__':
+    main()